@@ -0,0 +1,331 @@
+import argparse
+import json
+import logging
+import os
+import re
+
+try:
+    import numpy as np
+except ImportError as e:  # Optional dependency, only the analytics need it
+    raise ImportError("analytics.py needs NumPy, install it with pip install -r requirements-analytics.txt") from e
+
+from db_operations import SQLiteOperations
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional, only needed for the Parquet export
+    pa = pq = None
+
+log = logging.getLogger(__name__)
+
+# One row per fixture and team, with the opponent and the halftime score of both
+TEAM_ROWS_QUERY = '''
+    SELECT Fixture.fixture_id, Fixture.timestamp, Fixture.season, Fixture.league,
+           Teams.team_id, Teams.name, Teams.team_type = 'home', Teams.goals, ht.score_value,
+           opp.team_id, opp.name, opp.goals, opp_ht.score_value
+    FROM Fixture
+    JOIN Teams ON Teams.fixture_id = Fixture.fixture_id
+    JOIN Teams AS opp ON opp.fixture_id = Fixture.fixture_id AND opp.team_type != Teams.team_type
+    LEFT JOIN Score AS ht
+        ON ht.fixture_id = Fixture.fixture_id AND ht.score_type = 'halftime' AND ht.team_id = Teams.team_type
+    LEFT JOIN Score AS opp_ht
+        ON opp_ht.fixture_id = Fixture.fixture_id AND opp_ht.score_type = 'halftime' AND opp_ht.team_id = opp.team_type
+    WHERE {where}
+    '''
+# Values like "55%" or "1.23" are converted by SQLite, NULL stays NULL
+STATS_QUERY = '''
+    SELECT Stats.fixture_id, Stats.team_id, Stats.type, CAST(RTRIM(Stats.value, '%') AS REAL)
+    FROM Stats
+    JOIN Fixture ON Fixture.fixture_id = Stats.fixture_id
+    WHERE {where}
+    '''
+EVENTS_QUERY = '''
+    SELECT Events.fixture_id, Events.team_id,
+        CASE
+            WHEN Events.type = 'Goal' AND Events.detail != 'Missed Penalty' THEN 'goals'
+            WHEN Events.type = 'Card' AND Events.detail = 'Yellow Card' THEN 'yellow_cards'
+            WHEN Events.type = 'Card' THEN 'red_cards'
+            WHEN Events.type = 'subst' THEN 'substitutions'
+            WHEN Events.type = 'Var' THEN 'var_decisions'
+            ELSE 'other' END AS kind,
+        COUNT(*)
+    FROM Events
+    JOIN Fixture ON Fixture.fixture_id = Events.fixture_id
+    WHERE {where}
+    GROUP BY Events.fixture_id, Events.team_id, kind
+    '''
+
+
+def column_name(stat_type):
+    """Column name of a Stats type, e.g. "Shots on Goal" -> "shots_on_goal", "Passes %" -> "passes_pct" """
+    return re.sub(r"[^a-z0-9]+", "_", stat_type.lower().replace("%", "pct")).strip("_")
+
+
+def _group_starts(keys):
+    """:return: for each element of sorted keys, the index of the first element with the same key"""
+    idx = np.arange(len(keys))
+    is_start = np.ones(len(keys), dtype=bool)
+    is_start[1:] = keys[1:] != keys[:-1]
+    return np.maximum.accumulate(np.where(is_start, idx, 0))
+
+
+def _rolling_sum(values, starts, window):
+    """Sums of the last `window` values up to each element, not reaching before its group start"""
+    cumsum = np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+    idx = np.arange(len(values))
+    lo = np.maximum(idx - window + 1, starts)
+    return cumsum[idx + 1] - cumsum[lo]
+
+
+class ColumnTable:
+    def __init__(self, columns: dict):
+        """
+        Table stored as NumPy arrays of equal length, one per column.
+        :param columns: dict {column name: array}
+        """
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of different lengths: {lengths}")
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def filter(self, mask):
+        return ColumnTable({name: values[mask] for name, values in self.columns.items()})
+
+    def sort(self, *names):
+        """Sorts by the given columns, the first one being the primary key"""
+        return self.filter(np.lexsort([self.columns[name] for name in reversed(names)]))
+
+    def rows(self):
+        """Yields the rows as dicts, e.g. for printing"""
+        names = list(self.columns)
+        for values in zip(*(self.columns[name].tolist() for name in names)):
+            yield dict(zip(names, values))
+
+    def save(self, directory):
+        """Writes one .npy file per column, so that load can memory-map them"""
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(values))
+        with open(os.path.join(directory, "columns.json"), "w") as f:
+            json.dump(list(self.columns), f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """:param mmap: memory-map the columns instead of reading them, pages are only loaded when accessed"""
+        with open(os.path.join(directory, "columns.json"), "r") as f:
+            names = json.load(f)
+        return cls({name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                    for name in names})
+
+    def to_parquet(self, path):
+        if pq is None:
+            raise RuntimeError("Parquet export requires pyarrow, install it with pip install pyarrow")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        pq.write_table(pa.table({name: np.asarray(values) for name, values in self.columns.items()}), path)
+
+    @classmethod
+    def from_parquet(cls, path):
+        if pq is None:
+            raise RuntimeError("Parquet import requires pyarrow, install it with pip install pyarrow")
+        table = pq.read_table(path)
+        return cls({name: table.column(name).to_numpy() for name in table.column_names})
+
+
+class Analytics:
+    def __init__(self, db_ops: SQLiteOperations):
+        """
+        Season statistics computed with NumPy over columnar match data, instead of parsing the Stats, Events and
+        Score rows of each fixture in Python.
+        :param db_ops: SQLiteOperations of the database to read from
+        """
+        self.db_ops = db_ops
+
+    @staticmethod
+    def _where(league=None, season=None, date_from=None, date_to=None, finished_only=True):
+        conditions, params = ["1 = 1"], {}
+        if league is not None:
+            conditions.append("Fixture.league = :league")
+            params["league"] = league
+        if season is not None:
+            conditions.append("Fixture.season = :season")
+            params["season"] = season
+        if date_from is not None:
+            conditions.append("Fixture.match_date >= :date_from")
+            params["date_from"] = date_from
+        if date_to is not None:
+            conditions.append("Fixture.match_date <= :date_to")
+            params["date_to"] = date_to
+        if finished_only:
+            conditions.append("Fixture.status LIKE 'Match Finished%'")
+        return " AND ".join(conditions), params
+
+    def _fetch(self, name, query, where, params):
+        with self.db_ops.wrapper as db, \
+                self.db_ops.metrics.timer("db_query_seconds", operation="fetch", query=f"analytics_{name}"):
+            # Plain tuples, sqlite3.Row objects cost more than the rest of the load
+            cursor = db.conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(query.format(where=where), params).fetchall()
+        self.db_ops.metrics.inc("db_rows_total", len(rows), operation="fetch", query=f"analytics_{name}")
+        return [np.array(column) for column in zip(*rows)] if rows else None
+
+    def load(self, league=None, season=None, date_from=None, date_to=None, finished_only=True) -> ColumnTable:
+        """
+        Pivots the stored fixtures into one row per fixture and team: result and halftime columns, one float
+        column per statistic type (NaN where missing) and event counts (events_<kind>).
+        """
+        where, params = self._where(league, season, date_from, date_to, finished_only)
+        team_rows = self._fetch("teams", TEAM_ROWS_QUERY, where, params)
+        if team_rows is None:
+            return ColumnTable({})
+
+        (fixture_id, timestamp, season_, league_, team_id, team, is_home, goals_for, ht_for,
+         opponent_id, opponent, goals_against, ht_against) = team_rows
+        as_float = lambda values: np.array([np.nan if v is None else v for v in values.tolist()], dtype=float) \
+            if values.dtype == object else values.astype(float)
+        columns = {
+            "fixture_id": fixture_id.astype(np.int64),
+            "timestamp": timestamp.astype(np.int64),
+            "season": season_.astype(np.int32),
+            "league": league_.astype(str),
+            "team_id": team_id.astype(np.int64),
+            "team": team.astype(str),
+            "opponent_id": opponent_id.astype(np.int64),
+            "opponent": opponent.astype(str),
+            "is_home": is_home.astype(bool),
+            "goals_for": as_float(goals_for),
+            "goals_against": as_float(goals_against),
+            "halftime_for": as_float(ht_for),
+            "halftime_against": as_float(ht_against)}
+        diff = columns["goals_for"] - columns["goals_against"]
+        columns["points"] = np.select([diff > 0, diff == 0], [3, 1], 0).astype(np.int8)
+
+        # Rows are addressed by (fixture, team) keys, sorted for binary search
+        keys = (columns["fixture_id"] << 32) | (columns["team_id"] & 0xFFFFFFFF)
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+
+        def pivot(rows, prefix="", fill=np.nan):
+            f_ids, t_ids, kinds, values = rows
+            row_keys = (f_ids.astype(np.int64) << 32) | (t_ids.astype(np.int64) & 0xFFFFFFFF)
+            pos = np.searchsorted(sorted_keys, row_keys)
+            found = (pos < len(sorted_keys)) & (sorted_keys[np.minimum(pos, len(sorted_keys) - 1)] == row_keys)
+            names, kind_idx = np.unique(kinds.astype(str), return_inverse=True)
+            matrix = np.full((len(keys), len(names)), fill, dtype=float)
+            matrix[order[pos[found]], kind_idx[found]] = as_float(values)[found]
+            return {f"{prefix}{column_name(name)}": matrix[:, i] for i, name in enumerate(names)}
+
+        if (stats := self._fetch("stats", STATS_QUERY, where, params)) is not None:
+            columns.update(pivot(stats))
+        if (events := self._fetch("events", EVENTS_QUERY, where, params)) is not None:
+            columns.update(pivot(events, prefix="events_", fill=0.0))
+        table = ColumnTable(columns)
+        log.info(f"Loaded {len(table)} team rows of {len(np.unique(columns['fixture_id']))} fixtures with "
+                 f"{len(columns)} columns")
+        return table
+
+    @staticmethod
+    def team_aggregates(table: ColumnTable, by_season=True) -> ColumnTable:
+        """
+        Per team (and season) totals and per match averages of all numeric columns, ignoring missing statistics.
+        :return: table with matches, wins, draws, losses, points, points_per_match and avg_<column> columns
+        """
+        group_columns = ["season", "team_id"] if by_season else ["team_id"]
+        group_keys = np.stack([table[c].astype(np.int64) for c in group_columns], axis=1)
+        groups, first, inverse = np.unique(group_keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        n = len(groups)
+
+        count = lambda mask: np.bincount(inverse, weights=mask.astype(float), minlength=n)
+        result = {c: groups[:, i] for i, c in enumerate(group_columns)}
+        result["team"] = table["team"][first]
+        result["matches"] = np.bincount(inverse, minlength=n)
+        result["wins"] = count(table["points"] == 3).astype(int)
+        result["draws"] = count(table["points"] == 1).astype(int)
+        result["losses"] = result["matches"] - result["wins"] - result["draws"]
+        result["points"] = np.bincount(inverse, weights=table["points"], minlength=n).astype(int)
+        result["points_per_match"] = result["points"] / result["matches"]
+
+        skip = {"fixture_id", "timestamp", "season", "team_id", "opponent_id", "is_home", "points"}
+        for name, values in table.columns.items():
+            if name in skip or values.dtype.kind != "f":
+                continue
+            present = ~np.isnan(values)
+            sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=n)
+            counts = count(present)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[f"avg_{name}"] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        return ColumnTable(result).sort(*group_columns)
+
+    @staticmethod
+    def rolling_form(table: ColumnTable, window=5, by_season=False) -> ColumnTable:
+        """
+        Form of each team before and including each of its matches: points, goal difference and results of its
+        last `window` matches.
+        :param by_season: start the form anew with every season
+        :return: table sorted by team and time, with form_points, form_goal_diff, form_matches and form (e.g. WWDLW)
+        """
+        sort_columns = ["team_id", "season", "timestamp"] if by_season else ["team_id", "timestamp"]
+        table = table.sort(*sort_columns)
+        group_keys = table["team_id"] * 10000 + table["season"] if by_season else table["team_id"]
+        starts = _group_starts(group_keys)
+
+        points = table["points"].astype(float)
+        goal_diff = np.nan_to_num(table["goals_for"] - table["goals_against"])
+        results = np.array(["L", "D", "", "W"])[table["points"]]
+        form = [
+            "".join(results[max(start, i - window + 1):i + 1].tolist()) for i, start in enumerate(starts.tolist())]
+        return ColumnTable({
+            "team_id": table["team_id"], "team": table["team"], "season": table["season"],
+            "fixture_id": table["fixture_id"], "timestamp": table["timestamp"], "opponent": table["opponent"],
+            "result": results,
+            "form_points": _rolling_sum(points, starts, window).astype(int),
+            "form_goal_diff": _rolling_sum(goal_diff, starts, window).astype(int),
+            "form_matches": np.minimum(np.arange(len(table)) - starts + 1, window),
+            "form": np.array(form)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Season statistics of the stored fixtures")
+    parser.add_argument("--db", default="football_matches.db")
+    parser.add_argument("--league")
+    parser.add_argument("--season", type=int)
+    parser.add_argument("--team", help="Team whose form is printed, e.g. Slavia")
+    parser.add_argument("--window", type=int, default=5, help="Matches of the rolling form")
+    parser.add_argument("--export-dir", help="Write the match table as memory-mappable .npy columns")
+    parser.add_argument("--parquet", help="Write the match table as a Parquet file (requires pyarrow)")
+    args = parser.parse_args()
+    logging.basicConfig(level="INFO")
+
+    db_ops = SQLiteOperations(db_name=args.db)
+    analytics = Analytics(db_ops)
+    matches = analytics.load(league=args.league, season=args.season)
+    if not len(matches):
+        log.info("No finished fixtures found")
+    else:
+        if args.export_dir:
+            matches.save(args.export_dir)
+        if args.parquet:
+            matches.to_parquet(args.parquet)
+
+        aggregates = analytics.team_aggregates(matches)
+        shown = ["season", "team", "matches", "wins", "draws", "losses", "points", "avg_goals_for",
+                 "avg_ball_possession", "avg_total_shots"]
+        for row in sorted(aggregates.rows(), key=lambda r: (r["season"], -r["points"])):
+            print({k: round(v, 2) if isinstance(v, float) else v for k, v in row.items() if k in shown})
+
+        if args.team:
+            form = analytics.rolling_form(matches, window=args.window)
+            for row in form.filter(np.char.find(np.char.lower(form["team"]), args.team.lower()) >= 0).rows():
+                print(row)
+    db_ops.close()
@@ -0,0 +1,99 @@
+import logging
+import queue
+import threading
+import time
+from datetime import date, timedelta
+
+from pipeline import StreamingPipeline
+
+log = logging.getLogger(__name__)
+
+
+def date_range(date_from: str, date_to: str):
+    """Yields all days between date_from and date_to (both included) in %Y-%m-%d format"""
+    day, last = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+class Backfill:
+    def __init__(self, football_buddy, teams: list, workers: int = 2, queue_size: int = 8, pipeline=None):
+        """
+        Processes a range of days for several teams, sharing one FootballBuddy (and so one RapidAPI retriever, DB
+        connection manager and set of LLM clients) between worker threads fed from a bounded queue.
+        Teams from the same league and season are processed in one job per day, so their fixtures are only
+        retrieved and described once.
+        :param football_buddy: FootballBuddy instance
+        :param teams: team configs with the keys of data_config.team in config.yaml
+        :param workers: number of days processed concurrently
+        :param queue_size: max number of jobs waiting for a worker
+        :param pipeline: StreamingPipeline each job streams its fixtures through, a default one if not given
+        """
+        self.football_buddy = football_buddy
+        self.pipeline = pipeline or StreamingPipeline(football_buddy)
+        self.workers = workers
+        self.queue_size = queue_size
+
+        self.leagues = {}
+        for t in teams:
+            self.leagues.setdefault((t["league"], t["country_code"], t["season"]), []).append(t["team"])
+
+        self._lock = threading.Lock()
+        self._done = self._failed = self._fixtures = self._triggers = 0
+        self._start = None
+
+    def process(self, day, league, country_code, season, teams):
+        """:return: tuple (number of fixtures, number of triggers)"""
+        triggers, stats = self.pipeline.run(season=season, league=league, country_code=country_code, date=day,
+                                            teams=teams)
+        return stats["fixtures"], len(triggers)
+
+    def _report(self, total, job, fixtures, triggers, failed=False):
+        with self._lock:
+            self._done += 1
+            self._failed += failed
+            self._fixtures += fixtures
+            self._triggers += triggers
+            elapsed = time.perf_counter() - self._start
+            eta = elapsed / self._done * (total - self._done)
+            log.info(f"[{self._done}/{total}] {job[0]} {job[1]}: {'FAILED' if failed else f'{fixtures} fixtures'}"
+                     f" | {self._fixtures} fixtures, {self._triggers} triggers in {elapsed:.0f} s"
+                     f" ({self._fixtures / elapsed:.2f} fixtures/s, {self._done / elapsed:.2f} jobs/s, "
+                     f"ETA {eta:.0f} s)")
+
+    def _worker(self, jobs: queue.Queue, total):
+        while (job := jobs.get()) is not None:
+            day, (league, country_code, season) = job
+            try:
+                fixtures, triggers = self.process(day, league, country_code, season, self.leagues[job[1]])
+                self._report(total, (day, league), fixtures, triggers)
+            except Exception as e:
+                log.exception(f"Backfill of {league} on {day} failed: {e}")
+                self._report(total, (day, league), 0, 0, failed=True)
+
+    def run(self, date_from: str, date_to: str):
+        days = list(date_range(date_from, date_to))
+        total = len(days) * len(self.leagues)
+        log.info(f"Backfilling {len(days)} days of {len(self.leagues)} leagues with {self.workers} workers...")
+
+        self._start = time.perf_counter()
+
+        jobs = queue.Queue(maxsize=self.queue_size)
+        threads = [threading.Thread(target=self._worker, args=(jobs, total), name=f"backfill-{i}")
+                   for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        for day in days:
+            for league_key in self.leagues:
+                jobs.put((day, league_key))  # Blocks while the queue is full
+        for _ in threads:
+            jobs.put(None)
+        for t in threads:
+            t.join()
+
+        elapsed = time.perf_counter() - self._start
+        summary = {"jobs": total, "failed": self._failed, "fixtures": self._fixtures, "triggers": self._triggers,
+                   "seconds": round(elapsed, 1), "fixtures_per_second": round(self._fixtures / elapsed, 2)}
+        log.info(f"Backfill finished: {summary}")
+        return summary
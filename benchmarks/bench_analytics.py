@@ -0,0 +1,109 @@
+"""
+Computes per team and season statistics of several synthetic seasons: fixture by fixture with per fixture queries
+and values parsed in Python (how match data is read for the triggers), with the columnar Analytics table and NumPy,
+on the already loaded table, and from the table memory-mapped from .npy files (and Parquet, if pyarrow is installed).
+
+    python -m benchmarks.bench_analytics --seasons 5 --fixtures 240
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from analytics import Analytics, ColumnTable, pq
+from benchmarks.stub_rapid_api import make_full_data
+from db_operations import SQLiteOperations
+
+
+def synthetic_seasons(n_seasons, n_fixtures):
+    fixtures = []
+    for s in range(n_seasons):
+        season = 2024 - n_seasons + 1 + s
+        for i in range(n_fixtures):
+            fixture_id = s * n_fixtures + i + 1
+            f = make_full_data(fixture_id, date=f"{season}-{8 + i // 60 % 5:02d}-{1 + i % 28:02d}")
+            f["about"]["league"]["season"] = season
+            f["about"]["fixture"]["timestamp"] = 1500000000 + fixture_id * 3600
+            fixtures.append(f)
+    return fixtures
+
+
+def row_by_row(db_ops):
+    """Per fixture queries, Python parsing and dict aggregation"""
+    with db_ops.wrapper as db:
+        fixtures = db.cursor.execute("SELECT fixture_id, season FROM Fixture ORDER BY timestamp").fetchall()
+    totals = defaultdict(lambda: defaultdict(float))
+    for fixture_id, season in fixtures:
+        teams = db_ops.fetch_data(db_ops.queries["email_data_teams"], fixture_id)
+        for team, opponent in [(teams[0], teams[1]), (teams[1], teams[0])]:
+            agg = totals[(season, team["name"])]
+            agg["matches"] += 1
+            agg["points"] += 3 if team["goals"] > opponent["goals"] else 1 if team["goals"] == opponent["goals"] else 0
+            agg["goals_for"] += team["goals"]
+        for row in db_ops.fetch_data(db_ops.queries["stats_data"], fixture_id):
+            if row["value"] is None:
+                continue
+            value = float(str(row["value"]).rstrip("%"))
+            agg = totals[(season, row["name"])]
+            agg[row["type"]] += value
+            agg[f"{row['type']} count"] += 1
+    return {key: {"points": agg["points"],
+                  "avg_ball_possession": agg["Ball Possession"] / agg["Ball Possession count"]}
+            for key, agg in totals.items()}
+
+
+def vectorized(table):
+    aggregates = Analytics.team_aggregates(table)
+    Analytics.rolling_form(table)
+    return {(season, team): {"points": points, "avg_ball_possession": possession}
+            for season, team, points, possession in zip(aggregates["season"].tolist(), aggregates["team"].tolist(),
+                                                        aggregates["points"].tolist(),
+                                                        aggregates["avg_ball_possession"].tolist())}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seasons", type=int, default=5)
+    parser.add_argument("--fixtures", type=int, default=240, help="Fixtures per season")
+    args = parser.parse_args()
+    logging.basicConfig(level="WARNING")
+
+    tmp = tempfile.mkdtemp()
+    db_ops = SQLiteOperations(db_name=os.path.join(tmp, "bench.db"))
+    db_ops.create_tables()
+    db_ops.insert_into_fixtures(synthetic_seasons(args.seasons, args.fixtures))
+    analytics = Analytics(db_ops)
+
+    runs = [("fixture by fixture", lambda: row_by_row(db_ops)),
+            ("columnar (load + aggregate)", lambda: vectorized(analytics.load())),
+            ("aggregate the loaded table", lambda: vectorized(table)),
+            ("memory-mapped .npy", lambda: vectorized(ColumnTable.load(os.path.join(tmp, "npy"))))]
+    if pq is not None:
+        runs.append(("Parquet", lambda: vectorized(ColumnTable.from_parquet(os.path.join(tmp, "matches.parquet")))))
+
+    table = analytics.load()
+    table.save(os.path.join(tmp, "npy"))
+    if pq is not None:
+        table.to_parquet(os.path.join(tmp, "matches.parquet"))
+    print(f"{args.seasons} seasons x {args.fixtures} fixtures: {len(table)} team rows, {len(table.columns)} columns")
+
+    baseline, expected = None, None
+    for label, run in runs:
+        elapsed, result = timed(run)
+        baseline = baseline or elapsed
+        expected = expected or result
+        same = result.keys() == expected.keys() and all(
+            result[k]["points"] == expected[k]["points"] and
+            np.isclose(result[k]["avg_ball_possession"], expected[k]["avg_ball_possession"]) for k in expected)
+        print(f"{label:<30} {elapsed * 1000:9.1f} ms (x{baseline / elapsed:.0f}), same results: {same}")
+    db_ops.close()
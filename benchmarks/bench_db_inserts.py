@@ -0,0 +1,83 @@
+"""
+Inserts a synthetic season of fixtures into a fresh SQLite database, row by row (one connection and commit per
+row, as the original insert path did) and in bulk (executemany in one transaction), and compares rows/s.
+
+    python -m benchmarks.bench_db_inserts --fixtures 240
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.stub_rapid_api import make_full_data
+from db_operations import SQLiteOperations
+
+
+class ConnectPerQuery:
+    """The original wrapper: new connection, commit and close for every `with` block"""
+    def __init__(self, db_name):
+        self.db = db_name
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.db)
+        self.conn.row_factory = sqlite3.Row
+        self.cursor = self.conn.cursor()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.commit()
+        self.conn.close()
+
+
+def synthetic_season(n_fixtures):
+    fixtures = []
+    for i in range(n_fixtures):
+        f = make_full_data(i + 1, date=f"2024-{8 + i // 60 % 5:02d}-{1 + i % 28:02d}")
+        f["llm"] = {"text": "What a match! " * 40, "llm": "gpt-4o"}
+        fixtures.append(f)
+    return fixtures
+
+
+def insert_row_by_row(db_ops, fixtures):
+    db_ops.wrapper = ConnectPerQuery(db_ops.wrapper.db)
+    for f in fixtures:
+        for table_name, (columns, rows) in db_ops._fixture_rows(f).items():
+            for values in rows:
+                db_ops._insert_into(table_name=table_name, columns=columns, values=values)
+
+
+def insert_per_fixture(db_ops, fixtures):
+    for f in fixtures:
+        db_ops.insert_into_fixture(f)
+
+
+def insert_all(db_ops, fixtures):
+    db_ops.insert_into_fixtures(fixtures)
+
+
+def run(method, fixtures):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_ops = SQLiteOperations(db_name=os.path.join(tmp, "bench.db"))
+        db_ops.create_tables()
+
+        start = time.perf_counter()
+        method(db_ops, fixtures)
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=240, help="Number of fixtures (a season has ~240)")
+    args = parser.parse_args()
+
+    fixtures = synthetic_season(args.fixtures)
+    n_rows = sum(len(rows) for f in fixtures for _, rows in SQLiteOperations._fixture_rows(f).values())
+    print(f"{args.fixtures} fixtures, {n_rows} rows")
+
+    baseline = None
+    for label, method in [("row by row", insert_row_by_row), ("per fixture", insert_per_fixture),
+                          ("all fixtures", insert_all)]:
+        elapsed = run(method, fixtures)
+        baseline = baseline or elapsed
+        print(f"{label:>13}: {elapsed:7.3f} s  ({n_rows / elapsed:9.0f} rows/s, speedup x{baseline / elapsed:.1f})")
@@ -0,0 +1,95 @@
+"""
+Compares per-fixture reads (fetch_match_data + fetch_email_data) with a connection opened per query, as the
+original SQLite wrapper did, against the persistent thread-local connections and the bulk loader. Also runs the
+reads from several threads while a writer keeps inserting, to show that readers don't block the writer in WAL mode.
+
+    python -m benchmarks.bench_db_reads --fixtures 240
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_db_inserts import ConnectPerQuery, synthetic_season
+from db_operations import SQLiteOperations
+
+
+def read_all(db_ops, fixture_ids):
+    for f_id in fixture_ids:
+        db_ops.fetch_match_data(f_id)
+        db_ops.fetch_email_data(f_id)
+
+
+def bench_sequential(db_name, fixture_ids):
+    results = {}
+    for label, wrapper in [("connect per query", ConnectPerQuery(db_name)), ("persistent", None)]:
+        db_ops = SQLiteOperations(db_name=db_name)
+        if wrapper:
+            db_ops.wrapper = wrapper
+        start = time.perf_counter()
+        read_all(db_ops, fixture_ids)
+        results[label] = time.perf_counter() - start
+        if not wrapper:
+            db_ops.close()
+
+    db_ops = SQLiteOperations(db_name=db_name)
+    start = time.perf_counter()
+    bulk = db_ops.fetch_matches_bulk(fixture_ids=fixture_ids)
+    results["bulk"] = time.perf_counter() - start
+
+    f_id = fixture_ids[-1]
+    assert bulk[-1]["events"] == db_ops.fetch_match_data(f_id)["events"], "Bulk and per fixture events differ!"
+    assert bulk[-1]["stats"] == db_ops.fetch_match_data(f_id)["stats"], "Bulk and per fixture stats differ!"
+    assert bulk[-1]["teams"] == db_ops.fetch_email_data(f_id)["score"], "Bulk and per fixture teams differ!"
+    db_ops.close()
+    return results
+
+
+def bench_concurrent(db_name, fixture_ids, extra_fixtures, n_readers):
+    db_ops = SQLiteOperations(db_name=db_name)
+    write_times = []
+
+    def writer():
+        for f in extra_fixtures:
+            start = time.perf_counter()
+            db_ops.insert_into_fixture(f)
+            write_times.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=read_all, args=(db_ops, fixture_ids)) for _ in range(n_readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    db_ops.close()
+    return elapsed, max(write_times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=240)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    season = synthetic_season(args.fixtures * 2)
+    stored, extra = season[:args.fixtures], season[args.fixtures:]
+    fixture_ids = [f["fixture_id"] for f in stored]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "bench.db")
+        db_ops = SQLiteOperations(db_name=db_name)
+        db_ops.create_tables()
+        db_ops.insert_into_fixtures(stored)
+        db_ops.close()
+
+        results = bench_sequential(db_name, fixture_ids)
+        baseline = results["connect per query"]
+        for label, elapsed in results.items():
+            print(f"{label:>17}: {elapsed:7.3f} s  ({len(fixture_ids) / elapsed:8.0f} fixtures/s, "
+                  f"speedup x{baseline / elapsed:.1f})")
+
+        elapsed, max_write = bench_concurrent(db_name, fixture_ids, extra, args.readers)
+        print(f"{args.readers} readers + 1 writer: {elapsed:.3f} s, slowest fixture insert {max_write * 1000:.1f} ms")
@@ -0,0 +1,54 @@
+"""
+Formats the daily digest of a set of triggered matches with the LLM writing the whole HTML (as before), with the
+local template and an LLM-written introduction, with the local template only, and again from the digest cache.
+The fake chat model stands in for the LLM, its latency should be set to what the real one takes for an email.
+
+    python -m benchmarks.bench_email --triggers 10 --llm-latency 5 --intro-latency 1
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.bench_db_inserts import synthetic_season
+from benchmarks.fake_llm import FakeChatModel
+from main import FootballBuddy
+
+
+def format_twice(db_name, formatting, triggers, llm_latency, intro_latency):
+    foo_bud = FootballBuddy(date="2024-08-10", team="Slavia", rapidapi_url="http://localhost", rapidapi_apikey="bench",
+                            rapidapi_host="localhost", sqlite_db_name=db_name, email_formatting=formatting)
+    foo_bud.get_llm = lambda name: FakeChatModel(latency=intro_latency if name == "email_intro" else llm_latency,
+                                                 reply="<p>What a day of football!</p>")
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        body = foo_bud.format_email(triggers, subject="There was a cool match!")
+        timings.append(time.perf_counter() - start)
+    foo_bud.db_ops.close()
+    return timings, len(body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--triggers", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=5.0, help="Seconds the LLM takes for a whole email")
+    parser.add_argument("--intro-latency", type=float, default=1.0, help="Seconds the LLM takes for an intro")
+    args = parser.parse_args()
+    logging.basicConfig(level="WARNING")
+
+    db_name = os.path.join(tempfile.mkdtemp(), "bench.db")
+    fixtures = synthetic_season(args.triggers)
+    FootballBuddy(date="2024-08-10", team="Slavia", rapidapi_url="http://localhost", rapidapi_apikey="bench",
+                  rapidapi_host="localhost", sqlite_db_name=db_name).db_ops.insert_into_fixtures(fixtures)
+    triggers = [{"fixture_id": f["fixture_id"], "trigger": "yes", "reason": f"Unusual match {f['fixture_id']}"}
+                for f in fixtures]
+
+    baseline = None
+    for label, formatting in [("LLM writes the whole email", "llm"), ("template + LLM intro", "llm_intro"),
+                              ("template only", "template")]:
+        (first, cached), size = format_twice(db_name, formatting, triggers, args.llm_latency, args.intro_latency)
+        baseline = baseline or first
+        print(f"{label:<28} {first * 1000:9.1f} ms (x{baseline / first:.0f}), cached {cached * 1000:6.2f} ms, "
+              f"{size} bytes")
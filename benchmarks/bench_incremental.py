@@ -0,0 +1,70 @@
+"""
+Runs the fetch/describe/store/trigger part of the pipeline repeatedly for the same day against the local stub
+server, as frequent (e.g. hourly) runs would, with full fetching (redoing everything, as before checkpoints) and
+incremental fetching. Between runs the score of some fixtures changes. Reports RapidAPI requests and time per run.
+
+    python -m benchmarks.bench_incremental --fixtures 30 --runs 4 --changed 2
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.stub_rapid_api import LEAGUE_NAME, StubRapidAPI
+from main import FootballBuddy
+
+NO_TRIGGER = '{"trigger": "no", "reason": null}'
+
+
+class ChangingStub(StubRapidAPI):
+    """Stub whose fixtures listing adds a goal to the first `changed` fixtures with every run"""
+    run = 0
+    changed = 0
+
+    def respond(self, path, params):
+        response = super().respond(path, params)
+        if path.endswith("/fixtures"):
+            for f in response[:self.changed]:
+                f["goals"]["home"] += self.run
+                f["score"]["fulltime"] = f["goals"]
+        return response
+
+
+def run_pipeline(stub, db_name, incremental):
+    foo_bud = FootballBuddy(date="2024-08-10", team="Slavia", rapidapi_url=stub.base_url, rapidapi_apikey="bench",
+                            rapidapi_host="localhost", sqlite_db_name=db_name, rapidapi_max_workers=8,
+                            incremental=incremental, resume=incremental)
+    foo_bud.get_llm = lambda name: FakeChatModel(latency=0.05, reply=NO_TRIGGER if name == "trigger_detection"
+                                                 else f"Description {stub.run}")
+
+    served_before = stub.requests_served
+    start = time.perf_counter()
+    raw_data = foo_bud.get_rapidapi_data(season=2024, league=LEAGUE_NAME, country_code="cz")
+    if raw_data:
+        foo_bud.enrich_and_load_into_db(raw_data)
+    foo_bud.collect_valid_triggers(foo_bud.fetch_fixture_data_for_llm())
+    elapsed = time.perf_counter() - start
+    foo_bud.db_ops.close()
+    return len(raw_data), stub.requests_served - served_before, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--changed", type=int, default=2, help="Fixtures whose score changes between runs")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub server latency per request [s]")
+    args = parser.parse_args()
+    logging.basicConfig(level="WARNING")
+
+    for incremental in [False, True]:
+        print(f"{'incremental' if incremental else 'full (no resume)'} fetching:")
+        db_name = os.path.join(tempfile.mkdtemp(), "bench.db")
+        with ChangingStub(n_fixtures=args.fixtures, latency=args.latency) as stub:
+            stub.changed = args.changed
+            for run in range(args.runs):
+                stub.run = run
+                fetched, requests, elapsed = run_pipeline(stub, db_name, incremental)
+                print(f"  run {run + 1}: {fetched:>3} fixtures fetched, {requests:>3} requests, {elapsed:6.3f} s")
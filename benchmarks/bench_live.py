@@ -0,0 +1,84 @@
+"""
+Replays a recorded match (synthetic by default, or a get_full_data item saved as JSON) through the local stub
+server as if it was played live, and runs LivePoller against it: once with a fixed poll interval, once with the
+adaptive one. Reports requests, requests per hour of match time against the budget, and how many match minutes
+after the event each trigger email went out.
+
+    python -m benchmarks.bench_live --speed 10 --min-interval 0.2 --max-interval 2 --budget 30
+    python -m benchmarks.bench_live --match recorded_match.json
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import tempfile
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.stub_rapid_api import LEAGUE_NAME, ReplayRapidAPI
+from live import LivePoller
+from main import FootballBuddy
+
+NO_TRIGGER = '{"trigger": "no", "reason": null}'
+
+
+class RecordingMailer:
+    """EmailSender stand-in remembering the replay minute at which each email was sent"""
+    def __init__(self, stub):
+        self.stub = stub
+        self.sent = []
+
+    def format_email(self, subject, receiver_email, content, is_html=False):
+        return {"subject": subject, "content": content}
+
+    def send_email(self, msg):
+        self.sent.append({**msg, "minute": self.stub.minute()})
+
+    def send_many(self, msgs):
+        for msg in msgs:
+            self.send_email(msg)
+        return [None] * len(msgs)
+
+
+def run(match, speed, min_interval, max_interval, backoff, budget):
+    """:param budget: requests per match minute"""
+    with ReplayRapidAPI(match=match, minutes_per_second=speed, latency=0.005) as stub:
+        foo_bud = FootballBuddy(date="2024-08-10", team="Slavia", rapidapi_url=stub.base_url, rapidapi_apikey="bench",
+                                rapidapi_host="localhost",
+                                sqlite_db_name=os.path.join(tempfile.mkdtemp(), "bench.db"))
+        foo_bud.get_llm = lambda name: FakeChatModel(latency=0.02, reply=NO_TRIGGER)
+        mailer = RecordingMailer(stub)
+        team = {"team": "Slavia", "league": LEAGUE_NAME, "country_code": "cz", "season": 2024}
+        # Budget per match minute, scaled to the replay speed (one replay second = `speed` match minutes)
+        poller = LivePoller(foo_bud, teams=[team], mailer=mailer, receiver_email="bench@localhost",
+                            min_interval=min_interval, max_interval=max_interval, backoff=backoff,
+                            requests_per_hour=budget * speed * 3600)
+        summary = poller.run(duration=(stub.full_time + 2) / speed)
+
+    summary["requests_per_match_minute"] = round(summary.pop("requests_per_hour") / 3600 / speed, 2)
+    # Reasons of the rules name the minutes of the events
+    delays = [m["minute"] - max(int(minute) for minute in re.findall(r"in minute (\d+)", m["content"]) or [0])
+              for m in mailer.sent]
+    return summary, mailer.sent, delays
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--match", help="JSON file with one get_full_data item to replay")
+    parser.add_argument("--speed", type=float, default=10, help="Match minutes replayed per second")
+    parser.add_argument("--min-interval", type=float, default=0.2, help="Seconds")
+    parser.add_argument("--max-interval", type=float, default=2.0, help="Seconds")
+    parser.add_argument("--budget", type=float, default=30, help="Max requests per match minute")
+    args = parser.parse_args()
+    logging.basicConfig(level="WARNING")
+
+    match = None
+    if args.match:
+        with open(args.match, "r") as f:
+            match = json.load(f)
+
+    for label, backoff in [("fixed interval", 1.0), ("adaptive interval", 1.5)]:
+        summary, sent, delays = run(match, args.speed, args.min_interval, args.max_interval, backoff, args.budget)
+        print(f"{label}: {summary}")
+        for msg, delay in zip(sent, delays):
+            print(f"   {msg['subject']} -> sent {delay:.1f} match minutes later: {msg['content']}")
@@ -0,0 +1,56 @@
+"""
+Compares sequential LLM calls with the concurrent batch mode of OpenAIOperations, using a fake chat model with a
+fixed latency per call. Checks that answers stay matched to their inputs and that slow calls time out. Finally
+reruns the batch with the LLM answer cache, as when reprocessing a date.
+
+    python -m benchmarks.bench_llm_batch --calls 40 --latency 0.2 --concurrency 1 4 16
+"""
+import argparse
+import time
+
+from benchmarks.fake_llm import FakeChatModel
+from disk_cache import DiskCache
+from llm_operations import LLMCache, OpenAIOperations
+
+PROMPT = "Describe the match.\n{data}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per fake LLM call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    oai_ops = OpenAIOperations()
+    llm = FakeChatModel(latency=args.latency)
+    inputs = [{"data": f"fixture {i}"} for i in range(args.calls)]
+    expected = [d["data"] for d in inputs]
+
+    start = time.perf_counter()
+    sequential = [oai_ops.llm_query_data(llm=llm, prompt=PROMPT, placeholder_and_data=d) for d in inputs]
+    baseline = time.perf_counter() - start
+    assert sequential == expected
+    print(f"{args.calls} calls, {args.latency * 1000:.0f} ms each")
+    print(f"   sequential: {baseline:7.3f} s")
+
+    for c in args.concurrency:
+        start = time.perf_counter()
+        results = OpenAIOperations(max_concurrency=c).llm_query_batch(llm=llm, prompt=PROMPT,
+                                                                      placeholders_and_data=inputs)
+        elapsed = time.perf_counter() - start
+        assert results == expected, "Batch answers are not in input order!"
+        print(f"concurrency {c:>2}: {elapsed:7.3f} s  (speedup x{baseline / elapsed:.1f})")
+
+    results = oai_ops.llm_query_batch(llm=FakeChatModel(latency=args.latency * 2), prompt=PROMPT,
+                                      placeholders_and_data=inputs[:3], timeout=args.latency)
+    assert results == [None, None, None], "Slow calls did not time out!"
+    print("Calls slower than the timeout are given up")
+
+    cached_ops = OpenAIOperations(max_concurrency=max(args.concurrency), cache=LLMCache(DiskCache(":memory:")))
+    for label in ["cold", "warm"]:
+        start = time.perf_counter()
+        results = cached_ops.llm_query_batch(llm=llm, prompt=PROMPT, placeholders_and_data=inputs)
+        assert results == expected
+        print(f"{label} cache: {time.perf_counter() - start:7.3f} s")
+    print(f"Cache stats: {cached_ops.cache.stats()}")
@@ -0,0 +1,32 @@
+"""
+Compares raw and compact match description payloads of synthetic fixtures: bytes, tokens and compaction time.
+
+    python -m benchmarks.bench_payload --fixtures 50 --token-budget 1500
+"""
+import argparse
+import time
+
+from benchmarks.stub_rapid_api import make_full_data
+from payload_compactor import PayloadCompactor, summarize_reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=50)
+    parser.add_argument("--token-budget", type=int)
+    parser.add_argument("--show", type=int, default=5, help="Number of per-fixture reports to print")
+    args = parser.parse_args()
+
+    compactor = PayloadCompactor(token_budget=args.token_budget)
+    matches = [make_full_data(i + 1) for i in range(args.fixtures)]
+
+    start = time.perf_counter()
+    reports = [compactor.compact(m)[1] for m in matches]
+    elapsed = time.perf_counter() - start
+
+    for r in reports[:args.show]:
+        print(f"fixture {r['fixture_id']:>4}: {r['raw_bytes']:>6} -> {r['compact_bytes']:>5} bytes, "
+              f"{r['raw_tokens']:>5} -> {r['compact_tokens']:>5} tokens"
+              f"{' (estimated)' if r['tokens_estimated'] else ''}")
+    print(f"Total: {summarize_reports(reports)}")
+    print(f"Compaction (incl. token counting): {elapsed / len(matches) * 1000:.2f} ms per fixture")
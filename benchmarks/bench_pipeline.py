@@ -0,0 +1,142 @@
+"""
+End-to-end benchmark of a day's run (fetch, describe, store, trigger detection and email) for 1, 50 and 500
+fixtures, replayed offline. Each size is recorded once against the local stub servers and the fake chat model, then
+replayed with fixed per-backend latencies, so that runs are repeatable and only the code under test varies.
+Reports end-to-end and per-stage seconds and fixtures/s; with --baseline, fails on stages that got slower than the
+tolerance, e.g. to compare a branch with the results of main saved with --output.
+
+    python -m benchmarks.bench_pipeline --sizes 1 50 500 --output bench_pipeline.json
+    python -m benchmarks.bench_pipeline --baseline bench_pipeline.json --tolerance 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.stub_rapid_api import LEAGUE_NAME, StubRapidAPI
+from benchmarks.stub_smtp import StubSMTP
+from main import FootballBuddy
+from metrics import Metrics
+from pipeline import StreamingPipeline
+from replay import Replay
+from replay_llm import ReplayChatModel
+from send_email import EmailSender
+
+DATE = "2024-08-10"
+TRIGGER = '{"trigger": "yes", "reason": "Unusual match"}'
+RECEIVERS = [f"subscriber{i}@localhost" for i in range(5)]
+
+
+def make_football_buddy(rapidapi_url, replay, metrics):
+    return FootballBuddy(date=DATE, team="Slavia", rapidapi_url=rapidapi_url, rapidapi_apikey="bench",
+                         rapidapi_host="localhost", rapidapi_max_workers=8, resume=False, metrics=metrics,
+                         sqlite_db_name=os.path.join(tempfile.mkdtemp(), "bench.db"), replay=replay)
+
+
+def run_day(foo_bud, mailer):
+    """Same stages as main.py for one day"""
+    triggers, stats = StreamingPipeline(foo_bud).run(season=2024, league=LEAGUE_NAME, country_code="cz")
+    if triggers:
+        foo_bud.email_triggers(mailer, triggers, subject="There was a cool match!", receiver_email=RECEIVERS)
+    return stats
+
+
+def record(directory, n_fixtures):
+    """Records a run against the stub servers and the fake chat model, answering with a trigger for every match"""
+    replay = Replay(directory, mode="record")
+    with StubRapidAPI(n_fixtures=n_fixtures, latency=0) as api, \
+            StubSMTP(connect_latency=0, login_latency=0, latency=0) as smtp:
+        foo_bud = make_football_buddy(api.base_url, replay, Metrics())
+
+        def get_llm(name):
+            llm_config = foo_bud.prompts[name]["main"]["llm"]
+            fake = FakeChatModel(latency=0, reply=TRIGGER if name == "trigger_detection" else "Description")
+            return ReplayChatModel(cassette=replay.llm, llm=fake, model_name=llm_config["name"],
+                                   temperature=llm_config["temperature"])
+
+        foo_bud.get_llm = get_llm
+        host, port = smtp.address
+        with EmailSender(host=host, port=port, sender_email="football-buddy@localhost", sender_password="bench",
+                         use_ssl=False, metrics=foo_bud.metrics, cassette=replay.smtp) as mailer:
+            run_day(foo_bud, mailer)
+        foo_bud.db_ops.close()
+    replay.save()
+
+
+def replay_run(directory, latency, pool_size):
+    metrics = Metrics()
+    replay = Replay(directory, mode="replay", latency=latency)
+    foo_bud = make_football_buddy("http://replay.invalid/v3", replay, metrics)
+    mailer = EmailSender(host="replay.invalid", port=25, sender_email="football-buddy@localhost",
+                         sender_password=None, pool_size=pool_size, metrics=metrics, cassette=replay.smtp)
+    start = time.perf_counter()
+    with mailer:
+        stats = run_day(foo_bud, mailer)
+    elapsed = time.perf_counter() - start
+    foo_bud.db_ops.close()
+
+    stages = {h["labels"]["stage"]: h for h in metrics.report()["histograms"].get("stage_seconds", [])}
+    return {"fixtures": stats["fixtures"], "triggers": stats["triggers"], "seconds": round(elapsed, 3),
+            "fixtures_per_second": round(stats["fixtures"] / elapsed, 1),
+            # Stages overlap and fetches run concurrently, so their seconds can add up to more than the whole run
+            "stages": {stage: {"seconds": round(h["sum"], 3), "calls": h["count"], "p95": h["p95"]}
+                       for stage, h in sorted(stages.items())}}
+
+
+def regressions(results, baseline, tolerance, min_delta):
+    found = []
+    for size, result in results.items():
+        if size not in baseline:
+            continue
+        pairs = [("end-to-end", result["seconds"], baseline[size]["seconds"])] + [
+            (stage, r["seconds"], baseline[size]["stages"][stage]["seconds"])
+            for stage, r in result["stages"].items() if stage in baseline[size]["stages"]]
+        for name, seconds, before in pairs:
+            if seconds > before * (1 + tolerance) and seconds - before > min_delta:
+                found.append(f"{size} fixtures, {name}: {before:.3f} s -> {seconds:.3f} s")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 500], help="Fixtures per day")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Seconds per replayed RapidAPI request")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per replayed LLM call")
+    parser.add_argument("--smtp-latency", type=float, default=0.01, help="Seconds per replayed email")
+    parser.add_argument("--pool-size", type=int, default=2, help="SMTP connections")
+    parser.add_argument("--cassettes", help="Directory of the recorded runs, recorded anew if missing")
+    parser.add_argument("--output", help="Write the results as JSON, e.g. as a baseline for later runs")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs. the baseline")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="Slowdowns of fewer seconds are ignored as noise, e.g. of stages taking milliseconds")
+    args = parser.parse_args()
+    logging.basicConfig(level="ERROR")
+
+    cassettes = args.cassettes or tempfile.mkdtemp()
+    latency = {"rapidapi": args.api_latency, "llm": args.llm_latency, "smtp": args.smtp_latency}
+    results = {}
+    for size in args.sizes:
+        directory = os.path.join(cassettes, f"{size}_fixtures")
+        if not os.path.exists(os.path.join(directory, "rapidapi.json")):
+            record(directory, size)
+        results[str(size)] = result = replay_run(directory, latency, args.pool_size)
+        print(f"{size:>4} fixtures: {result['seconds']:7.3f} s, {result['fixtures_per_second']:6.1f} fixtures/s, "
+              f"{result['triggers']} triggers")
+        for stage, r in result["stages"].items():
+            print(f"      {stage:<9} {r['seconds']:8.3f} s in {r['calls']:>4} calls, p95 {r['p95']:.3f} s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"latency": latency, "results": results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        if found := regressions(results, baseline, args.tolerance, args.min_delta):
+            print("Regressions vs. the baseline:\n" + "\n".join(found))
+            sys.exit(1)
+        print(f"No regressions vs. the baseline (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,80 @@
+"""
+Compares sequential and concurrent RapidDataRetriever.get_full_data against a local stub server. With --cache,
+also compares a cold run with a rerun served from the on-disk response cache. With --rate-limit, the stub
+throttles requests and the retriever runs with a client-side rate limiter.
+
+    python -m benchmarks.bench_retriever --fixtures 30 --latency 0.05 --workers 1 4 8 16
+    python -m benchmarks.bench_retriever --cache
+    python -m benchmarks.bench_retriever --rate-limit 20 --workers 16
+"""
+import argparse
+import time
+
+from benchmarks.stub_rapid_api import LEAGUE_NAME, StubRapidAPI
+from data_retriever import RapidDataRetriever
+from disk_cache import DiskCache
+from rate_limiter import RateLimiter
+
+
+def fetch(stub, workers, cache=None, rate_limiter=None):
+    radar = RapidDataRetriever(base_url=stub.base_url, apikey="bench", host="localhost", max_workers=workers,
+                               cache=cache, rate_limiter=rate_limiter)
+    radar.get_league_id(LEAGUE_NAME, "cz")  # Resolve league outside the timed section
+
+    start = time.perf_counter()
+    data = radar.get_full_data(date="2024-08-10", season=2024, league=LEAGUE_NAME, country_code="cz")
+    elapsed = time.perf_counter() - start
+
+    assert [d["fixture_id"] for d in data] == list(range(1, len(data) + 1)), "Fixture order not preserved!"
+    return elapsed
+
+
+def run(n_fixtures, latency, workers):
+    with StubRapidAPI(n_fixtures=n_fixtures, latency=latency) as stub:
+        return fetch(stub, workers)
+
+
+def run_cached(n_fixtures, latency, workers):
+    cache = DiskCache(":memory:")
+    with StubRapidAPI(n_fixtures=n_fixtures, latency=latency) as stub:
+        for label in ["cold", "warm"]:
+            served_before = stub.requests_served
+            elapsed = fetch(stub, workers, cache=cache)
+            print(f"{label} cache: {elapsed:7.3f} s, {stub.requests_served - served_before} network requests")
+    print(f"Cache stats: {cache.stats()}")
+
+
+def run_rate_limited(n_fixtures, latency, workers, rate_limit):
+    # The limiter starts above the server limit and learns the real one from the response headers
+    limiter = RateLimiter(requests_per_minute=rate_limit * 2 * 60, backoff=0.2)
+    with StubRapidAPI(n_fixtures=n_fixtures, latency=latency, rate_limit=rate_limit) as stub:
+        elapsed = fetch(stub, workers, rate_limiter=limiter)
+        print(f"{stub.requests_served} requests served, {stub.requests_throttled} throttled with 429, "
+              f"{elapsed:.3f} s ({stub.requests_served / elapsed:.1f} requests/s, server limit {rate_limit}/s)")
+    print(f"Limiter stats: {limiter.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub server latency per request [s]")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--cache", action="store_true", help="Benchmark the response cache instead")
+    parser.add_argument("--rate-limit", type=int, help="Requests per second allowed by the stub server")
+    args = parser.parse_args()
+
+    if args.rate_limit:
+        run_rate_limited(args.fixtures, args.latency, max(args.workers), args.rate_limit)
+        raise SystemExit(0)
+
+    if args.cache:
+        run_cached(args.fixtures, args.latency, max(args.workers))
+        raise SystemExit(0)
+
+    baseline = None
+    print(f"{args.fixtures} fixtures, {args.latency * 1000:.0f} ms per request")
+    for w in args.workers:
+        elapsed = run(args.fixtures, args.latency, w)
+        baseline = baseline or elapsed
+        print(f"max_workers={w:>3}: {elapsed:7.3f} s  ({args.fixtures / elapsed:7.1f} fixtures/s, "
+              f"speedup x{baseline / elapsed:.1f})")
@@ -0,0 +1,68 @@
+"""
+Sends a batch of digests to many subscribers through the local SMTP stand-in: with a new connection and login per
+message (as EmailSender did before pooling), over one reused connection, and over a pool of connections in
+parallel. A share of recipients is refused with temporary errors, which EmailSender retries.
+
+    python -m benchmarks.bench_smtp --messages 200 --pool-size 4 --fail-rate 0.02
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.stub_smtp import StubSMTP
+from metrics import Metrics
+from send_email import EmailSender
+
+
+def run(stub, messages, pool_size, max_messages_per_connection, parallel):
+    host, port = stub.address
+    mailer = EmailSender(host=host, port=port, sender_email="football-buddy@localhost", sender_password="bench",
+                         use_ssl=False, pool_size=pool_size, backoff=0.01, metrics=Metrics(),
+                         max_messages_per_connection=max_messages_per_connection)
+    msgs = [mailer.format_email(subject="There was a cool match!", receiver_email=f"subscriber{i}@localhost",
+                                content=f"<p>Digest {i}: Slavia Praha 3:1 Sparta Praha, red card in minute 67</p>",
+                                is_html=True)
+            for i in range(messages)]
+
+    before = stub.stats()
+    start = time.perf_counter()
+    with mailer:
+        if parallel:
+            errors = mailer.send_many(msgs)
+        else:
+            errors = []
+            for msg in msgs:
+                try:
+                    mailer.send_email(msg)
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+    elapsed = time.perf_counter() - start
+    after = stub.stats()
+    retries = sum(c["value"] for c in mailer.metrics.report()["counters"].get("email_retries_total", []))
+    return {"seconds": round(elapsed, 3), "messages_per_second": round(messages / elapsed, 1),
+            "failed": sum(e is not None for e in errors), "retries": retries,
+            **{k: after[k] - before[k] for k in ["connections", "logins"]}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="Seconds of the handshake")
+    parser.add_argument("--login-latency", type=float, default=0.05, help="Seconds of the login")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds to accept a message")
+    parser.add_argument("--fail-rate", type=float, default=0.02, help="Share of temporarily refused recipients")
+    args = parser.parse_args()
+    logging.basicConfig(level="ERROR")
+
+    runs = [("connection per message", 1, 1, False),
+            ("one reused connection", 1, args.messages, False),
+            (f"pool of {args.pool_size} connections", args.pool_size, 100, True)]
+    with StubSMTP(connect_latency=args.connect_latency, login_latency=args.login_latency, latency=args.latency,
+                  fail_rate=args.fail_rate) as stub:
+        baseline = None
+        for label, pool_size, per_connection, parallel in runs:
+            result = run(stub, args.messages, pool_size, per_connection, parallel)
+            baseline = baseline or result["seconds"]
+            print(f"{label:<28} {result} (x{baseline / result['seconds']:.1f})")
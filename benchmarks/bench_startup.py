@@ -0,0 +1,63 @@
+"""
+Startup cost of the entry points, measured with python -X importtime in fresh interpreters: wall time of starting
+the interpreter and importing the module, its cumulative import time and the modules it imports that cost the most.
+For comparison, the same with the LLM and validation stacks that used to be imported at startup.
+
+    python -m benchmarks.bench_startup --modules main analytics --runs 5 --top 10
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# Imported lazily since they are only needed once fixtures get described, validated or checked for triggers
+HEAVY = ["langchain_openai", "langchain_core.prompts", "jsonschema"]
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(statement):
+    """:return: (wall seconds, [(module, nesting level, cumulative us)]) of running statement in a new interpreter"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True,
+                            check=True)
+    elapsed = time.perf_counter() - start
+    modules = [(m.group(4), len(m.group(3)) // 2, int(m.group(2)))
+               for m in map(_LINE.match, result.stderr.splitlines()) if m]
+    return elapsed, modules
+
+
+def measure(module, runs, extra=()):
+    statement = "; ".join(f"import {m}" for m in [module, *extra])
+    walls, totals, costs = [], [], {}
+    for _ in range(runs):
+        wall, modules = import_times(statement)
+        walls.append(wall)
+        totals.append(sum(us for _, level, us in modules if level == 0) / 1e6)
+        for name, level, us in modules:
+            if level == 1:
+                costs.setdefault(name, []).append(us / 1e6)
+    loaded = {name for name, _, _ in modules}
+    return {"wall": statistics.median(walls), "imports": statistics.median(totals),
+            "top": sorted(((statistics.median(v), k) for k, v in costs.items()), reverse=True),
+            "heavy": [h for h in HEAVY if h in loaded]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["main"])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement, the median is shown")
+    parser.add_argument("--top", type=int, default=8, help="Most costly imports shown per module")
+    args = parser.parse_args()
+
+    print(f"Interpreter alone: {import_times('pass')[0] * 1000:.0f} ms")
+    for module in args.modules:
+        lazy = measure(module, args.runs)
+        eager = measure(module, args.runs, extra=HEAVY)
+        print(f"{module}: {lazy['wall'] * 1000:.0f} ms to start ({lazy['imports'] * 1000:.0f} ms of imports), "
+              f"{eager['wall'] * 1000:.0f} ms with the LLM and validation stacks "
+              f"(x{eager['wall'] / lazy['wall']:.1f}); heavy stacks loaded at startup: {lazy['heavy'] or 'none'}")
+        for seconds, name in lazy["top"][:args.top]:
+            print(f"    {name:<28} {seconds * 1000:8.1f} ms")
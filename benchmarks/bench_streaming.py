@@ -0,0 +1,83 @@
+"""
+Processes one day of a league against the local stub server and a fake chat model, once stage by stage (fetch all,
+describe and store all, load all, check all for triggers) and once with the StreamingPipeline. Reports wall time,
+the peak of traced Python memory and the time until the first fixture was checked for triggers.
+
+    python -m benchmarks.bench_streaming --fixtures 200 --latency 0.02 --llm-latency 0.05
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.stub_rapid_api import LEAGUE_NAME, StubRapidAPI
+from main import FootballBuddy
+from pipeline import StreamingPipeline
+
+NO_TRIGGER = '{"trigger": "no", "reason": null}'
+
+
+def make_football_buddy(stub, llm_latency):
+    foo_bud = FootballBuddy(date="2024-08-10", team="Slavia", rapidapi_url=stub.base_url, rapidapi_apikey="bench",
+                            rapidapi_host="localhost", rapidapi_max_workers=8, resume=False,
+                            sqlite_db_name=os.path.join(tempfile.mkdtemp(), "bench.db"))
+    foo_bud.get_llm = lambda name: FakeChatModel(latency=llm_latency, reply=NO_TRIGGER
+                                                 if name == "trigger_detection" else "Description")
+    first_checked = []
+    collect_valid_triggers = foo_bud.collect_valid_triggers
+
+    def timed_collect(*args, **kwargs):
+        triggers = collect_valid_triggers(*args, **kwargs)
+        first_checked.append(time.perf_counter())
+        return triggers
+
+    foo_bud.collect_valid_triggers = timed_collect
+    return foo_bud, first_checked
+
+
+def by_stages(foo_bud):
+    raw_data = foo_bud.get_rapidapi_data(season=2024, league=LEAGUE_NAME, country_code="cz")
+    foo_bud.enrich_and_load_into_db(raw_data)
+    return foo_bud.collect_valid_triggers(foo_bud.fetch_fixture_data_for_llm())
+
+
+def streaming(foo_bud, queue_size, batch_size):
+    pipeline = StreamingPipeline(foo_bud, queue_size=queue_size, batch_size=batch_size)
+    triggers, _ = pipeline.run(season=2024, league=LEAGUE_NAME, country_code="cz")
+    return triggers
+
+
+def measure(run, stub, llm_latency):
+    foo_bud, first_checked = make_football_buddy(stub, llm_latency)
+    tracemalloc.start()
+    start = time.perf_counter()
+    triggers = run(foo_bud)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    foo_bud.db_ops.close()
+    return len(triggers), elapsed, peak, first_checked[0] - start if first_checked else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub server latency per request [s]")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake chat model latency per call [s]")
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+    logging.basicConfig(level="WARNING")
+
+    runs = [("stage by stage", by_stages),
+            ("streaming pipeline", lambda fb: streaming(fb, args.queue_size, args.batch_size))]
+    with StubRapidAPI(n_fixtures=args.fixtures, latency=args.latency) as stub:
+        baseline = None
+        for label, run in runs:
+            triggers, elapsed, peak, first = measure(run, stub, args.llm_latency)
+            baseline = baseline or (elapsed, peak)
+            print(f"{label:<20} {elapsed:7.3f} s (x{baseline[0] / elapsed:.2f}), peak memory {peak / 2 ** 20:6.1f} MiB "
+                  f"(x{baseline[1] / peak:.2f}), first fixture checked after {first:6.3f} s, {triggers} triggers")
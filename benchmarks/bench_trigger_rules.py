@@ -0,0 +1,37 @@
+"""
+Runs the rule-based trigger pre-filter over a synthetic season stored in SQLite and reports which share of
+matches it decides without the LLM, and how long the rules take per match.
+
+    python -m benchmarks.bench_trigger_rules --fixtures 240 --team Slavia
+"""
+import argparse
+import time
+from collections import Counter
+
+from benchmarks.bench_db_inserts import synthetic_season
+from db_operations import SQLiteOperations
+from trigger_rules import TriggerRules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=240)
+    parser.add_argument("--team", default="Slavia")
+    args = parser.parse_args()
+
+    db_ops = SQLiteOperations(db_name=":memory:")
+    db_ops.create_tables()
+    fixtures = synthetic_season(args.fixtures)
+    db_ops.insert_into_fixtures(fixtures)
+    matches = db_ops.fetch_matches_bulk(fixture_ids=[f["fixture_id"] for f in fixtures],
+                                        parts=("events", "stats", "teams"))
+
+    rules = TriggerRules(team=args.team)
+    start = time.perf_counter()
+    decisions = [rules.evaluate(m) for m in matches]
+    elapsed = time.perf_counter() - start
+
+    outcome = Counter(d["trigger"] if d else "LLM" for d in decisions)
+    print(f"{len(matches)} matches in {elapsed * 1000:.1f} ms ({elapsed / len(matches) * 1e6:.0f} us per match)")
+    print(f"decided yes: {outcome['yes']}, decided no: {outcome['no']}, left for the LLM: {outcome['LLM']} "
+          f"-> {1 - outcome['LLM'] / len(matches):.0%} fewer LLM calls")
@@ -0,0 +1,74 @@
+"""
+Compares jsonschema.validate per call with the prebuilt and the compiled validators of validation.SchemaValidator on
+a large batch of synthetic fixtures and LLM answers, and full vs. lazy error collection on invalid fixtures.
+
+    python -m benchmarks.bench_validation --fixtures 500
+"""
+import argparse
+import copy
+import time
+
+import jsonschema
+
+from benchmarks.stub_rapid_api import make_full_data
+from validation import SchemaValidator
+
+
+def timed(label, func, items, baseline=None):
+    start = time.perf_counter()
+    results = [func(item) for item in items]
+    elapsed = time.perf_counter() - start
+    speedup = f"  (speedup x{baseline / elapsed:.1f})" if baseline else ""
+    print(f"   {label:<32} {elapsed:7.3f} s, {elapsed / len(items) * 1e6:8.1f} us per item{speedup}")
+    return elapsed, results
+
+
+def per_call(schema):
+    def validate(data):
+        try:
+            jsonschema.validate(instance=data, schema=schema)
+            return True
+        except jsonschema.exceptions.ValidationError:
+            return False
+    return validate
+
+
+def break_fixture(match):
+    """Invalid copy with errors in many events"""
+    match = copy.deepcopy(match)
+    for e in match["events"]:
+        e["time"]["elapsed"] = str(e["time"]["elapsed"])
+    match["about"]["goals"]["home"] = "two"
+    return match
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=int, default=500)
+    args = parser.parse_args()
+
+    rapid_data = SchemaValidator.from_file("rapid_data")
+    llm_answer = SchemaValidator.from_file("llm_answer")
+    matches = [make_full_data(i % 200 + 1) for i in range(args.fixtures)]
+    answers = [{"trigger": ["yes", "no"][i % 2], "reason": f"Reason {i}" if i % 2 == 0 else None}
+               for i in range(args.fixtures * 5)]
+
+    invalid = [break_fixture(m) for m in matches[:args.fixtures // 10]]
+    # Some invalid items, to check that all ways of validation agree
+    batches = [("fixtures", rapid_data, matches + invalid[:10]),
+               ("LLM answers", llm_answer, answers + [{"trigger": "maybe", "reason": None}, {"trigger": "yes"}])]
+
+    for label, validator, items in batches:
+        print(f"{len(items)} {label}:")
+        baseline, expected = timed("jsonschema.validate per call", per_call(validator.schema), items)
+        _, results = timed("prebuilt jsonschema validator", lambda d: not validator.errors(d, limit=1), items,
+                           baseline)
+        assert results == expected
+        _, results = timed("SchemaValidator.is_valid", validator.is_valid, items, baseline)
+        assert results == expected, "Compiled validator disagrees with jsonschema!"
+
+    print(f"{len(invalid)} invalid fixtures:")
+    baseline, all_errors = timed("all errors", lambda m: list(rapid_data.iter_errors(m)), invalid)
+    _, first_errors = timed("first 3 errors (lazy)", lambda m: rapid_data.errors(m, limit=3), invalid, baseline)
+    print(f"   {sum(map(len, all_errors)) / len(invalid):.1f} errors per fixture, "
+          f"{sum(map(len, first_errors)) / len(invalid):.1f} collected lazily")
@@ -0,0 +1,36 @@
+"""
+Chat model stand-in for benchmarks: answers after a fixed latency, without any network calls.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.1
+    """Seconds each call takes"""
+    reply: Optional[str] = None
+    """Fixed answer; if None, the model echoes the last line of the prompt, so answers can be matched to inputs"""
+    model_name: str = "fake-chat-model"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _answer(self, messages):
+        if self.reply is not None:
+            return self.reply
+        return messages[-1].content.strip().splitlines()[-1]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
@@ -0,0 +1,271 @@
+"""
+Local stand-in for the RapidAPI football endpoints used by RapidDataRetriever. Serves synthetic, schema-valid
+data with a configurable per-request latency so that retrieval can be benchmarked without touching the paid API.
+ReplayRapidAPI replays a recorded match as if it was played live.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+log = logging.getLogger(__name__)
+
+LEAGUE_ID = 345
+LEAGUE_NAME = "Czech Liga"
+TEAM_NAMES = ["Slavia Praha", "Sparta Praha", "Plzen", "Banik Ostrava", "Sigma Olomouc", "Slovacko",
+              "Bohemians 1905", "Mlada Boleslav", "Jablonec", "Liberec", "Teplice", "Hradec Kralove",
+              "Karvina", "Pardubice", "Dukla Praha", "Zlin"]
+STAT_TYPES = ["Shots on Goal", "Shots off Goal", "Total Shots", "Blocked Shots", "Shots insidebox",
+              "Shots outsidebox", "Fouls", "Corner Kicks", "Offsides", "Ball Possession", "Yellow Cards",
+              "Red Cards", "Goalkeeper Saves", "Total passes", "Passes accurate", "Passes %"]
+
+
+def make_team(team_idx):
+    return {"id": 500 + team_idx, "name": TEAM_NAMES[team_idx % len(TEAM_NAMES)],
+            "logo": f"https://media.api-sports.io/football/teams/{500 + team_idx}.png"}
+
+
+def make_fixture(fixture_id, date="2024-08-10", seed=None):
+    rnd = random.Random(fixture_id if seed is None else seed)
+    home, away = rnd.sample(range(len(TEAM_NAMES)), 2)
+    goals = {"home": rnd.randint(0, 4), "away": rnd.randint(0, 3)}
+    halftime = {"home": min(goals["home"], rnd.randint(0, 2)), "away": min(goals["away"], rnd.randint(0, 2))}
+    winner = None if goals["home"] == goals["away"] else goals["home"] > goals["away"]
+    return {
+        "fixture": {
+            "id": fixture_id,
+            "date": f"{date}T{rnd.randint(12, 20)}:00:00+02:00",
+            "periods": {"first": 1723291200, "second": 1723294800},
+            "referee": "J. Novak",
+            "status": {"elapsed": 90, "extra": rnd.randint(1, 6), "long": "Match Finished", "short": "FT"},
+            "timestamp": 1723291200 + fixture_id,
+            "timezone": "UTC",
+            "venue": {"city": "Praha", "id": 1000 + home, "name": f"Stadium {home}"}},
+        "goals": goals,
+        "league": {"country": "Czech-Republic", "flag": "https://media.api-sports.io/flags/cz.svg",
+                   "id": LEAGUE_ID, "logo": "https://media.api-sports.io/football/leagues/345.png",
+                   "name": LEAGUE_NAME, "round": "Regular Season - 3", "season": 2024, "standings": True},
+        "score": {"extratime": {"away": None, "home": None}, "fulltime": goals, "halftime": halftime,
+                  "penalty": {"away": None, "home": None}},
+        "teams": {"home": {**make_team(home), "winner": winner},
+                  "away": {**make_team(away), "winner": None if winner is None else not winner}}}
+
+
+def make_events(fixture_id, n_events=None):
+    rnd = random.Random(fixture_id * 31)
+    fixture = make_fixture(fixture_id)
+    teams = [fixture["teams"]["home"], fixture["teams"]["away"]]
+    kinds = [("Goal", "Normal Goal"), ("Card", "Yellow Card"), ("subst", "Substitution 1"),
+             ("Card", "Red Card"), ("Goal", "Penalty"), ("Var", "Goal cancelled")]
+    events = []
+    for i in range(n_events if n_events is not None else rnd.randint(8, 40)):
+        team = rnd.choice(teams)
+        type_, detail = rnd.choices(kinds, weights=[3, 5, 6, 1, 1, 1])[0]
+        events.append({
+            "time": {"elapsed": min(90, 2 + i * 2), "extra": rnd.choice([None, None, None, 2])},
+            "team": {"id": team["id"], "name": team["name"], "logo": team["logo"]},
+            "player": {"id": 9000 + i, "name": f"Player {i}"},
+            "assist": {"id": None, "name": rnd.choice([None, f"Player {i + 1}"])},
+            "type": type_,
+            "detail": detail,
+            "comments": rnd.choice([None, None, "Foul"])})
+    return events
+
+
+def make_stats(fixture_id):
+    rnd = random.Random(fixture_id * 17)
+    fixture = make_fixture(fixture_id)
+    possession = rnd.randint(30, 70)
+    stats = []
+    for side, poss in (("home", possession), ("away", 100 - possession)):
+        team = fixture["teams"][side]
+        statistics = []
+        for type_ in STAT_TYPES:
+            if type_ == "Ball Possession":
+                value = f"{poss}%"
+            elif type_ == "Passes %":
+                value = f"{rnd.randint(60, 90)}%"
+            else:
+                value = rnd.choice([None, rnd.randint(0, 20)]) if type_ == "Red Cards" else rnd.randint(0, 20)
+            statistics.append({"type": type_, "value": value})
+        stats.append({"team": {"id": team["id"], "name": team["name"], "logo": team["logo"]},
+                      "statistics": statistics})
+    return stats
+
+
+def make_full_data(fixture_id, date="2024-08-10"):
+    """Same structure as one item of RapidDataRetriever.get_full_data"""
+    about = make_fixture(fixture_id, date)
+    about["fixture"].pop("id")
+    return {"fixture_id": fixture_id, "about": about, "events": make_events(fixture_id),
+            "stats": make_stats(fixture_id)}
+
+
+def make_live_match(team_name="Slavia Praha"):
+    """Synthetic recording of a whole match of the given team with a red card, as one get_full_data item"""
+    fixture_id = next(i for i in range(1, 1000)
+                      if team_name in [t["name"] for t in make_fixture(i)["teams"].values()])
+    match = make_full_data(fixture_id)
+    team = next(t for t in match["about"]["teams"].values() if t["name"] == team_name)
+    red_card = {"time": {"elapsed": 67, "extra": None}, "team": {k: team[k] for k in ["id", "name", "logo"]},
+                "player": {"id": 9999, "name": "Player 99"}, "assist": {"id": None, "name": None},
+                "type": "Card", "detail": "Red Card", "comments": "Violent conduct"}
+    match["events"] = sorted(match["events"] + [red_card], key=lambda e: e["time"]["elapsed"])
+    return match
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Default backlog of 5 drops connections under concurrent load
+
+
+class StubRapidAPI:
+    def __init__(self, n_fixtures=20, latency=0.05, rate_limit=None, host="127.0.0.1", port=0):
+        """
+        :param n_fixtures: number of fixtures returned for any date
+        :param latency: seconds to sleep before answering each request
+        :param rate_limit: requests allowed per second, further requests within the second get 429
+        """
+        self.n_fixtures = n_fixtures
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests_served = 0
+        self.requests_throttled = 0
+        self._window = (0, 0)  # (second, requests in that second)
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def respond(self, path, params):
+        if path.endswith("/leagues"):
+            return [{"league": {"id": LEAGUE_ID, "name": LEAGUE_NAME}}]
+        if path.endswith("/fixtures/events"):
+            return make_events(int(params["fixture"]))
+        if path.endswith("/fixtures/statistics"):
+            return make_stats(int(params["fixture"]))
+        if path.endswith("/fixtures"):
+            date = params.get("date", "2024-08-10")
+            return [make_fixture(i + 1, date) for i in range(self.n_fixtures)]
+        return None
+
+    def throttle(self):
+        """:return: number of requests left in the current second, negative if over the limit"""
+        with self._lock:
+            second, count = self._window
+            now = int(time.monotonic())
+            count = count + 1 if now == second else 1
+            self._window = (now, count)
+            return self.rate_limit - count
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                time.sleep(stub.latency)
+                if stub.rate_limit is not None and (remaining := stub.throttle()) < 0:
+                    with stub._lock:
+                        stub.requests_throttled += 1
+                    self.send_response(429)
+                    self.send_header("X-RateLimit-Limit", str(stub.rate_limit * 60))
+                    self.send_header("X-RateLimit-Remaining", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with stub._lock:
+                    stub.requests_served += 1
+
+                response = stub.respond(parsed.path, params)
+                if response is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps({"response": response, "results": len(response)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if stub.rate_limit is not None:
+                    self.send_header("X-RateLimit-Limit", str(stub.rate_limit * 60))
+                    self.send_header("X-RateLimit-Remaining", str(max(0, remaining)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ReplayRapidAPI(StubRapidAPI):
+    def __init__(self, match=None, minutes_per_second=10.0, kickoff_delay=0.0, **kwargs):
+        """
+        Replays the timeline of a recorded match as if it was played right now: the live fixtures listing
+        (/fixtures?live=...) contains the match between kickoff and its last event, with the score and minute
+        of the replay clock; its events endpoint returns the events up to the current minute.
+        :param match: one get_full_data item, e.g. loaded from a JSON recording; make_live_match() by default
+        :param minutes_per_second: match minutes replayed per second
+        :param kickoff_delay: seconds between entering the context and kickoff
+        """
+        super().__init__(n_fixtures=1, **kwargs)
+        self.match = match or make_live_match()
+        self.minutes_per_second = minutes_per_second
+        self.kickoff_delay = kickoff_delay
+        self.full_time = max([90] + [self.event_minute(e) for e in self.match["events"]])
+        self._kickoff = None
+
+    @staticmethod
+    def event_minute(event):
+        return event["time"]["elapsed"] + (event["time"]["extra"] or 0)
+
+    def minute(self):
+        """Current minute of the replayed match, negative before kickoff"""
+        return (time.monotonic() - self._kickoff) * self.minutes_per_second
+
+    def events_until(self, minute):
+        return [e for e in self.match["events"] if self.event_minute(e) <= minute]
+
+    def fixture_at(self, minute):
+        about = json.loads(json.dumps(self.match["about"]))
+        about["fixture"]["id"] = self.match["fixture_id"]
+        about["fixture"]["status"] = {"elapsed": min(90, int(minute)), "extra": None,
+                                      "long": "First Half" if minute < 45 else "Second Half",
+                                      "short": "1H" if minute < 45 else "2H"}
+        team_sides = {about["teams"][side]["id"]: side for side in ["home", "away"]}
+        goals = {"home": 0, "away": 0}
+        for e in self.events_until(minute):
+            if e["type"] == "Goal" and e["detail"] != "Missed Penalty":
+                goals[team_sides.get(e["team"]["id"], "home")] += 1
+        about["goals"] = goals
+        about["score"]["fulltime"] = {"home": None, "away": None}
+        return about
+
+    def respond(self, path, params):
+        if path.endswith("/fixtures") and "live" in params:
+            minute = self.minute()
+            return [self.fixture_at(minute)] if 0 <= minute <= self.full_time else []
+        if path.endswith("/fixtures/events") and int(params["fixture"]) == self.match["fixture_id"]:
+            return self.events_until(self.minute())
+        return super().respond(path, params)
+
+    def __enter__(self):
+        self._kickoff = time.monotonic() + self.kickoff_delay
+        return super().__enter__()
@@ -0,0 +1,122 @@
+"""
+Local stand-in for an SMTP server (in the spirit of aiosmtpd's debugging server, without the dependency). Accepts
+any login and message with configurable latencies of the connection handshake, the login and each message, and can
+answer a share of recipients with a temporary 451 error, so that EmailSender can be benchmarked offline.
+"""
+import logging
+import random
+import socketserver
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class StubSMTP:
+    def __init__(self, connect_latency=0.05, login_latency=0.05, latency=0.005, fail_rate=0.0, seed=0,
+                 host="127.0.0.1", port=0):
+        """
+        :param connect_latency: seconds before the greeting, e.g. TCP and TLS handshakes with a remote server
+        :param login_latency: seconds to answer AUTH
+        :param latency: seconds to accept each message
+        :param fail_rate: share of RCPT commands answered with 451 (temporary failure)
+        """
+        self.connect_latency = connect_latency
+        self.login_latency = login_latency
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.connections = self.logins = self.messages = self.rejected = 0
+        self.recipients = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def stats(self):
+        with self._lock:
+            return {"connections": self.connections, "logins": self.logins, "messages": self.messages,
+                    "rejected": self.rejected}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            setattr(self, key, getattr(self, key) + value)
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, *lines):
+                for line in lines[:-1]:
+                    self.wfile.write(f"{line[:3]}-{line[4:]}\r\n".encode())
+                self.wfile.write(f"{lines[-1]}\r\n".encode())
+
+            def handle(self):
+                stub._count("connections")
+                time.sleep(stub.connect_latency)
+                self.reply("220 stub-smtp ESMTP ready")
+                recipients = []
+                while line := self.rfile.readline():
+                    command = line.decode(errors="replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self.reply("250 stub-smtp", "250 AUTH PLAIN LOGIN", "250 8BITMIME")
+                    elif verb == "HELO":
+                        self.reply("250 stub-smtp")
+                    elif verb == "AUTH":
+                        time.sleep(stub.login_latency)
+                        stub._count("logins")
+                        if command.upper().split()[1:2] == ["LOGIN"]:  # Username and password asked one by one
+                            for prompt in ["334 VXNlcm5hbWU6", "334 UGFzc3dvcmQ6"]:
+                                self.reply(prompt)
+                                self.rfile.readline()
+                        self.reply("235 2.7.0 Authentication successful")
+                    elif verb == "MAIL":
+                        recipients = []
+                        self.reply("250 2.1.0 OK")
+                    elif verb == "RCPT":
+                        with stub._lock:
+                            failed = stub._random.random() < stub.fail_rate
+                        if failed:
+                            stub._count("rejected")
+                            self.reply("451 4.3.0 Temporary failure, try again later")
+                        else:
+                            recipients.append(command.split(":", 1)[1].strip(" <>"))
+                            self.reply("250 2.1.5 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        while (data := self.rfile.readline()) and data.rstrip(b"\r\n") != b".":
+                            pass
+                        time.sleep(stub.latency)
+                        with stub._lock:
+                            stub.messages += 1
+                            stub.recipients += recipients
+                        self.reply("250 2.0.0 Queued")
+                    elif verb in ("RSET", "NOOP"):
+                        recipients = []
+                        self.reply("250 2.0.0 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 2.0.0 Bye")
+                        return
+                    else:
+                        self.reply("502 5.5.2 Command not implemented")
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,11 +1,19 @@
 import logging
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from functools import wraps
+from itertools import islice
 from pprint import pprint as pp
 
-import jsonschema
 import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import FINISHED_STATUSES, NO_CACHE, CachingAdapter
+from metrics import METRICS
+from rate_limiter import RateLimitedAdapter
+from replay import ReplayAdapter
+from validation import SchemaValidator
 
 log = logging.getLogger(__name__)
 
@@ -20,20 +28,66 @@ def response_handler(func):
     return wrapper
 
 
+def fixture_state(fixture):
+    """
+    Parts of a /fixtures listing item that change while the fixture is played, comparable with
+    SQLiteOperations.fetch_fixture_states. Works for the "about" part of get_full_data items too.
+    """
+    status = fixture["fixture"]["status"]
+    return status["long"], status["elapsed"], fixture["goals"]["home"], fixture["goals"]["away"]
+
+
+def is_finished(fixture):
+    """Whether a /fixtures listing item (or the "about" part of a get_full_data item) won't change anymore"""
+    return fixture["fixture"]["status"]["short"] in FINISHED_STATUSES
+
+
 class RapidDataRetriever:
-    def __init__(self, base_url, apikey, host):
+    def __init__(self, base_url, apikey, host, max_workers=1, cache=None, cache_ttl=None, rate_limiter=None,
+                 metrics=None, cassette=None):
+        """
+        :param max_workers: max number of fixture metadata requests in flight at once; 1 fetches sequentially
+        :param cache: optional DiskCache for API responses
+        :param cache_ttl: cache lifetimes in seconds per kind of response (see http_cache.DEFAULT_TTL)
+        :param rate_limiter: optional RateLimiter throttling and retrying requests that reach the network
+        :param metrics: Metrics registry for request timings and bytes, the shared one by default
+        :param cassette: optional replay.Cassette the responses from the network are recorded to or replayed from
+        """
+        self.metrics = metrics or METRICS
         self.headers = {
             "x-rapidapi-key": apikey,
             "x-rapidapi-host": host}
         self.url = base_url
-        self.league_id = None
+        self.league_ids = {}
+        self.max_workers = max(1, max_workers)
+
+        # One pooled session shared by all requests (and threads) so connections get reused
+        self.session = requests.Session()
+        if rate_limiter is not None:
+            adapter = RateLimitedAdapter(limiter=rate_limiter, pool_connections=1, pool_maxsize=self.max_workers)
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.rate_limiter = rate_limiter
+        if cassette is not None:
+            adapter = ReplayAdapter(cassette=cassette, adapter=adapter)
+        self.cache = cache
+        if cache is not None:
+            adapter = CachingAdapter(cache=cache, ttl=cache_ttl, adapter=adapter)
+        self.session.mount(base_url, adapter)
 
     @response_handler
-    def get_(self, url, **kwargs):
-        return requests.get(url, headers=self.headers, **kwargs)
+    def get_(self, url, headers=None, **kwargs):
+        endpoint = url[len(self.url):].strip("/") if url.startswith(self.url) else url
+        with self.metrics.timer("rapidapi_request_seconds", endpoint=endpoint):
+            res = self.session.get(url, headers={**self.headers, **(headers or {})}, **kwargs)
+
+        source = "cache" if getattr(res, "from_cache", False) else "network"
+        self.metrics.inc("rapidapi_requests_total", endpoint=endpoint, source=source, status=res.status_code)
+        self.metrics.inc("rapidapi_response_bytes_total", len(res.content), endpoint=endpoint, source=source)
+        return res
 
     def get_league_id(self, league_name, country_code) -> int:
-        if not self.league_id:
+        if (league_name, country_code) not in self.league_ids:
             payload = {
                 "code": country_code,
                 "current": "true"}
@@ -41,12 +95,12 @@ class RapidDataRetriever:
 
             for i in res.get("response", {}):
                 if i.get("league", {}).get("name") == league_name:
-                    self.league_id = i["league"]["id"]
-                    log.info(f"Got league ID for {league_name}: {self.league_id}")
+                    self.league_ids[(league_name, country_code)] = i["league"]["id"]
+                    log.info(f"Got league ID for {league_name}: {i['league']['id']}")
                     break
             else:
                 raise RuntimeError(f"League {league_name} not found! Response: {res}")
-        return self.league_id
+        return self.league_ids[(league_name, country_code)]
 
     def get_league_fixtures(self, date, season, league, country_code):
         payload = {
@@ -62,9 +116,23 @@ class RapidDataRetriever:
             log.info(f"No matches from {date}")
             return []
 
-    def get_fixture_meta(self, url, fixture_id):
+    def get_live_fixtures(self, leagues):
+        """
+        Fixtures being played right now, never served from the response cache.
+        :param leagues: list of tuples (league name, country code)
+        """
+        league_ids = sorted({self.get_league_id(league, country_code) for league, country_code in leagues})
+        payload = {"live": "-".join(str(league_id) for league_id in league_ids)}
+        res = self.get_(f"{self.url}/fixtures", params=payload, headers=NO_CACHE)
+
+        fixtures = res.get("response") or []
+        log.debug(f"{len(fixtures)} live matches in leagues {league_ids}")
+        return fixtures
+
+    def get_fixture_meta(self, url, fixture_id, fresh=False):
+        """:param fresh: bypass fresh entries of the response cache, e.g. for fixtures being played"""
         payload = {"fixture": fixture_id}
-        res = self.get_(url, params=payload)
+        res = self.get_(url, params=payload, headers=NO_CACHE if fresh else None)
 
         if meta := res.get("response"):
             log.info(f"Retrieved metadata from url: {url}; fixture ID: {fixture_id}")
@@ -73,31 +141,67 @@ class RapidDataRetriever:
             log.info(f"No events found for fixture {fixture_id}")
             return []
 
-    def get_full_data(self, date, season, league, country_code):
-        fixtures = self.get_league_fixtures(date, season, league, country_code)
-        full_data = []
-
-        for f in fixtures:
-            f_id = f["fixture"].pop("id")
+    def get_fixture_full_data(self, fixture):
+        f_id = fixture["fixture"].pop("id")
+        with self.metrics.timer("stage_seconds", stage="fetch"):
             events = self.get_fixture_meta(f"{self.url}/fixtures/events", fixture_id=f_id)
             stats = self.get_fixture_meta(f"{self.url}/fixtures/statistics", fixture_id=f_id)
 
-            full_data.append({
-                "fixture_id": f_id,
-                "about": f,
-                "events": events,
-                "stats": stats})
+        return {
+            "fixture_id": f_id,
+            "about": fixture,
+            "events": events,
+            "stats": stats}
+
+    def get_fixture_live_data(self, fixture):
+        """Like get_fixture_full_data, but with up-to-date events only (no statistics) to save requests"""
+        f_id = fixture["fixture"].pop("id")
+        events = self.get_fixture_meta(f"{self.url}/fixtures/events", fixture_id=f_id, fresh=True)
+
+        return {
+            "fixture_id": f_id,
+            "about": fixture,
+            "events": events,
+            "stats": []}
+
+    def iter_fixtures_full_data(self, fixtures, ordered=True):
+        """
+        Fetches events and statistics of the given /fixtures listing items, yielding each as soon as possible.
+        :param ordered: yield in the order of fixtures; if False, in the order of completion, with at most
+            max_workers fixtures in flight, so that a slow consumer holds back the requests
+        """
+        fixtures = list(fixtures)
+        if self.max_workers == 1 or len(fixtures) < 2:
+            yield from map(self.get_fixture_full_data, fixtures)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if ordered:
+                # Executor.map keeps the results in the same order as the fixtures
+                yield from executor.map(self.get_fixture_full_data, fixtures)
+                return
+
+            todo = iter(fixtures)
+            pending = {executor.submit(self.get_fixture_full_data, f) for f in islice(todo, self.max_workers)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if (f := next(todo, None)) is not None:
+                        pending.add(executor.submit(self.get_fixture_full_data, f))
+                    yield future.result()
+
+    def get_fixtures_full_data(self, fixtures):
+        return list(self.iter_fixtures_full_data(fixtures))
 
-        return full_data
+    def get_full_data(self, date, season, league, country_code):
+        fixtures = self.get_league_fixtures(date, season, league, country_code)
+        return self.get_fixtures_full_data(fixtures)
 
     @staticmethod
     def data_is_ok(data: dict, schema) -> bool:
-        try:
-            jsonschema.validate(instance=data, schema=schema)
-            return True
-        except jsonschema.exceptions.ValidationError as ve:
-            log.exception(f"Data does not match schema! Detail: {ve}")
-            return False
+        """:param schema: validation.SchemaValidator, or a schema dict (builds a validator on every call)"""
+        validator = schema if isinstance(schema, SchemaValidator) else SchemaValidator(schema)
+        return validator.validate(data)
 
 
 if __name__ == "__main__":
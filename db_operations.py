@@ -1,96 +1,279 @@
 import logging
 import sqlite3
+import threading
+from collections import Counter
+
+from metrics import METRICS
+from migrations import MIGRATIONS_DIR, Migrator
 
 
 log = logging.getLogger(__name__)
 
 
+# Unique keys of the tables whose rows get updated when a changed fixture is stored again
+UPSERT_KEYS = {
+    "Fixture": ["fixture_id"],
+    "Teams": ["fixture_id", "team_type"],
+    "Score": ["fixture_id", "score_type", "team_id"],
+    "Stats": ["fixture_id", "team_id", "type"],
+    "Commentary": ["fixture_id"]}
+
+# Tables whose rows of a fixture are all replaced when it is stored again. Events have no stable key, the API corrects
+# their time, player or assist, so upserting them would keep the outdated versions next to the corrected ones.
+REPLACE_TABLES = ["Events"]
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",  # Readers don't block the writer and vice versa
+    "synchronous": "NORMAL",  # Safe with WAL, fsync only at checkpoints
+    "cache_size": -16000,  # Negative value = size in KiB
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000}
+
+
 class SQLite:
-    def __init__(self, db_name):
+    def __init__(self, db_name, pragmas=None, cached_statements=256):
+        """
+        Connection manager keeping one long-lived connection per thread. Each `with` block is one transaction,
+        committed on exit (rolled back on error); nested blocks join the outer transaction.
+        Note that with ":memory:" every thread gets its own database.
+        :param db_name: path to the SQLite database
+        :param pragmas: overrides of DEFAULT_PRAGMAS
+        :param cached_statements: size of the prepared statement cache of each connection
+        """
         self.db = db_name
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Connections never leave their thread, check_same_thread=False only allows close() from another thread
+        conn = sqlite3.connect(self.db, cached_statements=self.cached_statements, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        with self._lock:
+            self._connections.append(conn)
+        log.debug(f"Opened SQLite connection to {self.db} in thread {threading.current_thread().name}")
+        return conn
+
+    @property
+    def conn(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = self._connect()
+        return self._local.conn
+
+    @property
+    def cursor(self):
+        return self._local.cursor
 
     def __enter__(self):
-        self.conn = sqlite3.connect(self.db)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._local.cursor = self.conn.cursor()
+        self._local.depth = depth + 1
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+
         if exc_type:
             log.error(f"SQLite error: {exc_type}, {exc_value}")
-        self.conn.commit()
-        self.conn.close()
+            self.conn.rollback()
+        else:
+            self.conn.commit()
+        self._local.cursor.close()
+        self._local.cursor = None
+
+    def release(self):
+        """Closes the connection of the current thread, e.g. before a short-lived worker thread ends"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+        self._local.conn = None
+        self._local.cursor = None
+        self._local.depth = 0
+
+    def close(self):
+        """Closes the connections of all threads"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
 
 
 class SQLiteOperations:
-    def __init__(self, db_name):
-        self.wrapper = SQLite(db_name)
+    def __init__(self, db_name, pragmas=None, metrics=None):
+        """:param metrics: Metrics registry for query timings, the shared one by default"""
+        self.wrapper = SQLite(db_name, pragmas=pragmas)
+        self.metrics = metrics or METRICS
         self.queries = {
             "fixture_ids": '''
                 SELECT fixture_id 
                 FROM Fixture 
-                WHERE date LIKE ?
+                WHERE match_date = ?
                 ''',
             "events_data": '''
                 SELECT assist, comments, detail, player, time, type
                 FROM Events
                 WHERE fixture_id = ?
+                ORDER BY time, event_id
                 ''',
             "stats_data": '''
                 SELECT Teams.name, Stats.type, Stats.value
                 FROM Stats
-                JOIN Teams ON Stats.team_id = Teams.team_id
+                JOIN Teams ON Stats.team_id = Teams.team_id AND Stats.fixture_id = Teams.fixture_id
                 WHERE Stats.fixture_id = ?
+                ORDER BY Stats.stat_id
                 ''',
             "email_data_teams": '''
-                SELECT Teams.name, Teams.goals
+                SELECT Teams.team_type, Teams.name, Teams.goals
                 FROM Teams
-                WHERE Teams.fixture_id = ?;
+                WHERE Teams.fixture_id = ?
+                ORDER BY Teams.id;
                 ''',
             "email_data_text": '''
                 SELECT Commentary.text
                 From Commentary
-                WHERE Commentary.fixture_id = ?'''}
+                WHERE Commentary.fixture_id = ?''',
+            "event_keys": '''
+                SELECT team_id, type, IFNULL(detail, ''), IFNULL(player, ''), elapsed
+                FROM Events
+                WHERE fixture_id = ?
+                ''',
+            "fixture_ids_range": '''
+                SELECT fixture_id
+                FROM Fixture
+                WHERE match_date BETWEEN ? AND ?
+                ORDER BY match_date, fixture_id
+                ''',
+            "stage_state": '''
+                SELECT fixture_id, status, payload, error, attempts
+                FROM PipelineState
+                WHERE match_date = ? AND stage = ? AND scope = ?
+                ''',
+            "stage_summary": '''
+                SELECT stage, scope, status, COUNT(*) AS items, SUM(attempts) AS attempts
+                FROM PipelineState
+                WHERE match_date = ?
+                GROUP BY stage, scope, status
+                ''',
+            "set_stage_state": '''
+                INSERT INTO PipelineState (match_date, stage, scope, fixture_id, status, payload, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (match_date, stage, scope, fixture_id) DO UPDATE SET
+                    status = excluded.status,
+                    payload = IFNULL(excluded.payload, payload),
+                    error = excluded.error,
+                    attempts = attempts + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                '''}
+        # Queries over many fixtures, e.g. bulk variants of the per-fixture queries; {ids} gets replaced with a list
+        # of placeholders
+        self.bulk_queries = {
+            "events": '''
+                SELECT fixture_id, assist, comments, detail, player, time, type
+                FROM Events
+                WHERE fixture_id IN ({ids})
+                ORDER BY fixture_id, time, event_id
+                ''',
+            "stats": '''
+                SELECT Stats.fixture_id, Teams.name, Stats.type, Stats.value
+                FROM Stats
+                JOIN Teams ON Stats.team_id = Teams.team_id AND Stats.fixture_id = Teams.fixture_id
+                WHERE Stats.fixture_id IN ({ids})
+                ORDER BY Stats.fixture_id, Stats.stat_id
+                ''',
+            "teams": '''
+                SELECT fixture_id, team_type, name, goals
+                FROM Teams
+                WHERE fixture_id IN ({ids})
+                ORDER BY fixture_id, id
+                ''',
+            "comment": '''
+                SELECT fixture_id, text
+                FROM Commentary
+                WHERE fixture_id IN ({ids})
+                ''',
+            "fixture_states": '''
+                SELECT Fixture.fixture_id, Fixture.status, Fixture.elapsed_mins, home.goals, away.goals
+                FROM Fixture
+                JOIN Commentary ON Commentary.fixture_id = Fixture.fixture_id
+                LEFT JOIN Teams AS home ON home.fixture_id = Fixture.fixture_id AND home.team_type = 'home'
+                LEFT JOIN Teams AS away ON away.fixture_id = Fixture.fixture_id AND away.team_type = 'away'
+                WHERE Fixture.fixture_id IN ({ids})
+                ''',
+            "clear_stage_state": '''
+                DELETE FROM PipelineState
+                WHERE match_date = ? AND stage = ? AND fixture_id IN ({ids})
+                '''}
+        self._query_names = {query: name for name, query in self.queries.items()}
 
-    def create_tables(self, script_filename: str = "sql_scripts/create_tables.sql"):
-        with open(script_filename, "r") as f:
-            script = f.read()
-        calls = script.split(";") # TODO: Problematic if script contains ;
+    def create_tables(self, migrations_dir: str = MIGRATIONS_DIR):
+        """Creates or upgrades the schema by applying pending migrations, returns the schema version"""
+        return Migrator(self.wrapper, migrations_dir).migrate()
 
-        with self.wrapper as db:
-            for c in calls:
-                if c.strip():
-                    try:
-                        db.cursor.execute(c)
-                    except sqlite3.OperationalError as e:
-                        log.exception(f"Error executing SQL from file {script_filename}: {e}")
+    def explain_queries(self):
+        """:return: EXPLAIN QUERY PLAN details of all project queries"""
+        bulk = {f"bulk_{name}": query.format(ids="?") for name, query in self.bulk_queries.items()}
+        return Migrator(self.wrapper).explain({**self.queries, **bulk})
 
-    def _insert_into(self, table_name, columns, values):
-        query = f'''
+    def _insert_many(self, db, table_name, columns, rows):
+        if keys := UPSERT_KEYS.get(table_name):
+            updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in keys)
+            query = f'''
+                INSERT INTO {table_name} ({", ".join(columns)})
+                VALUES ({", ".join(["?"] * len(columns))})
+                ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}
+                '''
+        else:
+            query = f'''
                 INSERT OR IGNORE INTO {table_name} ({", ".join(columns)})
-                VALUES ({", ".join(["?"] * len(values))})
+                VALUES ({", ".join(["?"] * len(columns))})
                 '''
+        try:
+            with self.metrics.timer("db_query_seconds", operation="insert", table=table_name):
+                db.cursor.executemany(query, rows)
+            self.metrics.inc("db_rows_total", len(rows), operation="insert", table=table_name)
+        except sqlite3.IntegrityError as e:
+            log.exception(f"Wrong data format for table {table_name}. Error: {e}")
+            raise
+        except Exception as e:
+            log.exception(f"Exception when inserting data: {e}")
+
+    def _delete_fixture_rows(self, db, table_name, fixture_ids):
+        with self.metrics.timer("db_query_seconds", operation="delete", table=table_name):
+            db.cursor.executemany(f"DELETE FROM {table_name} WHERE fixture_id = ?", [(f_id,) for f_id in fixture_ids])
+
+    def _insert_into(self, table_name, columns, values):
         with self.wrapper as db:
-            try:
-                db.cursor.execute(query, values)
-            except sqlite3.IntegrityError as e:
-                log.exception(f"Wrong data format for table {table_name}. Error: {e}")
-                raise
-            except Exception as e:
-                log.exception(f"Exception when inserting data: {e}")
+            self._insert_many(db, table_name=table_name, columns=columns, rows=[values])
 
-    def insert_into_fixture(self, fixture_data):
+    @staticmethod
+    def _fixture_rows(fixture_data):
+        """
+        Converts one item of RapidDataRetriever.get_full_data (enriched with the LLM commentary) into table rows.
+        :return: dict {table name: (columns, list of rows)}
+        """
         f_id = fixture_data["fixture_id"]
+        about = fixture_data["about"]
 
-        fixture = fixture_data["about"]["fixture"]
+        fixture = about["fixture"]
         status = fixture["status"]
-        league = fixture_data["about"]["league"]
-        columns = [
-            "fixture_id", "date", "referee", "timestamp", "timezone", "elapsed_mins", "extra_mins", "status",
-            "league", "season"]
-        values = [
+        league = about["league"]
+        fixture_rows = [[
             f_id,
             fixture["date"],
+            fixture["date"][:10],
             fixture["referee"],
             fixture["timestamp"],
             fixture["timezone"],
@@ -99,54 +282,31 @@ class SQLiteOperations:
             status["long"],
             league["name"],
             league["season"]
-        ]
-        self._insert_into(table_name="Fixture", columns=columns, values=values)
+        ]]
 
-        away_team = fixture_data["about"]["teams"]["away"]
-        columns = [
-            "fixture_id", "team_type", "team_id", "logo", "name", "winner", "goals"]
-        values = [
-            f_id,
-            "away",
-            away_team["id"],
-            away_team["logo"],
-            away_team["name"],
-            away_team["winner"],
-            fixture_data["about"]["goals"]["away"]
-        ]
-        self._insert_into(table_name="Teams", columns=columns, values=values)
-
-        home_team = fixture_data["about"]["teams"]["home"]
-        values = [
-            f_id,
-            "home",
-            home_team["id"],
-            home_team["logo"],
-            home_team["name"],
-            home_team["winner"],
-            fixture_data["about"]["goals"]["home"]
-        ]
-        self._insert_into(table_name="Teams", columns=columns, values=values)
-
-        score = fixture_data["about"]["score"]
-        columns = ["fixture_id", "score_type", "team_id", "score_value"]
-        for score_type in ["extratime", "fulltime", "halftime", "penalty"]:
-            for team_id in ["away", "home"]:
-                values = [
-                    f_id,
-                    score_type,
-                    team_id,
-                    score[score_type][team_id]
-                ]
-                self._insert_into(table_name="Score", columns=columns, values=values)
-
-        events = fixture_data["events"]
-        columns = [
-            "fixture_id", "assist", "comments", "detail", "player", "team_id", "time", "type"]
-        for e in events:
-            time = e["time"]["elapsed"] + e["time"]["extra"] if e["time"]["extra"] else e["time"]["elapsed"]
+        teams_rows = []
+        for team_type in ["away", "home"]:
+            team = about["teams"][team_type]
+            teams_rows.append([
+                f_id,
+                team_type,
+                team["id"],
+                team["logo"],
+                team["name"],
+                team["winner"],
+                about["goals"][team_type]
+            ])
 
-            values = [
+        score = about["score"]
+        score_rows = [
+            [f_id, score_type, team_id, score[score_type][team_id]]
+            for score_type in ["extratime", "fulltime", "halftime", "penalty"]
+            for team_id in ["away", "home"]]
+
+        events_rows = []
+        for e in fixture_data["events"]:
+            time = e["time"]["elapsed"] + e["time"]["extra"] if e["time"]["extra"] else e["time"]["elapsed"]
+            events_rows.append([
                 f_id,
                 e["assist"]["name"],
                 e["comments"],
@@ -154,34 +314,87 @@ class SQLiteOperations:
                 e["player"]["name"],
                 e["team"]["id"],
                 time,
-                e["type"]
-            ]
-            self._insert_into(table_name="Events", columns=columns, values=values)
-
-        stats = fixture_data["stats"]
-        columns = ["fixture_id", "team_id", "type", "value"]
-        for team in stats:
-            for s in team["statistics"]:
-                values = [
-                    f_id,
-                    team["team"]["id"],
-                    s["type"],
-                    s["value"]]
-                self._insert_into(table_name="Stats", columns=columns, values=values)
-
-        columns = ["fixture_id", "text", "llm"]
-        values = [f_id, fixture_data["llm"]["text"], fixture_data["llm"]["llm"]]
-        self._insert_into(table_name="Commentary", columns=columns, values=values)
+                e["type"],
+                e["time"]["elapsed"]
+            ])
+
+        stats_rows = [
+            [f_id, team["team"]["id"], s["type"], s["value"]]
+            for team in fixture_data["stats"]
+            for s in team["statistics"]]
+
+        # Fixtures stored while being played have no commentary yet
+        commentary_rows = [[f_id, fixture_data["llm"]["text"], fixture_data["llm"]["llm"]]] \
+            if "llm" in fixture_data else []
+
+        return {
+            "Fixture": (
+                ["fixture_id", "date", "match_date", "referee", "timestamp", "timezone", "elapsed_mins",
+                 "extra_mins", "status", "league", "season"],
+                fixture_rows),
+            "Teams": (["fixture_id", "team_type", "team_id", "logo", "name", "winner", "goals"], teams_rows),
+            "Score": (["fixture_id", "score_type", "team_id", "score_value"], score_rows),
+            "Events": (
+                ["fixture_id", "assist", "comments", "detail", "player", "team_id", "time", "type", "elapsed"],
+                events_rows),
+            "Stats": (["fixture_id", "team_id", "type", "value"], stats_rows),
+            "Commentary": (["fixture_id", "text", "llm"], commentary_rows)}
+
+    def insert_into_fixtures(self, fixtures_data):
+        """
+        Inserts all rows of the given fixtures with one executemany per table, in a single transaction.
+        Rows of fixtures stored before are updated (see UPSERT_KEYS) or replaced (see REPLACE_TABLES).
+        """
+        tables, fixture_ids = {}, []
+        for fixture_data in fixtures_data:
+            fixture_ids.append(fixture_data["fixture_id"])
+            for table_name, (columns, rows) in self._fixture_rows(fixture_data).items():
+                tables.setdefault(table_name, (columns, []))[1].extend(rows)
+
+        with self.wrapper as db:
+            for table_name in REPLACE_TABLES:
+                self._delete_fixture_rows(db, table_name, fixture_ids)
+            for table_name, (columns, rows) in tables.items():
+                if rows:
+                    self._insert_many(db, table_name=table_name, columns=columns, rows=rows)
+
+    def insert_into_fixture(self, fixture_data):
+        self.insert_into_fixtures([fixture_data])
+
+    def insert_new_events(self, fixture_data):
+        """
+        Stores a fixture (usually one being played, without commentary) and returns its events that were not
+        stored before, as rows of the events_data query. Events are matched on their team, type, detail, player and
+        minute without the added time, so that stored events corrected by the API are updated, not reported again.
+        """
+        columns, rows = self._fixture_rows(fixture_data)["Events"]
+
+        with self.wrapper as db:
+            db.cursor.execute(self.queries["event_keys"], (fixture_data["fixture_id"],))
+            stored = Counter(tuple(row) for row in db.cursor.fetchall())
+            new_events = []
+            for row in rows:
+                e = dict(zip(columns, row))
+                key = (e["team_id"], e["type"], e["detail"] or "", e["player"] or "", e["elapsed"])
+                if stored[key]:
+                    stored[key] -= 1
+                else:
+                    new_events.append({c: e[c] for c in ["assist", "comments", "detail", "player", "time", "type"]})
+            self.insert_into_fixtures([fixture_data])
+        return new_events
 
     def fetch_fixture_ids(self, date):
         with self.wrapper as db:
-            db.cursor.execute(self.queries["fixture_ids"], (date + "%",))
+            db.cursor.execute(self.queries["fixture_ids"], (date,))
             return [row[0] for row in db.cursor.fetchall()]
 
     def fetch_data(self, fetch_query, fixture_id):
-        with self.wrapper as db:
+        query_name = self._query_names.get(fetch_query, "other")
+        with self.wrapper as db, self.metrics.timer("db_query_seconds", operation="fetch", query=query_name):
             db.cursor.execute(fetch_query, (fixture_id,))
-            return [dict(row) for row in db.cursor.fetchall()]
+            rows = [dict(row) for row in db.cursor.fetchall()]
+        self.metrics.inc("db_rows_total", len(rows), operation="fetch", query=query_name)
+        return rows
 
     def fetch_match_data(self, fixture_id):
         events = self.fetch_data(self.queries['events_data'], fixture_id)
@@ -192,14 +405,103 @@ class SQLiteOperations:
         return {"score": self.fetch_data(self.queries['email_data_teams'], fixture_id),
                 "comment": self.fetch_data(self.queries['email_data_text'], fixture_id)}
 
+    def fetch_fixture_ids_range(self, date_from, date_to):
+        with self.wrapper as db:
+            db.cursor.execute(self.queries["fixture_ids_range"], (date_from, date_to))
+            return [row[0] for row in db.cursor.fetchall()]
+
+    def fetch_stage_state(self, date, stage, scope="", status=None):
+        """
+        :param status: only items with this status (done, failed), all by default
+        :return: dict {fixture id (0 for the whole day): state row}
+        """
+        with self.wrapper as db:
+            db.cursor.execute(self.queries["stage_state"], (date, stage, scope))
+            return {row["fixture_id"]: dict(row) for row in db.cursor.fetchall()
+                    if status is None or row["status"] == status}
+
+    def set_stage_state(self, date, stage, states, scope=""):
+        """
+        Records the outcome of a pipeline stage, counting attempts of items seen before.
+        :param states: list of tuples (fixture id or 0 for the whole day, status, payload string, error)
+        """
+        if not states:
+            return
+        with self.wrapper as db:
+            db.cursor.executemany(self.queries["set_stage_state"],
+                                  [(date, stage, scope, *state) for state in states])
+
+    def clear_stage_state(self, date, stages, fixture_ids):
+        """Forgets the progress of the given fixtures in the given stages (of all scopes), so they get redone"""
+        fixture_ids = list(fixture_ids)
+        if not fixture_ids:
+            return
+        query = self.bulk_queries["clear_stage_state"].format(ids=", ".join(["?"] * len(fixture_ids)))
+        with self.wrapper as db:
+            for stage in stages:
+                db.cursor.execute(query, [date, stage, *fixture_ids])
+
+    def fetch_fixture_states(self, fixture_ids, chunk_size=500):
+        """:return: dict {fixture id: (status, elapsed, home goals, away goals)} of the stored fixtures"""
+        fixture_ids = list(fixture_ids)
+        states = {}
+        with self.wrapper as db:
+            for i in range(0, len(fixture_ids), chunk_size):
+                chunk = fixture_ids[i:i + chunk_size]
+                query = self.bulk_queries["fixture_states"].format(ids=", ".join(["?"] * len(chunk)))
+                for row in db.cursor.execute(query, chunk):
+                    states[row[0]] = tuple(row)[1:]
+        return states
+
+    def fetch_stage_summary(self, date):
+        """:return: list of dicts with item counts by stage, scope and status"""
+        with self.wrapper as db:
+            db.cursor.execute(self.queries["stage_summary"], (date,))
+            return [dict(row) for row in db.cursor.fetchall()]
+
+    def iter_matches_bulk(self, fixture_ids=None, date_from=None, date_to=None,
+                          parts=("events", "stats", "teams", "comment"), chunk_size=500):
+        """
+        Loads data of many fixtures with one query per part and chunk of fixtures, instead of per fixture queries.
+        Yields one dict per fixture, {"fixture": id, <part>: [rows]}, in the order of fixture_ids (or by date).
+        :param fixture_ids: fixtures to load; if not given, all fixtures between date_from and date_to (%Y-%m-%d)
+        :param parts: which of events, stats, teams, comment to load
+        :param chunk_size: fixtures per chunk, bounds memory use and the number of query parameters
+        """
+        if fixture_ids is None:
+            fixture_ids = self.fetch_fixture_ids_range(date_from, date_to or date_from)
+
+        fixture_ids = list(fixture_ids)
+        for i in range(0, len(fixture_ids), chunk_size):
+            chunk = fixture_ids[i:i + chunk_size]
+            matches = {f_id: {"fixture": f_id, **{part: [] for part in parts}} for f_id in chunk}
+
+            with self.wrapper as db:
+                for part in parts:
+                    query = self.bulk_queries[part].format(ids=", ".join(["?"] * len(chunk)))
+                    rows = 0
+                    with self.metrics.timer("db_query_seconds", operation="fetch", query=f"bulk_{part}"):
+                        for row in db.cursor.execute(query, chunk):
+                            row = dict(row)
+                            matches[row.pop("fixture_id")][part].append(row)
+                            rows += 1
+                    self.metrics.inc("db_rows_total", rows, operation="fetch", query=f"bulk_{part}")
+
+            yield from matches.values()
+
+    def fetch_matches_bulk(self, fixture_ids=None, date_from=None, date_to=None,
+                           parts=("events", "stats", "teams", "comment")):
+        return list(self.iter_matches_bulk(fixture_ids=fixture_ids, date_from=date_from, date_to=date_to,
+                                           parts=parts))
+
+    def close(self):
+        self.wrapper.close()
+
 
 if __name__ == "__main__":
     log.setLevel("DEBUG")
     db_ops = SQLiteOperations(db_name="football_matches.db")
-    # db_ops.execute_sql_script("create_tables.sql")
+    db_ops.create_tables()
 
     date = "..."
-    fixture_ids = db_ops.fetch_fixture_ids(date)
-    matches = []
-    for id_ in fixture_ids:
-        matches.append(db_ops.fetch_match_data(id_))
+    matches = db_ops.fetch_matches_bulk(date_from=date, parts=("events", "stats"))
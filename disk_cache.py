@@ -0,0 +1,126 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class DiskCache:
+    def __init__(self, path, max_entries=10000):
+        """
+        Persistent key-value cache stored in an SQLite file. Entries carry an expiry time, the least recently used
+        ones are evicted once the cache holds more than max_entries.
+        :param path: cache file, ":memory:" keeps the cache in RAM only
+        :param max_entries: upper bound of stored entries
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                meta TEXT,
+                expires_at REAL,
+                last_access REAL
+            )''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+        self.conn.commit()
+
+    def lookup(self, key):
+        """
+        :return: tuple (value, meta, is_fresh); value is None if the key is not cached at all. Stale entries are
+        returned too, so that the caller can revalidate them.
+        """
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT value, meta, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, None, False
+
+            value, meta, expires_at = row
+            is_fresh = expires_at > now
+            if is_fresh:
+                self.hits += 1
+                self.conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+            else:
+                self.misses += 1
+        return value, json.loads(meta) if meta else {}, is_fresh
+
+    def get(self, key):
+        value, _, is_fresh = self.lookup(key)
+        return value if is_fresh else None
+
+    def set(self, key, value, ttl, meta=None):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, meta, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, json.dumps(meta) if meta else None, now + ttl, now))
+            self._evict()
+            self.conn.commit()
+
+    def incr(self, key, amount=1, ttl=86400):
+        """
+        Adds amount to a numeric entry, an expired or missing one counts from 0. Atomic across processes sharing the
+        cache file, since the update and the read run in one transaction.
+        :return: the new value
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute('''
+                INSERT INTO cache (key, value, meta, expires_at, last_access) VALUES (?, ?, NULL, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = CASE WHEN expires_at > ? THEN value + excluded.value ELSE excluded.value END,
+                    expires_at = excluded.expires_at, last_access = excluded.last_access''',
+                (key, amount, now + ttl, now, now))
+            value = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0]
+            self._evict()
+            self.conn.commit()
+        return value
+
+    def refresh(self, key, ttl):
+        """Extends the lifetime of an entry, e.g. after the server confirmed it has not changed"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute("UPDATE cache SET expires_at = ?, last_access = ? WHERE key = ?", (now + ttl, now, key))
+            self.conn.commit()
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            over = count - self.max_entries
+            self.conn.execute('''
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY last_access LIMIT ?)''', (over,))
+            self.evictions += over
+            log.debug(f"Evicted {over} least recently used entries from cache {self.path}")
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM cache")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
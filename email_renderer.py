@@ -0,0 +1,84 @@
+import hashlib
+import html
+import json
+import logging
+import os
+from string import Template
+
+from disk_cache import DiskCache
+
+log = logging.getLogger(__name__)
+
+TEMPLATES_DIR = "templates"
+
+
+def _text_to_html(text):
+    """Escapes plain text (e.g. LLM-written commentary) and keeps its paragraphs"""
+    paragraphs = [p.strip() for p in (text or "").split("\n\n") if p.strip()]
+    return "".join(f"<p style=\"margin:0 0 8px;\">{html.escape(p).replace(chr(10), '<br>')}</p>"
+                   for p in paragraphs)
+
+
+class EmailRenderer:
+    def __init__(self, templates_dir: str = TEMPLATES_DIR, cache: DiskCache = None, ttl=30 * 24 * 3600):
+        """
+        Renders the HTML digest of triggered matches from their stored teams, goals and commentary with local
+        string.Template templates, parsed once at init. Rendered digests are cached per trigger set.
+        :param templates_dir: directory with email_digest.html and email_match.html
+        :param cache: DiskCache for rendered digests, an in-memory one by default
+        :param ttl: lifetime of a cached digest in seconds
+        """
+        texts = {}
+        for name in ["email_digest", "email_match"]:
+            with open(os.path.join(templates_dir, f"{name}.html"), "r", encoding="utf-8") as f:
+                texts[name] = f.read()
+        self.digest_template = Template(texts["email_digest"])
+        self.match_template = Template(texts["email_match"])
+        # Edited templates must not be served from the cache
+        self.version = hashlib.sha256("".join(texts.values()).encode()).hexdigest()[:16]
+        self.cache = cache or DiskCache(":memory:", max_entries=256)
+        self.ttl = ttl
+
+    def key(self, matches, **context):
+        """Cache key of a digest: the trigger set with its data, the rendering settings and the template version"""
+        payload = {"version": self.version, "matches": matches, **context}
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key):
+        value = self.cache.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key, body):
+        self.cache.set(key, body, ttl=self.ttl)
+
+    def render_match(self, match):
+        """
+        :param match: dict {"teams": rows with team_type (home or away), name and goals, "reason": str,
+            "comment": rows}; teams without team_type are taken as [home, away]
+        """
+        sides = {t.get("team_type"): t for t in match["teams"]}
+        home, away = (sides["home"], sides["away"]) if "home" in sides and "away" in sides else \
+            (match["teams"] + [{"name": "?", "goals": None}] * 2)[:2]
+        return self.match_template.substitute(
+            home=html.escape(str(home["name"])),
+            away=html.escape(str(away["name"])),
+            home_goals="-" if home["goals"] is None else home["goals"],
+            away_goals="-" if away["goals"] is None else away["goals"],
+            reason=html.escape(match.get("reason") or ""),
+            comment=_text_to_html("\n\n".join(c["text"] for c in match.get("comment") or [] if c.get("text"))))
+
+    def render(self, matches, title="There was a cool match!", subtitle="", intro=None):
+        """
+        :param matches: list of dicts, see render_match
+        :param intro: plain text introduction, e.g. written by the LLM; a default one is used without it
+        :return: HTML body of the email
+        """
+        if intro is None:
+            intro = f"Hi football fans! {len(matches)} match{'es' if len(matches) != 1 else ''} " \
+                    f"{'were' if len(matches) != 1 else 'was'} worth a look:"
+        return self.digest_template.substitute(
+            title=html.escape(title),
+            subtitle=html.escape(subtitle),
+            intro=_text_to_html(intro),
+            matches="".join(self.render_match(m) for m in matches))
@@ -0,0 +1,126 @@
+import json
+import logging
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+log = logging.getLogger(__name__)
+
+# Fixture statuses after which the fixture data will not change anymore (see RapidAPI docs)
+FINISHED_STATUSES = {"FT", "AET", "PEN", "PST", "CANC", "ABD", "AWD", "WO"}
+
+DEFAULT_TTL = {
+    "leagues": 7 * 24 * 3600,
+    "finished": 30 * 24 * 3600,
+    "live": 60,
+    "default": 3600}
+
+_STORED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+# Request headers making the adapter skip fresh cache entries (stale ones are still revalidated), e.g. for live data
+NO_CACHE = {"Cache-Control": "no-cache"}
+
+
+def cache_key(method, url):
+    """Url with sorted query params, so that the same request is always stored under the same key"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method} {urlunsplit(parts._replace(query=query, fragment=''))}"
+
+
+class CachingAdapter(BaseAdapter):
+    def __init__(self, cache, ttl=None, adapter=None):
+        """
+        Transport adapter for requests.Session serving GET responses from a DiskCache. Stale entries, and all
+        entries of requests with NO_CACHE headers, are revalidated with If-None-Match/If-Modified-Since when the
+        server sent validators.
+        :param cache: DiskCache instance
+        :param ttl: lifetimes in seconds per kind of response, see DEFAULT_TTL for the keys
+        :param adapter: adapter used for actual network calls
+        """
+        super().__init__()
+        self.cache = cache
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.adapter = adapter or HTTPAdapter()
+        self._finished_fixtures = set()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            return self.adapter.send(request, **kwargs)
+
+        key = cache_key(request.method, request.url)
+        value, meta, is_fresh = self.cache.lookup(key)
+        if is_fresh and request.headers.get("Cache-Control") != NO_CACHE["Cache-Control"]:
+            log.debug(f"Cache hit: {request.url}")
+            if self._is_fixtures_listing(request.url):
+                self._track_fixtures(value)
+            return self._build_response(request, value, meta)
+
+        if value is not None:
+            if etag := meta.get("ETag"):
+                request.headers["If-None-Match"] = etag
+            if last_modified := meta.get("Last-Modified"):
+                request.headers["If-Modified-Since"] = last_modified
+
+        res = self.adapter.send(request, **kwargs)
+
+        if res.status_code == 304 and value is not None:
+            log.debug(f"Cached response still valid: {request.url}")
+            self.cache.refresh(key, self.ttl_for(request.url, value))
+            return self._build_response(request, value, meta)
+
+        if res.ok:
+            meta = {h: res.headers[h] for h in _STORED_HEADERS if h in res.headers}
+            self.cache.set(key, res.content, self.ttl_for(request.url, res.content), meta=meta)
+        return res
+
+    def ttl_for(self, url, content):
+        path = urlsplit(url).path.rstrip("/")
+        if path.endswith("/leagues"):
+            return self.ttl["leagues"]
+
+        if self._is_fixtures_listing(url):
+            statuses = self._track_fixtures(content)
+            if statuses and statuses <= FINISHED_STATUSES:
+                return self.ttl["finished"]
+            return self.ttl["live"] if statuses else self.ttl["default"]
+
+        if path.endswith(("/fixtures/events", "/fixtures/statistics")):
+            fixture_id = dict(parse_qsl(urlsplit(url).query)).get("fixture")
+            with self._lock:
+                is_finished = fixture_id is not None and int(fixture_id) in self._finished_fixtures
+            return self.ttl["finished"] if is_finished else self.ttl["live"]
+
+        return self.ttl["default"]
+
+    @staticmethod
+    def _is_fixtures_listing(url):
+        return urlsplit(url).path.rstrip("/").endswith("/fixtures")
+
+    def _track_fixtures(self, content):
+        """Remembers finished fixtures so that their events and statistics get cached for long"""
+        fixtures = json.loads(content).get("response", [])
+        finished = {f["fixture"]["id"] for f in fixtures if f["fixture"]["status"]["short"] in FINISHED_STATUSES}
+        with self._lock:
+            self._finished_fixtures.update(finished)
+        return {f["fixture"]["status"]["short"] for f in fixtures}
+
+    @staticmethod
+    def _build_response(request, content, meta):
+        res = Response()
+        res.status_code = 200
+        res.reason = "OK"
+        res._content = content
+        res.headers = CaseInsensitiveDict(meta)
+        res.encoding = "utf-8"
+        res.url = request.url
+        res.request = request
+        res.from_cache = True
+        return res
+
+    def close(self):
+        self.adapter.close()
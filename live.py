@@ -0,0 +1,242 @@
+import argparse
+import atexit
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import settings
+from rate_limiter import QuotaExhaustedError
+from trigger_rules import TriggerRules
+
+log = logging.getLogger(__name__)
+
+
+class LivePoller:
+    def __init__(self, football_buddy, teams: list, mailer=None, subject=None, receiver_email=None,
+                 min_interval=60.0, max_interval=600.0, backoff=1.5, requests_per_hour=None):
+        """
+        Polls the matches of the teams of interest while they are played, stores their new events and emails
+        triggers found among them right away. Only events not stored before go through trigger detection: the
+        rules first, the LLM for events the rules can't decide.
+        The poll interval drops to min_interval when something happened and grows by the backoff factor while
+        nothing does, up to max_interval (also used while none of the teams plays). It is never shorter than the
+        request budget allows.
+        :param football_buddy: FootballBuddy instance whose retriever, DB and LLM clients are used
+        :param teams: team configs with the keys of data_config.team in config.yaml
+        :param mailer: EmailSender for trigger emails, triggers are only logged without it
+        :param receiver_email: address or list of addresses, or dict {team name: addresses} to email only the
+            subscribers of the teams playing
+        :param min_interval: seconds between polls while events keep coming
+        :param max_interval: seconds between polls while none of the teams plays
+        :param backoff: growth factor of the interval after polls without new events
+        :param requests_per_hour: RapidAPI request budget; the rest of the daily quota of the rate limiter spread
+            over the rest of the day caps it too
+        """
+        self.football_buddy = football_buddy
+        self.teams = [t["team"] for t in teams]
+        self.leagues = sorted({(t["league"], t["country_code"]) for t in teams})
+        self.mailer = mailer
+        self.subject = subject or "Live"
+        self.receiver_email = receiver_email
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.requests_per_hour = requests_per_hour
+        self.rules = football_buddy.trigger_rules or TriggerRules(team=self.teams[0])
+
+        self.interval = min_interval
+        self._live = 0
+        self.stats = {"polls": 0, "requests": 0, "new_events": 0, "triggers": 0}
+
+    def _teams_in(self, fixture):
+        names = [fixture["teams"][side]["name"].casefold() for side in ["home", "away"]]
+        return [team for team in self.teams if any(team.casefold() in name for name in names)]
+
+    def budget_interval(self, requests_per_poll):
+        """:return: shortest interval in seconds at which polls stay within the request budget"""
+        per_hour = self.requests_per_hour or float("inf")
+
+        limiter = self.football_buddy.radar.rate_limiter
+        if limiter is not None:
+            stats = limiter.stats()
+            remaining = stats["remaining_today"]
+            if limiter.daily_quota is not None:
+                left = limiter.daily_quota - stats["used_today"]
+                remaining = left if remaining is None else min(remaining, left)
+            if remaining is not None:
+                now = datetime.now()
+                midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+                hours_left = max((midnight - now).total_seconds() / 3600, 1 / 60)
+                per_hour = min(per_hour, remaining / hours_left)
+
+        if per_hour <= 0:
+            return self.max_interval
+        return requests_per_poll * 3600 / per_hour
+
+    def next_interval(self, live_matches, new_events):
+        if not live_matches:
+            interval = self.max_interval
+        elif new_events:
+            interval = self.min_interval
+        else:
+            interval = min(self.max_interval, self.interval * self.backoff)
+        # Next poll costs one request for the live fixtures and one per match for its events
+        return max(interval, self.budget_interval(1 + live_matches))
+
+    def detect_triggers(self, deltas):
+        """
+        :param deltas: list of dicts {"fixture": id, "events": new event rows, "teams": teams rows, "watched": teams}
+        :return: dict {fixture id: trigger dict}
+        """
+        fb = self.football_buddy
+        decisions, for_llm = {}, []
+        for match in deltas:
+            if (decision := self.rules.evaluate_events(match["events"])) is not None:
+                decisions[match["fixture"]] = decision
+            else:
+                for_llm.append(match)
+
+        for team in {" and ".join(m["watched"]) for m in for_llm}:
+            matches = [m for m in for_llm if " and ".join(m["watched"]) == team]
+            llm_responses = fb.oai_ops.get_llm_triggers_about_data(
+                llm=fb.get_llm("trigger_detection"),
+                matches_data=[{"events": m["events"], "teams": m["teams"]} for m in matches],
+                wanted_team=team)
+            for m, llm_response in zip(matches, llm_responses):
+                if llm_response is not None and (json_res := fb.get_json_from_response(llm_response)):
+                    decisions[m["fixture"]] = json_res
+        return decisions
+
+    def notify(self, match, trigger):
+        home, away = match["teams"]
+        subject = f"{self.subject}: {home['name']} {home['goals']}:{away['goals']} {away['name']}, " \
+                  f"minute {match['elapsed']}"
+        log.info(f"Live trigger for match ID {match['fixture']}: {subject} - {trigger['reason']}")
+        if self.mailer is None:
+            return
+        receivers = self.receiver_email
+        if isinstance(receivers, dict):
+            receivers = sorted({r for team in match["watched"] for r in receivers.get(team, [])})
+        elif isinstance(receivers, str) or receivers is None:
+            receivers = [receivers]
+
+        errors = self.mailer.send_many([
+            self.mailer.format_email(subject=subject, receiver_email=r, content=trigger["reason"])
+            for r in receivers])
+        for r, e in zip(receivers, errors):
+            if e is not None:
+                log.error(f"Live trigger email for match ID {match['fixture']} to {r} failed: {e}")
+
+    def poll_once(self):
+        """:return: tuple (number of live matches of the teams, number of new events, list of triggers)"""
+        fb = self.football_buddy
+        live = fb.radar.get_live_fixtures(self.leagues)
+        self.stats["requests"] += 1
+
+        deltas = []
+        watched = [(f, teams) for f in live if (teams := self._teams_in(f))]
+        for fixture, teams in watched:
+            goals, elapsed = fixture["goals"], fixture["fixture"]["status"]["elapsed"]
+            match_data = fb.radar.get_fixture_live_data(fixture)
+            self.stats["requests"] += 1
+            if new_events := fb.db_ops.insert_new_events(match_data):
+                deltas.append({
+                    "fixture": match_data["fixture_id"],
+                    "elapsed": elapsed,
+                    "events": new_events,
+                    "teams": [{"name": fixture["teams"][side]["name"], "goals": goals[side]}
+                              for side in ["home", "away"]],
+                    "watched": teams})
+
+        new_events = sum(len(d["events"]) for d in deltas)
+        triggers = []
+        if deltas:
+            decisions = self.detect_triggers(deltas)
+            for match in deltas:
+                if (trigger := decisions.get(match["fixture"])) and trigger["trigger"] == "yes":
+                    self.notify(match, trigger)
+                    triggers.append({**trigger, "fixture_id": match["fixture"]})
+
+        self.stats["polls"] += 1
+        self.stats["new_events"] += new_events
+        self.stats["triggers"] += len(triggers)
+        return len(watched), new_events, triggers
+
+    def run(self, max_polls=None, duration=None):
+        """
+        Polls until stopped (KeyboardInterrupt), the daily quota is used up, or max_polls/duration is reached.
+        :param duration: seconds to poll for
+        :return: dict with the numbers of polls, requests, new events and triggers
+        """
+        start = time.monotonic()
+        while max_polls is None or self.stats["polls"] < max_polls:
+            new_events = 0
+            try:
+                self._live, new_events, _ = self.poll_once()
+            except QuotaExhaustedError as e:
+                log.error(f"Stopping live polling: {e}")
+                break
+            except Exception as e:
+                log.exception(f"Live poll failed: {e}")
+
+            self.interval = self.next_interval(self._live, new_events)
+            if duration is not None and time.monotonic() - start + self.interval > duration:
+                break
+            log.debug(f"{self._live} live matches, {new_events} new events, next poll in {self.interval:.1f} s")
+            time.sleep(self.interval)
+
+        elapsed = time.monotonic() - start
+        summary = {**self.stats, "requests_per_hour": round(self.stats["requests"] * 3600 / max(elapsed, 1e-9), 1)}
+        log.info(f"Live polling finished: {summary}")
+        return summary
+
+
+if __name__ == "__main__":
+    from main import FootballBuddy
+    from send_email import EmailSender, recipients
+
+    parser = argparse.ArgumentParser(description="Polls matches of the teams of interest while they are played "
+                                                 "and emails triggers right away")
+    parser.add_argument("--teams", nargs="+", help="Names of teams from data_config.teams, all by default")
+    parser.add_argument("--max-polls", type=int)
+    parser.add_argument("--duration", type=float, help="Seconds to poll for, until interrupted by default")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler()],
+        level=args.log_level)
+
+    config = settings.config()
+
+    teams = config["data_config"].get("teams") or [config["data_config"]["team"]]
+    if args.teams:
+        teams = [t for t in teams if t["team"] in args.teams]
+
+    foo_bud = FootballBuddy.from_config(config, date=datetime.now().strftime("%Y-%m-%d"))
+    metrics_config = config.get("metrics", {})
+    atexit.register(foo_bud.metrics.export, report_path=metrics_config.get("report_path"),
+                    prometheus_path=metrics_config.get("prometheus_path"), mode="live")
+    mailer = EmailSender.from_config(config, sender_password=os.getenv("EMAIL_SENDER_PASSWORD"))
+
+    live_config = config.get("live", {})
+    poller = LivePoller(
+        foo_bud,
+        teams=teams,
+        mailer=mailer,
+        subject=config["email_service"]["email_params"].get("live_subject"),
+        receiver_email={t["team"]: recipients(config["email_service"]["participants_meta"], team=t["team"])
+                        for t in teams},
+        min_interval=live_config.get("min_interval", 60),
+        max_interval=live_config.get("max_interval", 600),
+        backoff=live_config.get("backoff", 1.5),
+        requests_per_hour=live_config.get("requests_per_hour"))
+    try:
+        poller.run(max_polls=args.max_polls, duration=args.duration)
+    except KeyboardInterrupt:
+        log.info(f"Live polling interrupted: {poller.stats}")
+    finally:
+        mailer.close()
+        foo_bud.log_stats()
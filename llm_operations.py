@@ -1,31 +1,182 @@
+import asyncio
+import hashlib
+import json
 import logging
+import threading
 
-import yaml
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+import settings
+from metrics import METRICS
 
 log = logging.getLogger(__name__)
 
 
+class LLMCache:
+    def __init__(self, cache, ttl=10 * 365 * 24 * 3600, bypass_nonzero_temperature=False):
+        """
+        Stores LLM answers under a hash of model name, temperature, prompt template and canonicalized input data,
+        so that the same query is only ever paid for once.
+        :param cache: DiskCache instance to store the answers in
+        :param ttl: lifetime of a cached answer in seconds
+        :param bypass_nonzero_temperature: don't cache models with temperature > 0, whose answers are meant to vary
+        """
+        self.cache = cache
+        self.ttl = ttl
+        self.bypass_nonzero_temperature = bypass_nonzero_temperature
+
+    def applies_to(self, llm):
+        return not (self.bypass_nonzero_temperature and getattr(llm, "temperature", 0))
+
+    @staticmethod
+    def key(llm, prompt, placeholder_and_data):
+        payload = {
+            "model": getattr(llm, "model_name", type(llm).__name__),
+            "temperature": getattr(llm, "temperature", None),
+            "prompt": prompt,
+            "data": placeholder_and_data}
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, llm, prompt, placeholder_and_data):
+        if not self.applies_to(llm):
+            return None
+        value = self.cache.get(self.key(llm, prompt, placeholder_and_data))
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, llm, prompt, placeholder_and_data, answer):
+        if self.applies_to(llm):
+            self.cache.set(self.key(llm, prompt, placeholder_and_data), answer, ttl=self.ttl)
+
+    def stats(self):
+        return self.cache.stats()
+
+
 class OpenAIOperations:
-    def __init__(self):
-        with open("prompts.yaml", "r") as f:
-            self.prompts = yaml.safe_load(f)
+    def __init__(self, max_concurrency=4, timeout=None, cache: LLMCache = None, metrics=None, cassette=None):
+        """
+        :param max_concurrency: max number of LLM calls in flight in the batch methods, shared by concurrent batches
+        :param timeout: seconds after which a single call of the batch methods is given up, None for no limit
+        :param cache: optional cache of LLM answers
+        :param metrics: Metrics registry for call timings and tokens, the shared one by default
+        :param cassette: optional replay.Cassette the answers of the chat models are recorded to or replayed from
+        """
+        self.metrics = metrics or METRICS
+        self.cassette = cassette
+        self.prompts = settings.prompts()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._semaphore = None
 
     def init_chat_model(self, model_name, temperature, **kwargs):
-        return ChatOpenAI(
+        # LangChain and the OpenAI client take most of the startup time, they are only imported once a model is used
+        if self.cassette is not None:
+            from replay_llm import ReplayChatModel
+
+            # Replaying needs no OpenAI client, and so no API key
+            if self.cassette.replaying:
+                return ReplayChatModel(cassette=self.cassette, model_name=model_name, temperature=temperature)
+
+        from langchain_openai import ChatOpenAI
+
+        llm = ChatOpenAI(
             model=model_name,
             temperature=temperature,
             **kwargs)
+        if self.cassette is not None:
+            return ReplayChatModel(cassette=self.cassette, llm=llm, model_name=model_name, temperature=temperature)
+        return llm
+
+    @staticmethod
+    def model_name(llm):
+        return getattr(llm, "model_name", type(llm).__name__)
+
+    def _record_response(self, llm, response):
+        """Counts the tokens of an LLM answer, as far as the model reports its usage"""
+        model = self.model_name(llm)
+        self.metrics.inc("llm_requests_total", model=model, source="llm")
+        if usage := getattr(response, "usage_metadata", None):
+            self.metrics.inc("llm_tokens_total", usage.get("input_tokens", 0), model=model, direction="input")
+            self.metrics.inc("llm_tokens_total", usage.get("output_tokens", 0), model=model, direction="output")
 
     def llm_query_data(self, llm, prompt, placeholder_and_data: dict):
+        if self.cache and (cached := self.cache.get(llm, prompt, placeholder_and_data)) is not None:
+            log.debug("LLM answer served from cache")
+            self.metrics.inc("llm_requests_total", model=self.model_name(llm), source="cache")
+            return cached
+
+        from langchain_core.prompts import PromptTemplate
+
         template = PromptTemplate.from_template(prompt)
         chain = template | llm
 
         log.debug(f"Querying LLM {llm}...")
-        response = chain.invoke(placeholder_and_data)
+        with self.metrics.timer("llm_request_seconds", model=self.model_name(llm)):
+            response = chain.invoke(placeholder_and_data)
+        self._record_response(llm, response)
+        if self.cache:
+            self.cache.set(llm, prompt, placeholder_and_data, response.content)
         return response.content
 
+    async def allm_query_batch(self, llm, prompt, placeholders_and_data: list, timeout=None):
+        from langchain_core.prompts import PromptTemplate
+
+        template = PromptTemplate.from_template(prompt)
+        chain = template | llm
+        # Created on the event loop running the batches (asyncio primitives of Python < 3.10 bind to the loop at
+        # creation); batches run on one loop, so there is no race
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        timeout = timeout or self.timeout
+
+        async def query(data):
+            if self.cache and (cached := self.cache.get(llm, prompt, data)) is not None:
+                self.metrics.inc("llm_requests_total", model=self.model_name(llm), source="cache")
+                return cached
+            async with self._semaphore:
+                # Timed inside the semaphore, waiting for a free slot is not part of the call
+                with self.metrics.timer("llm_request_seconds", model=self.model_name(llm)):
+                    response = await asyncio.wait_for(chain.ainvoke(data), timeout)
+            self._record_response(llm, response)
+            if self.cache:
+                self.cache.set(llm, prompt, data, response.content)
+            return response.content
+
+        log.debug(f"Querying LLM {llm} with a batch of {len(placeholders_and_data)} inputs...")
+        responses = await asyncio.gather(*[query(d) for d in placeholders_and_data], return_exceptions=True)
+
+        results = []
+        for i, res in enumerate(responses):
+            if isinstance(res, BaseException):
+                err = "timed out" if isinstance(res, asyncio.TimeoutError) else f"failed: {res!r}"
+                log.error(f"LLM call {i + 1}/{len(responses)} of the batch {err}")
+                results.append(None)
+            else:
+                results.append(res)
+        return results
+
+    def llm_query_batch(self, llm, prompt, placeholders_and_data: list, timeout=None):
+        """
+        Runs llm_query_data for many inputs concurrently.
+        :return: list of answers in the order of placeholders_and_data; None where the call failed or timed out
+        """
+        if not placeholders_and_data:
+            return []
+        return self._run(self.allm_query_batch(llm, prompt, placeholders_and_data, timeout))
+
+    def _run(self, coro):
+        """
+        Runs the coroutine on one long-lived event loop. Async HTTP clients of the chat models keep connections
+        bound to the loop they were opened in, so a new loop per batch (asyncio.run) can't safely reuse them.
+        Callable from any thread.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
     def get_llm_match_description(self, llm, match_data):
         log.debug("Working on match description from fixture metadata...")
         return self.llm_query_data(
@@ -40,9 +191,30 @@ class OpenAIOperations:
             prompt=self.prompts["trigger_detection"]["main"]["prompts"]["sys"],
             placeholder_and_data={"data": match_data, "team": wanted_team})
 
+    def get_llm_match_descriptions(self, llm, matches_data):
+        log.debug(f"Working on match descriptions of {len(matches_data)} fixtures...")
+        return self.llm_query_batch(
+            llm=llm,
+            prompt=self.prompts["json_description"]["main"]["prompts"]["sys"],
+            placeholders_and_data=[{"data": m} for m in matches_data])
+
+    def get_llm_triggers_about_data(self, llm, matches_data, wanted_team):
+        log.debug(f"Getting triggers for events of {len(matches_data)} fixtures and {wanted_team}...")
+        return self.llm_query_batch(
+            llm=llm,
+            prompt=self.prompts["trigger_detection"]["main"]["prompts"]["sys"],
+            placeholders_and_data=[{"data": m, "team": wanted_team} for m in matches_data])
+
     def format_email(self, llm, data):
         log.debug("Formatting email body...")
         return self.llm_query_data(
             llm=llm,
             prompt=self.prompts["email_formatting"]["main"]["prompts"]["sys"],
+            placeholder_and_data={"data": data})
+
+    def get_email_intro(self, llm, data):
+        log.debug("Writing email introduction...")
+        return self.llm_query_data(
+            llm=llm,
+            prompt=self.prompts["email_intro"]["main"]["prompts"]["sys"],
             placeholder_and_data={"data": data})
\ No newline at end of file
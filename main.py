@@ -1,4 +1,5 @@
 import argparse
+import atexit
 import json
 import logging
 import os
@@ -6,12 +7,20 @@ import sys
 from datetime import datetime, timedelta
 from pprint import pprint as pp
 
-import yaml
-
-from data_retriever import RapidDataRetriever
+import settings
+from backfill import Backfill
+from data_retriever import RapidDataRetriever, fixture_state, is_finished
+from disk_cache import DiskCache
+from email_renderer import EmailRenderer
 from db_operations import SQLiteOperations
-from send_email import EmailSender
-from llm_operations import OpenAIOperations
+from send_email import EmailSender, recipients
+from llm_operations import LLMCache, OpenAIOperations
+from metrics import METRICS, Metrics, Profiler
+from payload_compactor import PayloadCompactor, summarize_reports
+from pipeline import StreamingPipeline
+from rate_limiter import RateLimiter
+from replay import Replay
+from trigger_rules import TriggerRules, agreement_report
 
 
 log = logging.getLogger(__name__)
@@ -19,7 +28,13 @@ log = logging.getLogger(__name__)
 
 class FootballBuddy:
     def __init__(self, date: str, team: str, rapidapi_url: str, rapidapi_apikey: str, rapidapi_host: str,
-                 sqlite_db_name: str):
+                 sqlite_db_name: str, rapidapi_max_workers: int = 1, rapidapi_cache: DiskCache = None,
+                 rapidapi_cache_ttl: dict = None, rapidapi_rate_limiter: RateLimiter = None,
+                 llm_max_concurrency: int = 4, llm_timeout: float = None, llm_cache: LLMCache = None,
+                 trigger_rules: TriggerRules = None, audit_trigger_rules: bool = False,
+                 payload_compactor: PayloadCompactor = None, resume: bool = True, incremental: bool = False,
+                 refetch: bool = False, metrics: Metrics = None, email_formatting: str = "template",
+                 email_renderer: EmailRenderer = None, replay: Replay = None):
         """
         Class handling data from RapidAPI: football matches fixtures of a selected team. Handles sourcing, enhancement,
         storage, and other operations of the program.
@@ -29,50 +44,277 @@ class FootballBuddy:
         :param rapidapi_apikey: personal API key for RapidAPI service
         :param rapidapi_host: RapidAPI host
         :param sqlite_db_name: the name of SQLite database
+        :param rapidapi_max_workers: max number of concurrent RapidAPI requests for fixture metadata
+        :param rapidapi_cache: optional on-disk cache of RapidAPI responses
+        :param rapidapi_cache_ttl: cache lifetimes in seconds per kind of response
+        :param rapidapi_rate_limiter: optional client-side rate limiter for RapidAPI requests
+        :param llm_max_concurrency: max number of concurrent LLM calls
+        :param llm_timeout: timeout of a single LLM call in seconds
+        :param llm_cache: optional cache of LLM answers
+        :param trigger_rules: optional rules deciding clear-cut triggers without the LLM
+        :param audit_trigger_rules: send rule-decided matches to the LLM too and log how often they agree
+        :param payload_compactor: optional compaction of match data sent to the LLM for match descriptions
+        :param resume: skip work finished by previous runs of the same day, as recorded in the PipelineState table
+        :param incremental: fetch, describe and store only fixtures that are new or changed since the last run
+        :param refetch: fetch, describe and store all fixtures again, even those fetched by previous runs
+        :param metrics: registry of timings and counters of the run, the shared one by default
+        :param email_formatting: "template" renders emails locally, "llm_intro" adds an introduction written by the
+            LLM, "llm" lets the LLM write the whole email
+        :param email_renderer: renderer and cache of email digests, a default one if not given
+        :param replay: optional Replay whose cassettes the RapidAPI responses and LLM answers are recorded to or
+            replayed from
         """
         self.date = date
         self.team = team
+        self.trigger_rules = trigger_rules
+        self.audit_trigger_rules = audit_trigger_rules
+        self.payload_compactor = payload_compactor
+        self.resume = resume
+        self.incremental = incremental
+        self.refetch = refetch
+        self.metrics = metrics or METRICS
+        if email_formatting not in ("template", "llm_intro", "llm"):
+            raise ValueError(f"Unknown email formatting {email_formatting}")
+        self.email_formatting = email_formatting
+        self.email_renderer = email_renderer or EmailRenderer()
 
         self.radar = RapidDataRetriever(
             base_url=rapidapi_url,
             apikey=rapidapi_apikey,
-            host=rapidapi_host)
-        self.oai_ops = OpenAIOperations()
-        self.db_ops = SQLiteOperations(db_name=sqlite_db_name)
+            host=rapidapi_host,
+            max_workers=rapidapi_max_workers,
+            cache=rapidapi_cache,
+            cache_ttl=rapidapi_cache_ttl,
+            rate_limiter=rapidapi_rate_limiter,
+            metrics=self.metrics,
+            cassette=replay.rapidapi if replay else None)
+        self.oai_ops = OpenAIOperations(max_concurrency=llm_max_concurrency, timeout=llm_timeout, cache=llm_cache,
+                                        metrics=self.metrics, cassette=replay.llm if replay else None)
+        self.db_ops = SQLiteOperations(db_name=sqlite_db_name, metrics=self.metrics)
+        self.db_ops.create_tables()
 
-        with open("prompts.yaml", "r") as f:
-            self.prompts = yaml.safe_load(f)
+        self.prompts = settings.prompts()
+        self._llms = {}
 
-        self.schemas = {}
-        for schema in ["llm_answer", "rapid_data"]:
-            with open(f"json_schemas/{schema}.json", "r") as f:
-                self.schemas[schema] = json.load(f)
+    @classmethod
+    def from_config(cls, config: dict, date: str, resume: bool = True, replay: Replay = None):
+        """
+        Instantiates the class with the settings from config.yaml and secrets from env variables. With replay, the
+        RapidAPI and LLM caches are not used, so that every request is recorded or replayed; replays aren't rate
+        limited.
+        """
+        team_config = config["data_config"]["team"]
+        trigger_config = config.get("triggers", {})
+        llm_config = config.get("llm", {})
+
+        cache_config = config["rapid_api"].get("cache") if replay is None else None
+        rapid_cache = DiskCache(path=cache_config["path"], max_entries=cache_config["max_entries"]) \
+            if cache_config else None
+        rate_limit_config = config["rapid_api"].get("rate_limit") if not (replay and replay.replaying) else None
+        rate_limiter = RateLimiter(
+            **{k: v for k, v in rate_limit_config.items() if k != "state_path"},
+            store=DiskCache(path=rate_limit_config["state_path"]) if rate_limit_config.get("state_path") else None) \
+            if rate_limit_config else None
+        llm_cache_config = llm_config.get("cache") if replay is None else None
+        llm_cache = LLMCache(
+            cache=DiskCache(path=llm_cache_config["path"], max_entries=llm_cache_config["max_entries"]),
+            bypass_nonzero_temperature=llm_cache_config.get("bypass_nonzero_temperature", False)) \
+            if llm_cache_config else None
+        payload_config = llm_config.get("payload", {})
+        # Recorded and replayed runs estimate token counts: tiktoken may download its encoding, and the payloads
+        # (so the recorded prompts) must not depend on whether it is installed
+        payload_encoding = None if replay else payload_config.get("encoding", "o200k_base")
+        payload_compactor = PayloadCompactor(token_budget=payload_config.get("token_budget"),
+                                             encoding=payload_encoding) \
+            if payload_config.get("compact", False) else None
+        trigger_rules = TriggerRules(team=team_config["team"], high_score=trigger_config.get("high_score", 4)) \
+            if trigger_config.get("rules", True) else None
+        email_config = config.get("email_service", {}).get("email_params", {})
+        email_cache_config = email_config.get("cache")
+        email_renderer = EmailRenderer(
+            cache=DiskCache(path=email_cache_config["path"], max_entries=email_cache_config["max_entries"])
+            if email_cache_config else None)
+
+        return cls(
+            date=date,
+            team=team_config["team"],
+            rapidapi_url=config["rapid_api"]["base_url"],
+            rapidapi_host=config["rapid_api"]["host"],
+            rapidapi_apikey=os.getenv("RAPID_APIKEY"),
+            rapidapi_max_workers=config["rapid_api"].get("max_workers", 1),
+            rapidapi_cache=rapid_cache,
+            rapidapi_cache_ttl=cache_config.get("ttl") if cache_config else None,
+            rapidapi_rate_limiter=rate_limiter,
+            llm_max_concurrency=llm_config.get("max_concurrency", 4),
+            llm_timeout=llm_config.get("timeout"),
+            llm_cache=llm_cache,
+            trigger_rules=trigger_rules,
+            audit_trigger_rules=trigger_config.get("audit_rules", False),
+            payload_compactor=payload_compactor,
+            resume=resume,
+            incremental=config["rapid_api"].get("incremental", False),
+            email_formatting=email_config.get("formatting", "template"),
+            email_renderer=email_renderer,
+            replay=replay,
+            sqlite_db_name=config["data_config"]["db_name"])
+
+    def get_llm(self, prompt_name):
+        """Chat model for the given prompt of prompts.yaml, created once and reused"""
+        if prompt_name not in self._llms:
+            llm_config = self.prompts[prompt_name]["main"]["llm"]
+            self._llms[prompt_name] = self.oai_ops.init_chat_model(
+                model_name=llm_config["name"],
+                temperature=llm_config["temperature"])
+        return self._llms[prompt_name]
+
+    def log_stats(self):
+        if self.radar.cache:
+            log.info(f"RapidAPI cache stats: {self.radar.cache.stats()}")
+        if self.radar.rate_limiter:
+            log.info(f"RapidAPI rate limiter stats: {self.radar.rate_limiter.stats()}")
+        if self.oai_ops.cache:
+            log.info(f"LLM cache stats: {self.oai_ops.cache.stats()}")
+
+    def log_stage_summary(self, date=None):
+        for row in self.db_ops.fetch_stage_summary(date or self.date):
+            log.info(f"Pipeline state of {date or self.date}: {row}")
+
+    def plan_rapidapi_fetch(self, season, league, country_code, date=None):
+        """
+        Decides what to fetch from RapidAPI for a day and league, skipping finished fixtures previous runs fetched
+        (resume) and, in the incremental mode, stored fixtures that did not change. Descriptions and triggers of
+        fixtures fetched again are cleared so they get redone.
+        :return: tuple (/fixtures listing items to fetch, get_full_data items fetched by a previous run,
+            ids of stored fixtures that did not change)
+        """
+        date = date or self.date
+        scope = f"{league}|{country_code}|{season}"
+        fetched = self.db_ops.fetch_stage_state(date, "fetched", scope=scope, status="done") \
+            if self.resume and not self.refetch else {}
+        if not self.incremental and 0 in fetched:  # The whole day was fetched before, with all fixtures finished
+            matches_data = [json.loads(fetched[f_id]["payload"]) for f_id in sorted(fetched) if f_id]
+            log.info(f"Loaded {len(matches_data)} fixtures of {league} on {date} fetched by a previous run")
+            return [], matches_data, []
+
+        with self.metrics.timer("stage_seconds", stage="plan"):
+            fixtures = self.radar.get_league_fixtures(date, season, league, country_code)
+        self.metrics.inc("fixtures_total", len(fixtures), stage="listed")
+        if not self.incremental:
+            # Fixtures fetched while being played are fetched again
+            to_fetch, matches_data = [], []
+            for f in fixtures:
+                if f["fixture"]["id"] in fetched and \
+                        is_finished((m := json.loads(fetched[f["fixture"]["id"]]["payload"]))["about"]):
+                    matches_data.append(m)
+                else:
+                    to_fetch.append(f)
+            self.db_ops.clear_stage_state(date, ["described", "triggered"], [f["fixture"]["id"] for f in to_fetch])
+            return to_fetch, matches_data, []
+
+        # Compare the listing with the stored fixtures; fixtures fetched by a previous run but not stored (e.g.
+        # because the description failed) don't need to be fetched again if they didn't change since
+        stored = self.db_ops.fetch_fixture_states(f["fixture"]["id"] for f in fixtures)
+        to_fetch, matches_data, unchanged = [], [], []
+        for f in fixtures:
+            f_id, state = f["fixture"]["id"], fixture_state(f)
+            if stored.get(f_id) == state:
+                unchanged.append(f_id)
+            elif f_id in fetched and fixture_state((m := json.loads(fetched[f_id]["payload"]))["about"]) == state:
+                matches_data.append(m)
+            else:
+                to_fetch.append(f)
+        log.info(f"{league} on {date}: {len(unchanged)}/{len(fixtures)} fixtures unchanged, "
+                 f"{len(matches_data)} fetched before, {len(to_fetch)} to fetch")
 
-    def get_rapidapi_data(self, season, league, country_code):
-        return self.radar.get_full_data(date=self.date, season=season, league=league, country_code=country_code)
+        self.db_ops.clear_stage_state(date, ["described", "triggered"], [f["fixture"]["id"] for f in to_fetch])
+        return to_fetch, matches_data, unchanged
 
-    def enrich_and_load_into_db(self, matches_data):
-        self.db_ops.create_tables()
+    def iter_fetched_rapidapi_data(self, fixtures, season, league, country_code, date=None, ordered=True):
+        """
+        Fetches events and statistics of /fixtures listing items, checkpointing each fixture as it arrives. Outside
+        the incremental mode, the whole day is checkpointed once all its fixtures are finished.
+        :param ordered: yield in the order of fixtures, otherwise as soon as each fixture arrives
+        :return: generator of get_full_data items
+        """
+        date = date or self.date
+        scope = f"{league}|{country_code}|{season}"
+        finished = True
+        try:
+            for m in self.radar.iter_fixtures_full_data(fixtures, ordered=ordered):
+                self.db_ops.set_stage_state(date, "fetched", [(m["fixture_id"], "done", json.dumps(m), None)],
+                                            scope=scope)
+                self.metrics.inc("fixtures_total", stage="fetched")
+                finished = finished and is_finished(m["about"])
+                yield m
+        except Exception as e:
+            self.db_ops.set_stage_state(date, "fetched", [(0, "failed", None, str(e))], scope=scope)
+            raise
+        # plan_rapidapi_fetch only skips finished fixtures, so all fixtures of the day are finished if the fetched
+        # ones are; in the incremental mode, it skips unchanged ones too, which may still be played
+        if finished and not self.incremental:
+            self.db_ops.set_stage_state(date, "fetched", [(0, "done", None, None)], scope=scope)
+
+    def get_rapidapi_data(self, season, league, country_code, date=None):
+        """
+        :return: list of get_full_data items to describe and store; in the incremental mode only new or changed
+            fixtures
+        """
+        to_fetch, matches_data, _ = self.plan_rapidapi_fetch(season, league, country_code, date)
+        return matches_data + list(self.iter_fetched_rapidapi_data(to_fetch, season, league, country_code, date))
+
+    def enrich_and_load_into_db(self, matches_data, date=None):
+        """:return: ids of the fixtures stored with a description, by this or a previous run"""
+        date = date or self.date
+        stored_before = []
+        if self.resume:
+            described = self.db_ops.fetch_stage_state(date, "described", status="done")
+            stored_before = [m["fixture_id"] for m in matches_data if m["fixture_id"] in described]
+            matches_data = [m for m in matches_data if m["fixture_id"] not in described]
+            log.info(f"{len(stored_before)}/{len(stored_before) + len(matches_data)} fixtures of {date} were "
+                     f"described by a previous run")
+        if not matches_data:
+            return stored_before
 
         model_name = self.prompts["json_description"]["main"]["llm"]["name"]
-        llm = self.oai_ops.init_chat_model(
-            model_name=model_name,
-            temperature=self.prompts["json_description"]["main"]["llm"]["temperature"])
-
-        for m in matches_data:
-            if self.radar.data_is_ok(m, schema=self.schemas["rapid_data"]):
-                m["llm"] = {"text": self.oai_ops.get_llm_match_description(llm=llm, match_data=m),
-                            "llm": model_name}
-                self.db_ops.insert_into_fixture(m)
-            else:
-                raise RuntimeError(f"Invalid data retrieved from Rapid API! Data: {m}")
-
-    def fetch_fixture_data_for_llm(self):
-        fixture_ids = self.db_ops.fetch_fixture_ids(self.date)
-        matches = []
-        for id_ in fixture_ids:
-            matches.append(self.db_ops.fetch_match_data(id_))
-        log.info(f"Found {len(matches)} for day {self.date}")
+        llm = self.get_llm("json_description")
+
+        with self.metrics.timer("stage_seconds", stage="validate"):
+            for m in matches_data:
+                if not settings.validator("rapid_data").validate(m):
+                    raise RuntimeError(f"Invalid data retrieved from Rapid API! Data: {m}")
+
+        payloads = matches_data
+        if self.payload_compactor:
+            compacted = [self.payload_compactor.compact(m) for m in matches_data]
+            payloads = [text for text, _ in compacted]
+            reports = [report for _, report in compacted]
+            for r in reports:
+                log.debug(f"Compacted payload of fixture {r['fixture_id']}: {r}")
+            log.info(f"Compacted LLM payloads: {summarize_reports(reports)}")
+
+        with self.metrics.timer("stage_seconds", stage="describe"):
+            descriptions = self.oai_ops.get_llm_match_descriptions(llm=llm, matches_data=payloads)
+        described, states = [], []
+        for m, text in zip(matches_data, descriptions):
+            if text is None:
+                log.error(f"No LLM description for fixture {m['fixture_id']}, not storing it")
+                states.append((m["fixture_id"], "failed", None, "No LLM description"))
+                continue
+            m["llm"] = {"text": text, "llm": model_name}
+            described.append(m)
+            states.append((m["fixture_id"], "done", None, None))
+
+        # Fixture rows and their state are committed together
+        with self.metrics.timer("stage_seconds", stage="store"), self.db_ops.wrapper:
+            self.db_ops.insert_into_fixtures(described)
+            self.db_ops.set_stage_state(date, "described", states)
+        self.metrics.inc("fixtures_total", len(described), stage="stored")
+        return stored_before + [m["fixture_id"] for m in described]
+
+    def fetch_fixture_data_for_llm(self, date=None):
+        date = date or self.date
+        matches = self.db_ops.fetch_matches_bulk(date_from=date, parts=("events", "stats", "teams"))
+        log.info(f"Found {len(matches)} for day {date}")
         return matches
 
     def get_json_from_response(self, llm_response):
@@ -81,7 +323,7 @@ class FootballBuddy:
             if not isinstance(llm_response, dict):
                 llm_response = json.loads(llm_response)
             # Check data integrity
-            if self.radar.data_is_ok(data=llm_response, schema=self.schemas["llm_answer"]):
+            if settings.validator("llm_answer").validate(llm_response):
                 # If ok, return data
                 return llm_response
         except Exception as e:
@@ -89,95 +331,261 @@ class FootballBuddy:
         # Otherwise return placeholder
         return {}
 
-    def get_llm_insight_triggers(self, retrieved_matches_data):
-        model_name = self.prompts["trigger_detection"]["main"]["llm"]["name"]
-        llm = self.oai_ops.init_chat_model(
-            model_name=model_name,
-            temperature=self.prompts["trigger_detection"]["main"]["llm"]["temperature"])
-
+    def get_trigger_decisions(self, retrieved_matches_data, team=None):
+        """:return: dict {fixture id: trigger dict}, without fixtures the LLM failed to answer about"""
+        team = team or self.team
+        llm = self.get_llm("trigger_detection")
+
+        rule_decisions = {}
+        if self.trigger_rules:
+            for md in retrieved_matches_data:
+                if decision := self.trigger_rules.evaluate(md, team=team):
+                    rule_decisions[md["fixture"]] = decision
+            log.info(f"Rules decided {len(rule_decisions)}/{len(retrieved_matches_data)} matches")
+
+        for_llm = [md for md in retrieved_matches_data
+                   if self.audit_trigger_rules or md["fixture"] not in rule_decisions]
+        llm_responses = self.oai_ops.get_llm_triggers_about_data(llm=llm, matches_data=for_llm, wanted_team=team)
+
+        llm_decisions = {}
+        for md, llm_response in zip(for_llm, llm_responses):
+            if llm_response is not None and (json_res := self.get_json_from_response(llm_response)):
+                llm_decisions[md["fixture"]] = json_res
+
+        if self.audit_trigger_rules:
+            log.info(f"Trigger rules vs. LLM: {agreement_report(rule_decisions, llm_decisions)}")
+        return {**llm_decisions, **rule_decisions}
+
+    @staticmethod
+    def _triggers_from_decisions(retrieved_matches_data, decisions):
         triggers = []
         for md in retrieved_matches_data:
-            llm_response = self.oai_ops.get_llm_trigger_about_data(llm=llm, match_data=md, wanted_team=self.team)
-
-            if json_res := self.get_json_from_response(llm_response):
-                if json_res["trigger"] == "yes":
-                    log.info(f"Interesting activity trigger for match ID {md['fixture']}: {json_res}")
-                    json_res["fixture_id"] = md["fixture"]
-                    triggers.append(json_res)
+            json_res = decisions.get(md["fixture"])
+            if json_res and json_res["trigger"] == "yes":
+                log.info(f"Interesting activity trigger for match ID {md['fixture']}: {json_res}")
+                triggers.append({**json_res, "fixture_id": md["fixture"]})
         log.info(f"Identified {len(triggers)} triggers for matches events...")
         return triggers
 
-    def collect_valid_triggers(self, fixtures_data):
-        triggers_ = self.get_llm_insight_triggers(fixtures_data)
-        return [t for t in triggers_ if self.get_json_from_response(t)]
+    def get_llm_insight_triggers(self, retrieved_matches_data, team=None):
+        decisions = self.get_trigger_decisions(retrieved_matches_data, team=team)
+        return self._triggers_from_decisions(retrieved_matches_data, decisions)
+
+    def collect_valid_triggers(self, fixtures_data, team=None, date=None):
+        team, date = team or self.team, date or self.date
+        decided = {}
+        if self.resume:
+            done = self.db_ops.fetch_stage_state(date, "triggered", scope=team, status="done")
+            decided = {f_id: json.loads(state["payload"]) for f_id, state in done.items()}
+            log.info(f"{len(decided)} fixtures of {date} were checked for triggers of {team} by a previous run")
+
+        todo = [md for md in fixtures_data if md["fixture"] not in decided]
+        with self.metrics.timer("stage_seconds", stage="trigger"):
+            decisions = self.get_trigger_decisions(todo, team=team) if todo else {}
+        self.metrics.inc("fixtures_total", len(todo), stage="triggered")
+        self.db_ops.set_stage_state(
+            date, "triggered", scope=team,
+            states=[(md["fixture"], "done", json.dumps(decisions[md["fixture"]]), None) if md["fixture"] in decisions
+                    else (md["fixture"], "failed", None, "No valid trigger decision") for md in todo])
+
+        # LLM decisions were validated by get_trigger_decisions, checkpointed ones before they were stored
+        return self._triggers_from_decisions(fixtures_data, {**decided, **decisions})
         # TODO: Run invalid triggers through a validator LLM (prompt with shots is ready in prompts.yaml)
 
-    def format_email(self, triggers):
-        llm = self.oai_ops.init_chat_model(
-            model_name=self.prompts["email_formatting"]["main"]["llm"]["name"],
-            temperature=self.prompts["email_formatting"]["main"]["llm"]["temperature"])
+    def format_email(self, triggers, subject="There was a cool match!", date=None, team=None):
+        """
+        HTML body of the email about the triggers, rendered from the stored teams, goals and commentary (see
+        email_formatting). Bodies are cached per trigger set, so a rerun or another subscriber group reuses them.
+        """
+        date, team = date or self.date, team or self.team
+        matches = self.db_ops.fetch_matches_bulk(fixture_ids=[t["fixture_id"] for t in triggers],
+                                                 parts=("teams", "comment"))
+        reasons = {t["fixture_id"]: t.get("reason") for t in triggers}
+        digest = [{"fixture_id": m["fixture"], "teams": m["teams"], "comment": m["comment"],
+                   "reason": reasons.get(m["fixture"])} for m in matches]
+        context = {"formatting": self.email_formatting, "title": subject, "subtitle": f"{team}, {date}"}
+
+        key = self.email_renderer.key(digest, **context)
+        if (body := self.email_renderer.get(key)) is not None:
+            log.info(f"Email about {len(triggers)} triggers served from the digest cache")
+            return body
+
+        if self.email_formatting == "llm":
+            email_data = [{"score": m["teams"], "comment": m["comment"]} for m in matches]
+            body = self.oai_ops.format_email(llm=self.get_llm("email_formatting"), data=email_data)
+        else:
+            intro = None
+            if self.email_formatting == "llm_intro":
+                try:
+                    intro = self.oai_ops.get_email_intro(llm=self.get_llm("email_intro"), data=digest)
+                except Exception as e:
+                    log.exception(f"LLM email introduction failed, using the default one: {e}")
+            body = self.email_renderer.render(digest, title=subject, subtitle=context["subtitle"], intro=intro)
+            if intro is None and self.email_formatting == "llm_intro":
+                return body  # Not cached, so that the next run tries the LLM again
+        self.email_renderer.set(key, body)
+        return body
+
+    def email_triggers(self, mailer: EmailSender, triggers, subject, receiver_email, date=None, team=None):
+        """
+        Formats the email about the triggers of one day and team and sends it to each receiver, once. Triggers
+        emailed by previous runs are left out, so a later run only sends a digest of the new ones; receivers who got
+        the same digest from a failed previous run are skipped.
+        :param receiver_email: address or list of addresses, each gets an own message
+        :return: False if there was nothing to send: no triggers, or all emailed to all receivers by previous runs
+        """
+        date, team = date or self.date, team or self.team
+        receivers = [receiver_email] if isinstance(receiver_email, str) else list(receiver_email)
+        emailed, pending, sent_before = [], None, []
+        if self.resume and (state := self.db_ops.fetch_stage_state(date, "emailed", scope=team).get(0)):
+            payload = json.loads(state["payload"]) if state["payload"] else {}
+            if state["status"] == "done":
+                emailed = payload.get("fixtures", [])
+            else:  # "fixtures" is the digest of the failed run, "emailed" the fixtures of the digests before it
+                emailed, pending = payload.get("emailed", []), payload.get("fixtures")
+                sent_before = payload.get("receivers", [])
+
+        new_triggers = [t for t in triggers if t["fixture_id"] not in set(emailed)]
+        if not new_triggers:
+            if triggers:
+                log.info(f"Email about the {len(triggers)} triggers of {team} on {date} was sent by a previous run, "
+                         f"skipping it")
+            else:
+                log.info(f"No triggers about {team} on {date}, nothing to email")
+            return False
+        triggers = new_triggers
+        fixture_ids = [t["fixture_id"] for t in triggers]
+        if sent_before and set(fixture_ids) != set(pending or []):
+            log.info(f"Triggers about {team} on {date} changed since a previous run failed, emailing all receivers")
+            sent_before = []
+        elif sent_before:
+            log.info(f"Email about {team} on {date} was sent to {len(sent_before)} receivers by a previous run")
+        receivers = [r for r in receivers if r not in set(sent_before)] if sent_before else receivers
+        if emailed:
+            log.info(f"Emailing {len(triggers)} new triggers about {team} on {date}, {len(emailed)} were emailed "
+                     f"by previous runs")
 
-        email_data = []
-        for t in triggers:
-            email_data.append(self.db_ops.fetch_email_data(t["fixture_id"]))
+        try:
+            with self.metrics.timer("stage_seconds", stage="email"):
+                email_body = self.format_email(triggers, subject=subject, date=date, team=team)
+                errors = mailer.send_many([
+                    mailer.format_email(subject=subject, receiver_email=r, content=email_body, is_html=True)
+                    for r in receivers])
+        except Exception as e:
+            failed = json.dumps({"emailed": emailed, "fixtures": fixture_ids, "receivers": sent_before})
+            self.db_ops.set_stage_state(date, "emailed", [(0, "failed", failed, str(e))], scope=team)
+            raise
 
-        return self.oai_ops.format_email(llm=llm, data=email_data)
+        sent_to = sent_before + [r for r, e in zip(receivers, errors) if e is None]
+        if failed := [(r, e) for r, e in zip(receivers, errors) if e is not None]:
+            sent = json.dumps({"emailed": emailed, "fixtures": fixture_ids, "receivers": sent_to})
+            self.db_ops.set_stage_state(date, "emailed", [(0, "failed", sent, str(failed[0][1]))], scope=team)
+            raise RuntimeError(f"Email about {team} on {date} failed for {len(failed)}/{len(receivers)} receivers, "
+                               f"e.g. {failed[0][0]}: {failed[0][1]}")
 
+        sent = json.dumps({"fixtures": emailed + fixture_ids, "receivers": sent_to})
+        self.db_ops.set_stage_state(date, "emailed", [(0, "done", sent, None)], scope=team)
+        return True
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sources, enriches and stores football fixtures, emails triggers. "
+                                                 "With --date-from, backfills a date range instead.")
+    parser.add_argument("--date", help="Day to process (%%Y-%%m-%%d), yesterday by default")
+    parser.add_argument("--date-from", help="Backfill: first day to process (%%Y-%%m-%%d)")
+    parser.add_argument("--date-to", help="Backfill: last day to process, yesterday by default")
+    parser.add_argument("--teams", nargs="+", help="Backfill: names of teams from data_config.teams, all by default")
+    parser.add_argument("--workers", type=int, default=2, help="Backfill: days processed concurrently")
+    parser.add_argument("--queue-size", type=int, default=8, help="Backfill: max number of queued days")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Redo all stages, even those finished by previous runs of the same day")
+    parser.add_argument("--full", action="store_true",
+                        help="Fetch all fixtures of the day again, even those fetched by previous runs or "
+                             "unchanged with rapid_api.incremental")
+    parser.add_argument("--profile", nargs="?", const="football_buddy.prof", metavar="PATH",
+                        help="Profile the whole run with cProfile and write the stats to PATH "
+                             "(football_buddy.prof by default)")
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument("--record", metavar="DIR",
+                              help="Record the RapidAPI responses, LLM answers and SMTP replies of the run to DIR")
+    replay_group.add_argument("--replay", metavar="DIR",
+                              help="Replay a run recorded to DIR, offline and without API keys (use the same --date)")
+    parser.add_argument("--replay-latency", type=float,
+                        help="Seconds each replayed request takes, as long as when recorded by default")
+    parser.add_argument("--log-level", default="DEBUG")
+    args = parser.parse_args()
 
     # SETUP LOGGING
     logging.basicConfig(
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         handlers=[logging.StreamHandler()],
-        level="DEBUG")
-    # TODO: argparse to pass log level
+        level=args.log_level)
+
+    # Registered first so that it runs last at exit, after the metrics export
+    if args.profile:
+        profiler = Profiler(args.profile)
+        profiler.start()
+        atexit.register(profiler.stop)
 
     # LOAD CONFIG
-    with open("config.yaml", "r") as f:
-        config = yaml.safe_load(f)
+    config = settings.config()
 
-    # INSTANTIATE CLASSES
-    foo_bud = FootballBuddy(
-        date=(datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"),
-        team=config["data_config"]["team"],
-        rapidapi_url=config["rapid_api"]["base_url"],
-        rapidapi_host=config["rapid_api"]["host"],
-        rapidapi_apikey=os.getenv("RAPID_APIKEY"),
-        sqlite_db_name=config["data_config"]["db_name"])
-
-    mailer = EmailSender(
-        host=config["email_service"]["smtp"]["host"],
-        port=config["email_service"]["smtp"]["port"],
-        sender_email=config["email_service"]["participants_meta"]["sender"]["email"],
-        sender_password=os.getenv("EMAIL_SENDER_PASSWORD")
-    )
-
-    # SOURCE MATCHES FIXTURES FROM RAPID API
-    team_config = config["data_config"]["team"]
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
-    if not (raw_data := foo_bud.get_rapidapi_data(season=team_config["season"], league=team_config["league"],
-                                                  country_code=team_config["country_code"])):
-        log.info(f"No matches found for date {foo_bud.date}. Shutting down...")
-        sys.exit(0)
+    # EXPORT TIMINGS AND COUNTERS OF THE RUN AT EXIT, ALSO WHEN IT FAILS
+    metrics_config = config.get("metrics", {})
+    atexit.register(METRICS.export, report_path=metrics_config.get("report_path"),
+                    prometheus_path=metrics_config.get("prometheus_path"), date=args.date or yesterday,
+                    date_from=args.date_from, date_to=args.date_to)
 
-    # ENRICH DATA WITH LLM-GENERATED SUMMARY AND STORE IT
-    foo_bud.enrich_and_load_into_db(raw_data)
+    # RECORD OR REPLAY THE REQUESTS TO RAPIDAPI, THE LLM AND THE SMTP SERVER
+    replay = None
+    if args.record or args.replay:
+        replay = Replay(args.record or args.replay, mode="record" if args.record else "replay",
+                        latency=args.replay_latency)
+        atexit.register(replay.save)
 
-    # FETCH RELEVANT DATA FOR LLM
-    fixture_data = foo_bud.fetch_fixture_data_for_llm()
+    # INSTANTIATE CLASSES
+    foo_bud = FootballBuddy.from_config(config, date=args.date or yesterday, resume=not args.no_resume,
+                                        replay=replay)
+    if args.full:
+        foo_bud.incremental = False
+        foo_bud.refetch = True
+
+    pipeline = StreamingPipeline(foo_bud, **config.get("pipeline", {}))
+
+    # BACKFILL A DATE RANGE, SHARING ONE RETRIEVER, DB AND SET OF LLM CLIENTS
+    if args.date_from:
+        teams = config["data_config"].get("teams") or [config["data_config"]["team"]]
+        if args.teams:
+            teams = [t for t in teams if t["team"] in args.teams]
+
+        backfill = Backfill(foo_bud, teams=teams, workers=args.workers, queue_size=args.queue_size,
+                            pipeline=pipeline)
+        backfill.run(date_from=args.date_from, date_to=args.date_to or yesterday)
+        foo_bud.log_stats()
+        sys.exit(0)
 
-    # GET TRIGGERS FOR INTERESTING EVENTS
-    trigger_event_data = foo_bud.collect_valid_triggers(fixture_data)
+    # SOURCE MATCHES FIXTURES FROM RAPID API, ENRICH THEM WITH LLM-GENERATED SUMMARY, STORE THEM AND GET TRIGGERS
+    # FOR INTERESTING EVENTS; EACH FIXTURE MOVES TO THE NEXT STAGE AS SOON AS IT IS READY
+    team_config = config["data_config"]["team"]
+    trigger_event_data, pipeline_stats = pipeline.run(season=team_config["season"], league=team_config["league"],
+                                                      country_code=team_config["country_code"])
 
-    # LET LLM GENERATE AN EMAIL FROM TRIGGERED DATA
-    email_body = foo_bud.format_email(trigger_event_data)
+    if not pipeline_stats["fixtures"]:
+        foo_bud.log_stats()
+        log.info(f"No matches found for date {foo_bud.date}. Shutting down...")
+        sys.exit(0)
 
-    # FORMAT AND SEND EMAIL
-    formatted_mail = mailer.format_email(
+    # LET LLM GENERATE AN EMAIL FROM TRIGGERED DATA, FORMAT AND SEND IT
+    mailer = EmailSender.from_config(config, sender_password=os.getenv("EMAIL_SENDER_PASSWORD"),
+                                     cassette=replay.smtp if replay else None)
+    try:
+        foo_bud.email_triggers(
+            mailer,
+            trigger_event_data,
             subject=config["email_service"]["email_params"]["subject"],
-            receiver_email=config["email_service"]["participants_meta"]["receiver"]["email"],
-            content=email_body,
-            is_html=True)
-
-    mailer.send_email(formatted_mail)
+            receiver_email=recipients(config["email_service"]["participants_meta"], team=team_config["team"]))
+    finally:
+        mailer.close()
+        foo_bud.log_stats()
+        foo_bud.log_stage_summary()
@@ -0,0 +1,224 @@
+import bisect
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets in seconds, from fast SQLite queries to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Counts of observed values per bucket, with their sum, min and max"""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket), like Prometheus estimates"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else None,
+                "min": self.min, "max": self.max,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+class Metrics:
+    def __init__(self, prefix="football_buddy", buckets=DEFAULT_BUCKETS):
+        """
+        Thread-safe registry of counters and latency histograms of one run, exported as a JSON run report or in
+        the Prometheus text format (e.g. for the textfile collector of node_exporter).
+        :param prefix: prefix of the metric names in the Prometheus export
+        :param buckets: upper bounds of the histogram buckets in seconds
+        """
+        self.prefix = prefix
+        self.buckets = buckets
+        self.started = time.time()
+        self._counters = {}  # {name: {label key: value}}
+        self._histograms = {}  # {name: {label key: Histogram}}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Adds value to a counter, names should end with _total"""
+        key = _label_key(labels)
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            if key not in histograms:
+                histograms[key] = Histogram(self.buckets)
+            histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Observes the seconds the block took in the histogram name (which should end with _seconds). Failures are
+        timed too, and counted in errors_total with the timer label set to name (callers' labels, e.g. operation,
+        are kept).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("errors_total", **{**labels, "timer": name})
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def report(self, **meta):
+        """:return: JSON serializable dict with the metadata, counters and histogram summaries of the run"""
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in sorted(values.items())]
+                        for name, values in sorted(self._counters.items())}
+            histograms = {name: [{"labels": dict(key), **h.summary()} for key, h in sorted(values.items())]
+                          for name, values in sorted(self._histograms.items())}
+        return {"started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "duration_seconds": round(time.time() - self.started, 3),
+                **meta, "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, values in sorted(self._counters.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                lines += [f"{self.prefix}_{name}{_format_labels(key)} {value}" for key, value in sorted(values.items())]
+
+            for name, values in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} histogram")
+                for key, h in sorted(values.items()):
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + ("+Inf",), h.counts):
+                        cumulative += count
+                        lines.append(f"{self.prefix}_{name}_bucket{_format_labels(key, le=bound)} {cumulative}")
+                    lines.append(f"{self.prefix}_{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{self.prefix}_{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, report_path=None, prometheus_path=None, **meta):
+        """Writes the JSON run report and/or the Prometheus text file; meta is added to the report"""
+        if report_path:
+            os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+            with open(report_path, "w") as f:
+                json.dump(self.report(**meta), f, indent=2)
+            log.info(f"Run report written to {report_path}")
+        if prometheus_path:
+            os.makedirs(os.path.dirname(prometheus_path) or ".", exist_ok=True)
+            # Written to a temporary file first, so that a collector never reads half of it
+            with open(f"{prometheus_path}.tmp", "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(f"{prometheus_path}.tmp", prometheus_path)
+            log.info(f"Prometheus metrics written to {prometheus_path}")
+
+
+# Registry used by all components unless they get another one
+METRICS = Metrics()
+
+
+class Profiler:
+    def __init__(self, path, top=25):
+        """
+        cProfile of the calling thread and of all threads started while profiling (pipeline stages, backfill
+        workers, request pools), merged into one pstats file, e.g. for snakeviz. Before Python 3.12, each thread
+        gets its own profile.
+        :param path: pstats output file
+        :param top: number of functions with the highest cumulative time logged at stop
+        """
+        self.path = path
+        self.top = top
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _new_profile(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def _profile_thread(self, *args):
+        # Installed by threading.setprofile as the first profile function of each new thread, replaces itself
+        sys.setprofile(None)
+        try:
+            self._new_profile().enable()
+        except ValueError as e:  # Another profiler is active; profiling must never kill a worker thread
+            log.warning(f"Not profiling thread {threading.current_thread().name}: {e}")
+
+    def start(self):
+        # From Python 3.12, cProfile builds on sys.monitoring, which covers all threads with one profiler and
+        # doesn't allow a second one
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+        self._new_profile().enable()
+
+    def stop(self):
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        for profile in profiles:
+            profile.disable()
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            try:
+                stats.add(profile)
+            except TypeError:  # Threads which did not call any profiled function
+                pass
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        stats.dump_stats(self.path)
+
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(self.top)
+        log.info(f"Profile of {len(profiles)} threads written to {self.path}, top {self.top} functions:\n"
+                 f"{out.getvalue()}")
@@ -0,0 +1,86 @@
+import argparse
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = "sql_scripts/migrations"
+
+
+class Migrator:
+    def __init__(self, wrapper, migrations_dir: str = MIGRATIONS_DIR):
+        """
+        Applies versioned SQL scripts named <version>_<description>.sql from migrations_dir. The version of the
+        database is tracked in PRAGMA user_version; each script runs in its own transaction.
+        :param wrapper: db_operations.SQLite instance
+        """
+        self.wrapper = wrapper
+        self.migrations_dir = migrations_dir
+
+    def migrations(self):
+        """:return: sorted list of (version, path)"""
+        found = []
+        for filename in os.listdir(self.migrations_dir):
+            if match := re.match(r"^(\d+)_.+\.sql$", filename):
+                found.append((int(match.group(1)), os.path.join(self.migrations_dir, filename)))
+        return sorted(found)
+
+    def current_version(self) -> int:
+        with self.wrapper as db:
+            return db.cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    def pending(self):
+        version = self.current_version()
+        return [(v, path) for v, path in self.migrations() if v > version]
+
+    def migrate(self):
+        """Applies all pending migrations, returns the resulting schema version"""
+        version = self.current_version()
+        for v, path in self.pending():
+            with open(path, "r") as f:
+                script = f.read()
+
+            log.info(f"Migrating database {self.wrapper.db} to version {v} ({os.path.basename(path)})")
+            conn = self.wrapper.conn
+            try:
+                # executescript handles statement splitting; user_version is set within the same transaction
+                conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {v};\nCOMMIT;")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                log.exception(f"Migration {path} failed, database stays at version {version}: {e}")
+                raise
+            version = v
+        return version
+
+    def explain(self, queries: dict):
+        """:return: dict {query name: list of EXPLAIN QUERY PLAN details}"""
+        plans = {}
+        with self.wrapper as db:
+            for name, query in queries.items():
+                params = [None] * query.count("?")
+                rows = db.cursor.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+                plans[name] = [row["detail"] for row in rows]
+        return plans
+
+
+if __name__ == "__main__":
+    import settings
+    from db_operations import SQLiteOperations
+
+    logging.basicConfig(level="INFO")
+    config = settings.config()
+
+    parser = argparse.ArgumentParser(description="Migrates the football database to the latest schema version")
+    parser.add_argument("--db", default=config["data_config"]["db_name"])
+    parser.add_argument("--explain", action="store_true", help="Print query plans of the project queries")
+    args = parser.parse_args()
+
+    db_ops = SQLiteOperations(db_name=args.db)
+    print(f"Schema version: {db_ops.create_tables()}")
+    if args.explain:
+        for name, details in db_ops.explain_queries().items():
+            print(f"{name}:")
+            for d in details:
+                print(f"    {d}")
@@ -0,0 +1,124 @@
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # Optional, token counts get estimated from the text length without it
+    tiktoken = None
+
+# Statistics kept when the payload has to be cut down to fit the token budget
+KEY_STATS = ["Ball Possession", "Total Shots", "Shots on Goal", "Corner Kicks", "Fouls", "Yellow Cards",
+             "Red Cards", "Goalkeeper Saves"]
+KEY_EVENT_TYPES = {"Goal", "Card"}
+
+
+class PayloadCompactor:
+    def __init__(self, token_budget=None, encoding: str = "o200k_base"):
+        """
+        Turns one item of RapidDataRetriever.get_full_data into a compact JSON payload for the match description
+        prompt: only fields relevant for the commentary, events and statistics as column/row tables.
+        :param token_budget: max tokens of a payload; less important data is dropped until it fits
+        :param encoding: tiktoken encoding used to count tokens (o200k_base is the one of gpt-4o); None, or without
+            tiktoken installed (see requirements-payload.txt), token counts are estimated from the text length
+        """
+        self.token_budget = token_budget
+        self._encoding = None
+        if encoding and tiktoken is None:
+            log.info("tiktoken is not installed, estimating token counts of LLM payloads")
+        elif encoding:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:  # The encoding file is downloaded on first use, which may not be possible
+                log.warning(f"Tiktoken encoding {encoding} not available, estimating token counts. Err: {e}")
+
+    @property
+    def estimated(self):
+        """Whether token counts are estimates rather than counted with tiktoken"""
+        return self._encoding is None
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def _about(match):
+        about = match["about"]
+        fixture, teams, score = about["fixture"], about["teams"], about["score"]
+        return {
+            "league": f"{about['league']['name']}, {about['league']['round']}",
+            "date": fixture["date"],
+            "referee": fixture["referee"],
+            "status": fixture["status"]["long"],
+            "home": teams["home"]["name"],
+            "away": teams["away"]["name"],
+            "score": {score_type: f"{s['home']}-{s['away']}" for score_type, s in score.items()
+                      if s["home"] is not None}}
+
+    @staticmethod
+    def _events(match, event_types=None):
+        rows = []
+        for e in match["events"]:
+            if event_types and e["type"] not in event_types:
+                continue
+            minute = f"{e['time']['elapsed']}+{e['time']['extra']}" if e["time"]["extra"] else e["time"]["elapsed"]
+            rows.append([minute, e["team"]["name"], e["type"], e["detail"], e["player"]["name"],
+                         e["assist"]["name"], e["comments"]])
+        return {"cols": ["min", "team", "type", "detail", "player", "assist", "comments"], "rows": rows}
+
+    @staticmethod
+    def _stats(match, stat_types=None):
+        teams = match["stats"]
+        if not teams:
+            return {}
+        values = [{s["type"]: s["value"] for s in t["statistics"]} for t in teams]
+        types = [s["type"] for s in teams[0]["statistics"] if stat_types is None or s["type"] in stat_types]
+        return {"cols": ["type"] + [t["team"]["name"] for t in teams],
+                "rows": [[type_] + [v.get(type_) for v in values] for type_ in types]}
+
+    def _candidates(self, match):
+        """Payload variants from the most to the least detailed"""
+        about = self._about(match)
+        yield {**about, "events": self._events(match), "stats": self._stats(match)}
+        yield {**about, "events": self._events(match), "stats": self._stats(match, KEY_STATS)}
+        yield {**about, "events": self._events(match, KEY_EVENT_TYPES), "stats": self._stats(match, KEY_STATS)}
+        yield {**about, "events": self._events(match, KEY_EVENT_TYPES)}
+
+    def compact(self, match):
+        """:return: tuple (payload string, report dict with sizes before and after)"""
+        raw = str(match)  # What PromptTemplate would put into the prompt for the raw dict
+        for payload in self._candidates(match):
+            text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+            tokens = self.count_tokens(text)
+            if self.token_budget is None or tokens <= self.token_budget:
+                break
+        else:
+            log.warning(f"Payload of fixture {match['fixture_id']} has {'~' if self.estimated else ''}{tokens} "
+                        f"tokens even when cut down, "
+                        f"over the budget of {self.token_budget}")
+
+        raw_tokens = self.count_tokens(raw)
+        report = {
+            "fixture_id": match["fixture_id"],
+            "raw_bytes": len(raw.encode()),
+            "compact_bytes": len(text.encode()),
+            "raw_tokens": raw_tokens,
+            "compact_tokens": tokens,
+            "tokens_saved": raw_tokens - tokens,
+            "tokens_estimated": self.estimated}
+        return text, report
+
+
+def summarize_reports(reports):
+    raw = sum(r["raw_tokens"] for r in reports)
+    compact = sum(r["compact_tokens"] for r in reports)
+    return {
+        "fixtures": len(reports),
+        "raw_bytes": sum(r["raw_bytes"] for r in reports),
+        "compact_bytes": sum(r["compact_bytes"] for r in reports),
+        "raw_tokens": raw,
+        "compact_tokens": compact,
+        "tokens_saved_pct": round(100 * (raw - compact) / raw, 1) if raw else 0.0,
+        "tokens_estimated": any(r["tokens_estimated"] for r in reports)}
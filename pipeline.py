@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+_DONE = object()  # End of stream marker
+
+
+class StreamingPipeline:
+    def __init__(self, football_buddy, queue_size: int = 16, batch_size: int = 8, batch_wait: float = 0.5):
+        """
+        Runs the fetch, describe+store and trigger stages of FootballBuddy for one day and league at the same time,
+        connected by bounded queues. Each fixture moves on to the next stage as soon as it was fetched, so that LLM
+        calls overlap with RapidAPI requests, and at most about queue_size + batch_size + rapid_api.max_workers
+        fixtures are held in memory. Checkpoints and the incremental mode work as with the FootballBuddy methods.
+        :param football_buddy: FootballBuddy instance
+        :param queue_size: max fixtures waiting between two stages
+        :param batch_size: max fixtures per LLM batch of the describe and trigger stages
+        :param batch_wait: seconds a stage waits for more fixtures before it processes a smaller batch
+        """
+        self.football_buddy = football_buddy
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+    @staticmethod
+    def _put(q, item, stop):
+        """Blocks while the queue is full, gives up when the pipeline stops"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _batches(self, q, stop):
+        """Yields lists of up to batch_size items from q until the end of stream marker or a stop"""
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    yield batch
+                    return
+                batch.append(item)
+            yield batch
+
+    def run(self, season, league, country_code, date=None, teams=None):
+        """
+        :param teams: names of the teams to detect triggers for, the team of the FootballBuddy by default
+        :return: tuple (list of triggers, stats dict)
+        """
+        fb = self.football_buddy
+        date = date or fb.date
+        teams = teams or [fb.team]
+
+        fetched_queue = queue.Queue(maxsize=self.queue_size)
+        stored_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        stats = {"fixtures": 0, "fetched": 0, "stored": 0, "peak_queued": 0}
+        stats_lock = threading.Lock()
+
+        def count(key, n=1):
+            with stats_lock:
+                stats[key] += n
+                stats["peak_queued"] = max(stats["peak_queued"], fetched_queue.qsize() + stored_queue.qsize())
+
+        def fetch():
+            try:
+                to_fetch, fetched_before, unchanged = fb.plan_rapidapi_fetch(season, league, country_code, date)
+                count("fixtures", len(to_fetch) + len(fetched_before) + len(unchanged))
+                for f_id in unchanged:  # Stored before, only their triggers may be missing
+                    if not self._put(stored_queue, f_id, stop):
+                        return
+                for m in fetched_before:
+                    if not self._put(fetched_queue, m, stop):
+                        return
+                for m in fb.iter_fetched_rapidapi_data(to_fetch, season, league, country_code, date, ordered=False):
+                    count("fetched")
+                    if not self._put(fetched_queue, m, stop):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                self._put(fetched_queue, _DONE, stop)
+                fb.db_ops.wrapper.release()  # The thread ends with the run, its connection would leak otherwise
+
+        def describe():
+            try:
+                for batch in self._batches(fetched_queue, stop):
+                    for f_id in fb.enrich_and_load_into_db(batch, date=date):
+                        count("stored")
+                        if not self._put(stored_queue, f_id, stop):
+                            return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                self._put(stored_queue, _DONE, stop)
+                fb.db_ops.wrapper.release()
+
+        threads = [threading.Thread(target=fetch, name=f"pipeline-fetch-{league}-{date}", daemon=True),
+                   threading.Thread(target=describe, name=f"pipeline-describe-{league}-{date}", daemon=True)]
+        for t in threads:
+            t.start()
+
+        triggers = []
+        try:
+            for fixture_ids in self._batches(stored_queue, stop):
+                matches = fb.db_ops.fetch_matches_bulk(fixture_ids=fixture_ids, parts=("events", "stats", "teams"))
+                for team in teams:
+                    triggers += fb.collect_valid_triggers(matches, team=team, date=date)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for t in threads:
+                t.join()
+
+        if errors:
+            raise errors[0]
+        stats["triggers"] = len(triggers)
+        log.info(f"Pipeline of {league} on {date} finished: {stats}")
+        return triggers, stats
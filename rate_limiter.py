@@ -0,0 +1,140 @@
+import logging
+import random
+import threading
+import time
+from datetime import date
+
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class QuotaExhaustedError(RuntimeError):
+    pass
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=30, burst=None, daily_quota=None, max_retries=5, backoff=1.0,
+                 max_backoff=60.0, store=None):
+        """
+        Token bucket limiting the request rate, plus a per-day request budget. Both get adjusted to the limits the
+        API reports in its x-ratelimit-* response headers.
+        :param requests_per_minute: sustained request rate
+        :param burst: bucket size, i.e. how many requests can be fired at once; defaults to 1 second worth of tokens
+        :param daily_quota: max requests per day, None for unlimited
+        :param max_retries: retries of a request answered with 429 or 5xx
+        :param backoff: base of the exponential backoff in seconds
+        :param max_backoff: cap of a single backoff sleep in seconds
+        :param store: optional disk_cache.DiskCache keeping the requests used per day, so that the daily budget
+            holds across runs and processes sharing it; kept in memory only without it
+        """
+        self.rate = requests_per_minute / 60
+        self.capacity = burst or max(1.0, self.rate)
+        self.daily_quota = daily_quota
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.store = store
+
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._day = date.today()
+        self._used_today = self._stored_usage()
+        self._remaining_today = None
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _store_key(self):
+        return f"rate_limit:used:{self._day.isoformat()}"
+
+    def _stored_usage(self):
+        return int(self.store.get(self._store_key()) or 0) if self.store else 0
+
+    def _check_quota(self):
+        if self._day != date.today():
+            self._day, self._remaining_today = date.today(), None
+            self._used_today = self._stored_usage()
+
+        if self._remaining_today is not None and self._remaining_today <= 0:
+            raise QuotaExhaustedError("Daily RapidAPI quota exhausted (reported by the API)!")
+        if self.daily_quota is not None and self._used_today >= self.daily_quota:
+            raise QuotaExhaustedError(f"Daily request budget of {self.daily_quota} requests used up!")
+
+    def acquire(self):
+        """Blocks until a request may be sent and books it against the daily budget"""
+        while True:
+            with self._lock:
+                self._check_quota()
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    # The stored count includes requests of other processes sharing the store
+                    self._used_today = self.store.incr(self._store_key(), ttl=2 * 24 * 3600) if self.store \
+                        else self._used_today + 1
+                    if self._remaining_today is not None:
+                        self._remaining_today -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """
+        Reads the limits reported by RapidAPI: X-RateLimit-* for the per-minute limit, x-ratelimit-requests-* for
+        the daily one (header names are case-insensitive in requests)
+        """
+        with self._lock:
+            if (limit := headers.get("X-RateLimit-Limit")) and limit.isdigit() and int(limit) > 0:
+                rate = int(limit) / 60
+                if rate != self.rate:
+                    log.debug(f"Adjusting rate limit to {limit} requests per minute")
+                    self.rate = rate
+            if (remaining := headers.get("X-RateLimit-Remaining")) and remaining.isdigit() and int(remaining) == 0:
+                self._tokens = min(self._tokens, 0)
+            if (remaining := headers.get("x-ratelimit-requests-remaining")) and remaining.isdigit():
+                self._remaining_today = int(remaining)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter; Retry-After from the server takes precedence"""
+        if retry_after and retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate_per_minute": self.rate * 60,
+                "used_today": self._used_today,
+                "remaining_today": self._remaining_today}
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, limiter, **kwargs):
+        """
+        HTTPAdapter sending every request through a RateLimiter and retrying throttled or failed requests.
+        :param limiter: RateLimiter instance, can be shared by several adapters
+        """
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            res = super().send(request, **kwargs)
+            self.limiter.update_from_headers(res.headers)
+
+            if res.status_code not in RETRY_STATUSES or attempt >= self.limiter.max_retries:
+                return res
+
+            delay = self.limiter.backoff_delay(attempt, res.headers.get("Retry-After"))
+            log.warning(f"Request {request.url} answered with {res.status_code}, retrying in {delay:.1f} s "
+                        f"(attempt {attempt + 1}/{self.limiter.max_retries})")
+            res.close()
+            time.sleep(delay)
+            attempt += 1
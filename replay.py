@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+log = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+BACKENDS = ("rapidapi", "llm", "smtp")
+
+# Response headers kept in cassettes, the rate limiter and the cache read them
+_RECORDED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Retry-After", "X-RateLimit-Limit",
+                     "X-RateLimit-Remaining", "x-ratelimit-requests-remaining"]
+
+
+class Cassette:
+    def __init__(self, path, mode="replay", latency=None):
+        """
+        Interactions with one backend recorded during a run, stored as JSON {key: [interactions in order]}.
+        Replaying a key returns its interactions in the recorded order, the last one again once they run out.
+        :param path: JSON file, read in the replay mode and written by save in the record mode
+        :param mode: "record" or "replay"
+        :param latency: seconds each replayed interaction takes, None to take as long as when it was recorded
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown replay mode {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._interactions = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+        if self.replaying:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self._interactions = json.load(f)
+            else:
+                log.warning(f"No cassette {path}, nothing to replay from it")
+            log.info(f"Loaded {len(self)} recorded interactions from {path}")
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(interactions) for interactions in self._interactions.values())
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(*parts):
+        """Hash of canonicalized parts of a request, for requests without a short natural key"""
+        canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def record(self, key, seconds, **interaction):
+        """:param seconds: how long the interaction took, replayed unless a fixed latency is set"""
+        with self._lock:
+            self._interactions.setdefault(key, []).append({"seconds": round(seconds, 6), **interaction})
+
+    def _next(self, key):
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise KeyError(f"No recorded interaction for {key} in {self.path}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            interaction = interactions[min(position, len(interactions) - 1)]
+        return interaction, interaction["seconds"] if self.latency is None else self.latency
+
+    def replay(self, key):
+        """:return: the next recorded interaction of key, after its latency; KeyError if there is none"""
+        interaction, delay = self._next(key)
+        time.sleep(delay)
+        return interaction
+
+    async def areplay(self, key):
+        interaction, delay = self._next(key)
+        await asyncio.sleep(delay)
+        return interaction
+
+    def rewind(self):
+        """Replays all keys from their first interaction again"""
+        with self._lock:
+            self._positions.clear()
+
+    def save(self):
+        """Writes the recorded interactions, atomically, so that a failed run doesn't leave a broken cassette"""
+        if self.replaying:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            content = json.dumps(self._interactions, indent=1, sort_keys=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(f"{self.path}.tmp", self.path)
+        log.info(f"Recorded {len(self)} interactions to {self.path}")
+
+
+class Replay:
+    def __init__(self, directory, mode="replay", latency=None):
+        """
+        Cassettes of the RapidAPI responses, LLM answers and SMTP replies of a run (rapidapi.json, llm.json and
+        smtp.json in directory). A recorded run can be replayed offline, without API keys, as often as needed.
+        :param mode: "record" or "replay"
+        :param latency: seconds each replayed interaction takes, a number for all backends or a dict per backend,
+            e.g. {"rapidapi": 0.05, "llm": 1.0}; with None (or a backend missing in the dict) as long as recorded
+        """
+        latency = latency if isinstance(latency, dict) else dict.fromkeys(BACKENDS, latency)
+        self.directory = directory
+        self.rapidapi, self.llm, self.smtp = [
+            Cassette(os.path.join(directory, f"{backend}.json"), mode=mode, latency=latency.get(backend))
+            for backend in BACKENDS]
+
+    @property
+    def replaying(self):
+        return self.rapidapi.replaying
+
+    def rewind(self):
+        for cassette in [self.rapidapi, self.llm, self.smtp]:
+            cassette.rewind()
+
+    def save(self):
+        for cassette in [self.rapidapi, self.llm, self.smtp]:
+            cassette.save()
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, cassette: Cassette, adapter=None):
+        """
+        Transport adapter for requests.Session recording the responses of adapter to a cassette, or replaying them
+        from it without any network calls. Requests are matched by method, path and query, so that a cassette
+        replays against any base url; request headers (and so API keys) are never stored.
+        :param adapter: adapter used for actual network calls while recording
+        """
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter or HTTPAdapter()
+
+    @staticmethod
+    def key(request):
+        parts = urlsplit(request.url)
+        return f"{request.method} {parts.path}?{urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))}"
+
+    def send(self, request, **kwargs):
+        key = self.key(request)
+        if self.cassette.replaying:
+            try:
+                return self._build_response(request, self.cassette.replay(key))
+            except KeyError as e:
+                raise requests.ConnectionError(f"No recorded response for {key}", request=request) from e
+
+        start = time.perf_counter()
+        res = self.adapter.send(request, **kwargs)
+        self.cassette.record(key, time.perf_counter() - start, status=res.status_code, reason=res.reason,
+                             headers={h: res.headers[h] for h in _RECORDED_HEADERS if h in res.headers},
+                             body=res.content.decode("utf-8", errors="replace"))
+        return res
+
+    @staticmethod
+    def _build_response(request, interaction):
+        res = Response()
+        res.status_code = interaction["status"]
+        res.reason = interaction["reason"]
+        res._content = interaction["body"].encode("utf-8")
+        res.headers = CaseInsensitiveDict(interaction["headers"])
+        res.encoding = "utf-8"
+        res.url = request.url
+        res.request = request
+        return res
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplaySMTP:
+    def __init__(self, cassette: Cassette, server=None):
+        """
+        Stands in for an smtplib connection of EmailSender: records the reply to each message sent over server,
+        or replays it without a server. Refused recipients and error replies are replayed as the same exceptions.
+        :param server: connected smtplib.SMTP while recording, None for replaying
+        """
+        self.cassette = cassette
+        self.server = server
+
+    @staticmethod
+    def key(msg):
+        return Cassette.key(msg["From"], msg["To"], msg["Subject"])
+
+    def send_message(self, msg):
+        key = self.key(msg)
+        if self.server is None:
+            interaction = self.cassette.replay(key)
+            if interaction["error"] == "refused":
+                raise smtplib.SMTPRecipientsRefused({msg["To"]: (interaction["code"], interaction["message"])})
+            if interaction["error"] == "response":
+                raise smtplib.SMTPResponseException(interaction["code"], interaction["message"])
+            return {}
+
+        start = time.perf_counter()
+        try:
+            result = self.server.send_message(msg)
+        except smtplib.SMTPRecipientsRefused as e:
+            code, message = next(iter(e.recipients.values()))
+            self.cassette.record(key, time.perf_counter() - start, error="refused", code=code,
+                                 message=message.decode(errors="replace") if isinstance(message, bytes) else message)
+            raise
+        except smtplib.SMTPResponseException as e:
+            self.cassette.record(key, time.perf_counter() - start, error="response", code=e.smtp_code,
+                                 message=e.smtp_error.decode(errors="replace")
+                                 if isinstance(e.smtp_error, bytes) else e.smtp_error)
+            raise
+        self.cassette.record(key, time.perf_counter() - start, error=None)
+        return result
+
+    def quit(self):
+        if self.server is not None:
+            self.server.quit()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
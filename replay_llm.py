@@ -0,0 +1,49 @@
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ReplayChatModel(BaseChatModel):
+    """Records the answers of a chat model to a replay.Cassette, or replays them without calling any model"""
+    cassette: Any
+    """replay.Cassette of the answers"""
+    llm: Optional[Any] = None
+    """Chat model answering while recording, not needed for replaying"""
+    model_name: str = "replay"
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _key(self, messages):
+        return self.cassette.key(self.model_name, self.temperature, [(m.type, m.content) for m in messages])
+
+    @staticmethod
+    def _result(interaction):
+        message = AIMessage(content=interaction["content"], usage_metadata=interaction["usage"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _record(self, key, seconds, response):
+        usage = getattr(response, "usage_metadata", None)
+        self.cassette.record(key, seconds, content=response.content, usage=dict(usage) if usage else None)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages)
+        if self.cassette.replaying:
+            return self._result(self.cassette.replay(key))
+        start = time.perf_counter()
+        response = self.llm.invoke(messages, stop=stop, **kwargs)
+        return self._record(key, time.perf_counter() - start, response)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages)
+        if self.cassette.replaying:
+            return self._result(await self.cassette.areplay(key))
+        start = time.perf_counter()
+        response = await self.llm.ainvoke(messages, stop=stop, **kwargs)
+        return self._record(key, time.perf_counter() - start, response)
@@ -1,18 +1,96 @@
 import smtplib
 import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from email.message import EmailMessage
 
+from metrics import METRICS
+from replay import ReplaySMTP
+
 
 log = logging.getLogger(__name__)
 
+# SMTP reply codes of temporary failures (RFC 5321), the same message may succeed later
+TRANSIENT_CODES = {421, 450, 451, 452}
+
+
+def is_transient(error) -> bool:
+    """Whether sending failed for a reason worth retrying: temporary reply codes, dropped connections, timeouts"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code in TRANSIENT_CODES for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code in TRANSIENT_CODES
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # Socket errors (refused connections, timeouts); other SMTPExceptions are OSErrors too, but not transient
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def recipients(participants_meta: dict, team: str = None) -> list:
+    """
+    Addresses of the subscribers (email_service.participants_meta.subscribers in config.yaml) of the team's emails,
+    subscribers without a teams list get all of them. Without subscribers, the single receiver.
+    """
+    subscribers = participants_meta.get("subscribers")
+    if not subscribers:
+        return [participants_meta["receiver"]["email"]]
+    return [s["email"] for s in subscribers if team is None or not s.get("teams") or team in s["teams"]]
+
 
 class EmailSender:
-    def __init__(self, host, port, sender_email, sender_password):
+    def __init__(self, host, port, sender_email, sender_password, use_ssl=True, pool_size=1, max_retries=3,
+                 backoff=1.0, timeout=30, max_messages_per_connection=100, metrics=None, cassette=None):
+        """
+        Sends emails over a small pool of authenticated SMTP connections, reused across messages instead of
+        connecting and logging in for each of them.
+        :param use_ssl: connect with SMTP_SSL; otherwise plain SMTP, upgraded with STARTTLS if the server offers it
+        :param pool_size: max number of open connections, and so of messages sent at once by send_many
+        :param max_retries: retries of a message after transient failures (see is_transient)
+        :param backoff: seconds before the first retry, doubled with every further one (with random jitter)
+        :param timeout: socket timeout in seconds
+        :param max_messages_per_connection: connections are renewed after this many messages, as servers limit it
+        :param metrics: Metrics registry for send timings and counts, the shared one by default
+        :param cassette: optional replay.Cassette the server replies are recorded to or replayed from; replaying
+            connects to no server
+        """
         self.host = host
         self.port = port
         self.sender_email = sender_email
         self._password = sender_password
+        self.use_ssl = use_ssl
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.metrics = metrics or METRICS
+        self.cassette = cassette
+
+        self._idle = queue.LifoQueue()  # (connection, messages sent over it); the most recently used one first
+        self._slots = threading.BoundedSemaphore(self.pool_size)
 
+    @classmethod
+    def from_config(cls, config: dict, sender_password: str = None, cassette=None):
+        """Instantiates the class with the email_service settings of config.yaml"""
+        smtp_config = config["email_service"]["smtp"]
+        return cls(
+            host=smtp_config["host"],
+            port=smtp_config["port"],
+            sender_email=config["email_service"]["participants_meta"]["sender"]["email"],
+            sender_password=sender_password,
+            use_ssl=smtp_config.get("use_ssl", True),
+            pool_size=smtp_config.get("pool_size", 1),
+            max_retries=smtp_config.get("max_retries", 3),
+            backoff=smtp_config.get("backoff", 1.0),
+            timeout=smtp_config.get("timeout", 30),
+            max_messages_per_connection=smtp_config.get("max_messages_per_connection", 100),
+            cassette=cassette)
 
     def format_email(self, subject, receiver_email, content, is_html=False):
         msg = EmailMessage()
@@ -26,24 +104,113 @@ class EmailSender:
 
         return msg
 
-    def send_email(self, msg):
+    def _connect(self):
+        if self.cassette is not None and self.cassette.replaying:
+            return ReplaySMTP(self.cassette)
+        log.debug("Connecting to email server...")
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
         try:
-            with smtplib.SMTP_SSL(self.host, self.port) as server:
-                log.debug("Connecting to email server...")
+            if self._password:
                 server.login(self.sender_email, self._password)
                 log.debug("Logged in successfully!")
-                server.send_message(msg)
-                log.info("Email sent successfully!")
-        except smtplib.SMTPAuthenticationError:
-            err_msg = "Authentication failed. Check your email/password."
-            log.error(err_msg)
-            raise Exception(err_msg)
-        except Exception as e:
-            err_msg = f"An error occurred: {e}"
-            log.error(err_msg)
-            raise Exception(err_msg)
+        except Exception:
+            server.close()
+            raise
+        self.metrics.inc("smtp_connections_total")
+        return server if self.cassette is None else ReplaySMTP(self.cassette, server)
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:  # Already dropped by the server
+            server.close()
+
+    @contextmanager
+    def _connection(self):
+        """Borrows an idle connection or opens a new one; broken or worn out connections are closed afterwards"""
+        with self._slots:
+            try:
+                server, sent = self._idle.get_nowait()
+            except queue.Empty:
+                server, sent = self._connect(), 0
+            try:
+                yield server
+            except smtplib.SMTPRecipientsRefused:
+                # smtplib reset the transaction, the connection can be used further
+                self._idle.put((server, sent))
+                raise
+            except Exception:
+                self._quit(server)
+                raise
+            if sent + 1 >= self.max_messages_per_connection:
+                self._quit(server)
+            else:
+                self._idle.put((server, sent + 1))
+
+    def send_email(self, msg):
+        """Sends the message over a pooled connection, retrying transient failures"""
+        attempt = 0
+        while True:
+            try:
+                with self.metrics.timer("email_send_seconds"), self._connection() as server:
+                    server.send_message(msg)
+                self.metrics.inc("emails_total", result="sent")
+                log.debug(f"Email to {msg['To']} sent successfully!")
+                return
+            except Exception as e:
+                if is_transient(e) and attempt < self.max_retries:
+                    delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                    log.warning(f"Sending email to {msg['To']} failed: {e!r}, retrying in {delay:.1f} s "
+                                f"(attempt {attempt + 1}/{self.max_retries})")
+                    self.metrics.inc("email_retries_total")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+                self.metrics.inc("emails_total", result="failed")
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    err_msg = "Authentication failed. Check your email/password."
+                else:
+                    err_msg = f"An error occurred when sending email to {msg['To']}: {e!r}"
+                log.error(err_msg)
+                raise RuntimeError(err_msg) from e
 
+    def send_many(self, msgs):
+        """
+        Sends the messages concurrently, over at most pool_size connections.
+        :return: list with None for each sent message and the exception for each failed one, in the order of msgs
+        """
+        def send(msg):
+            try:
+                self.send_email(msg)
+            except Exception as e:
+                return e
 
+        with ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="smtp") as executor:
+            results = list(executor.map(send, msgs))
+        failed = sum(e is not None for e in results)
+        log.info(f"{len(results) - failed}/{len(results)} emails sent")
+        return results
 
+    def close(self):
+        """Closes the idle connections"""
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(server)
 
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,39 @@
+import json
+import os
+from functools import lru_cache
+
+import yaml
+
+CONFIG_PATH = "config.yaml"
+PROMPTS_PATH = "prompts.yaml"
+SCHEMAS_DIR = "json_schemas"
+
+
+@lru_cache(maxsize=None)
+def load_yaml(path):
+    """Parses a YAML file once per process; the dict is shared by all callers, so it must not be modified"""
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def config(path=CONFIG_PATH) -> dict:
+    return load_yaml(path)
+
+
+def prompts(path=PROMPTS_PATH) -> dict:
+    return load_yaml(path)
+
+
+@lru_cache(maxsize=None)
+def schema(name, schemas_dir=SCHEMAS_DIR) -> dict:
+    """:param name: file name in schemas_dir without the .json extension"""
+    with open(os.path.join(schemas_dir, f"{name}.json"), "r") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def validator(name, schemas_dir=SCHEMAS_DIR):
+    """validation.SchemaValidator of a schema, built on first use, so runs validating nothing don't pay for it"""
+    from validation import SchemaValidator
+
+    return SchemaValidator(schema(name, schemas_dir), name=name)
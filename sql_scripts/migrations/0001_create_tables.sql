@@ -22,7 +22,7 @@ CREATE TABLE IF NOT EXISTS Teams (
     goals INTEGER
 );
 
-CREATE TABLE Score (
+CREATE TABLE IF NOT EXISTS Score (
     score_id INTEGER PRIMARY KEY AUTOINCREMENT,
     fixture_id INTEGER,
     score_type TEXT,  -- 'fulltime', 'halftime', 'extratime', 'penalty'
@@ -0,0 +1,31 @@
+-- Local date of the fixture (%Y-%m-%d) as its own column, so that day lookups and date ranges can use an index
+ALTER TABLE Fixture ADD COLUMN match_date TEXT;
+UPDATE Fixture SET match_date = substr(date, 1, 10);
+CREATE INDEX IF NOT EXISTS idx_fixture_match_date ON Fixture (match_date, fixture_id);
+CREATE INDEX IF NOT EXISTS idx_fixture_timestamp ON Fixture (timestamp);
+
+-- Remove duplicates inserted before the unique constraints existed (the oldest row wins)
+DELETE FROM Teams WHERE id NOT IN (
+    SELECT MIN(id) FROM Teams GROUP BY fixture_id, team_type);
+DELETE FROM Score WHERE score_id NOT IN (
+    SELECT MIN(score_id) FROM Score GROUP BY fixture_id, score_type, team_id);
+DELETE FROM Events WHERE event_id NOT IN (
+    SELECT MIN(event_id) FROM Events
+    GROUP BY fixture_id, team_id, time, type, IFNULL(detail, ''), IFNULL(player, ''), IFNULL(assist, ''));
+DELETE FROM Stats WHERE stat_id NOT IN (
+    SELECT MIN(stat_id) FROM Stats GROUP BY fixture_id, team_id, type);
+DELETE FROM Commentary WHERE id NOT IN (
+    SELECT MIN(id) FROM Commentary GROUP BY fixture_id);
+
+-- Unique constraints, so that INSERT OR IGNORE actually skips rows already stored. They double as lookup indexes
+-- on fixture_id. NULLs are never equal in a unique index, hence IFNULL on the nullable Events columns.
+CREATE UNIQUE INDEX IF NOT EXISTS uq_teams ON Teams (fixture_id, team_type);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_score ON Score (fixture_id, score_type, team_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_events ON Events (
+    fixture_id, team_id, time, type, IFNULL(detail, ''), IFNULL(player, ''), IFNULL(assist, ''));
+CREATE UNIQUE INDEX IF NOT EXISTS uq_stats ON Stats (fixture_id, team_id, type);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_commentary ON Commentary (fixture_id);
+
+-- Covering indexes for the per-fixture lookups of teams (stats join, email data) and events
+CREATE INDEX IF NOT EXISTS idx_teams_fixture_team ON Teams (fixture_id, team_id, name, goals);
+CREATE INDEX IF NOT EXISTS idx_events_fixture ON Events (fixture_id, time);
@@ -0,0 +1,15 @@
+-- Progress of the pipeline stages (fetched, described, triggered, emailed), so that reruns skip finished work.
+-- fixture_id is 0 for stages of a whole day; scope is the league of fetched days and the team of triggers and
+-- emails, empty otherwise. payload holds the output of the stage needed by the next one.
+CREATE TABLE IF NOT EXISTS PipelineState (
+    match_date TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    fixture_id INTEGER NOT NULL DEFAULT 0,
+    scope TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL CHECK (status IN ('done', 'failed')),
+    payload TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (match_date, stage, scope, fixture_id)
+);
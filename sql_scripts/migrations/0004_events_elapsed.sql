@@ -0,0 +1,5 @@
+-- Minute of an event without the added time. With the team, type, detail and player it identifies an event of a
+-- fixture fetched again, as the API corrects the added time, assist and comments of events it already returned.
+-- Rows stored before only have the minute including the added time.
+ALTER TABLE Events ADD COLUMN elapsed INTEGER;
+UPDATE Events SET elapsed = time;
@@ -0,0 +1,25 @@
+import os
+
+from benchmarks.stub_rapid_api import make_full_data
+from db_operations import SQLiteOperations
+from disk_cache import DiskCache
+from email_renderer import EmailRenderer
+
+
+def test_stored_match_renders_home_team_first(tmp_path):
+    match_data = make_full_data(1)
+    about = match_data["about"]
+    about["teams"]["home"]["name"], about["teams"]["away"]["name"] = "Sigma Olomouc", "Liberec"
+    about["goals"] = {"home": 0, "away": 2}
+    match_data["llm"] = {"text": "Liberec won away.", "llm": "test"}
+
+    db_ops = SQLiteOperations(db_name=os.path.join(tmp_path, "test.db"))
+    db_ops.create_tables()
+    try:
+        db_ops.insert_into_fixtures([match_data])
+        match = db_ops.fetch_matches_bulk(fixture_ids=[1], parts=("teams", "comment"))[0]
+    finally:
+        db_ops.close()
+
+    body = EmailRenderer(cache=DiskCache(":memory:")).render_match({**match, "reason": "Away win"})
+    assert 'Sigma Olomouc <span style="color:#d64545;">0 : 2</span> Liberec' in body
@@ -0,0 +1,36 @@
+import os
+import sqlite3
+
+import pytest
+
+from db_operations import SQLiteOperations
+from metrics import Metrics
+
+
+def errors(metrics):
+    return metrics.report()["counters"].get("errors_total", [])
+
+
+def test_timer_reraises_and_counts_errors_of_blocks_with_an_operation_label():
+    metrics = Metrics()
+    with pytest.raises(sqlite3.IntegrityError):
+        with metrics.timer("db_query_seconds", operation="insert", table="Events"):
+            raise sqlite3.IntegrityError("UNIQUE constraint failed")
+
+    assert errors(metrics) == [{"labels": {"operation": "insert", "table": "Events", "timer": "db_query_seconds"},
+                                "value": 1}]
+    assert metrics.report()["histograms"]["db_query_seconds"][0]["count"] == 1
+
+
+def test_failed_insert_propagates_and_is_counted(tmp_path):
+    metrics = Metrics()
+    db_ops = SQLiteOperations(db_name=os.path.join(tmp_path, "test.db"), metrics=metrics)
+    db_ops.create_tables()
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            # fixture_id is an INTEGER PRIMARY KEY, so a text id is a datatype mismatch
+            db_ops._insert_into("Fixture", ["fixture_id", "status"], ["not an id", "Match Finished"])
+    finally:
+        db_ops.close()
+
+    assert [e["labels"]["table"] for e in errors(metrics)] == ["Fixture"]
@@ -0,0 +1,120 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+RED_CARDS = {"red card", "second yellow card"}
+PENALTIES = {"penalty", "missed penalty"}
+# Card reasons and other comments that don't hint at anything noteworthy
+ROUTINE_COMMENTS = {"foul", "argument", "time wasting", "handball", "unsportsmanlike conduct", "simulation",
+                    "roughing", "professional foul", "holding", "tripping", "off the ball foul",
+                    "persistent fouling", "delay of game"}
+
+
+class TriggerRules:
+    def __init__(self, team, high_score=4, high_total=6, high_difference=3, early_sub_minute=40):
+        """
+        Mechanical checks of the trigger_detection criteria on the rows from SQLiteOperations (events, stats,
+        teams). Clear-cut matches are decided locally, everything else is left to the LLM.
+        :param team: name of the team of interest, matched case-insensitively as a substring of team names
+        :param high_score: goals of one team that make the score unusual
+        :param high_total: total goals that make the match worth a look by the LLM
+        :param high_difference: goal difference that makes the match worth a look by the LLM
+        :param early_sub_minute: substitutions before this minute may be injuries, left for the LLM
+        """
+        self.team = team.casefold()
+        self.high_score = high_score
+        self.high_total = high_total
+        self.high_difference = high_difference
+        self.early_sub_minute = early_sub_minute
+
+    def _yes_reasons(self, match, team):
+        reasons = []
+        names = [t["name"] for t in match.get("teams", [])]
+        if any(team in name.casefold() for name in names):
+            reasons.append(f"{' vs. '.join(names)}: the team of interest took part in the match.")
+
+        reasons += self._event_reasons(match["events"])
+
+        for t in match.get("teams", []):
+            if t["goals"] is not None and t["goals"] >= self.high_score:
+                reasons.append(f"{t['name']} scored {t['goals']} goals.")
+        return reasons
+
+    @staticmethod
+    def _event_reasons(events):
+        reasons = []
+        for e in events:
+            detail = (e["detail"] or "").casefold()
+            comments = (e["comments"] or "").casefold()
+            if e["type"] == "Card" and detail in RED_CARDS:
+                reasons.append(f"{e['player']} received a red card in minute {e['time']}.")
+            elif e["type"] == "Goal" and detail in PENALTIES:
+                reasons.append(f"{e['detail']} by {e['player']} in minute {e['time']}.")
+            elif e["type"] == "Goal" and detail == "own goal":
+                reasons.append(f"{e['player']} scored an own goal in minute {e['time']}.")
+            elif "injur" in comments:
+                reasons.append(f"{e['player']} got injured in minute {e['time']}.")
+        return reasons
+
+    def _has_ambiguous_events(self, events):
+        for e in events:
+            comments = (e["comments"] or "").casefold()
+            if comments and comments not in ROUTINE_COMMENTS:
+                return True
+            if e["type"] == "Var":
+                return True
+            if e["type"] == "subst" and e["time"] is not None and e["time"] < self.early_sub_minute:
+                return True
+        return False
+
+    def _is_ambiguous(self, match):
+        """Signals the rules can't interpret reliably, e.g. possible injuries or an unusual but not high score"""
+        if self._has_ambiguous_events(match["events"]):
+            return True
+
+        goals = [t["goals"] for t in match.get("teams", []) if t["goals"] is not None]
+        if len(goals) != 2:
+            return True
+        return sum(goals) >= self.high_total or abs(goals[0] - goals[1]) >= self.high_difference
+
+    def evaluate(self, match, team=None):
+        """
+        :param match: dict with events and teams rows of one fixture (see SQLiteOperations.iter_matches_bulk)
+        :param team: overrides the team of interest given at init
+        :return: trigger dict in the llm_answer schema, or None if the match has to go to the LLM
+        """
+        if reasons := self._yes_reasons(match, team.casefold() if team else self.team):
+            return {"trigger": "yes", "reason": " ".join(reasons)}
+        if self._is_ambiguous(match):
+            return None
+        return {"trigger": "no", "reason": None}
+
+    def evaluate_events(self, events):
+        """
+        Decides on new events of a match being played (see live.LivePoller). Unlike evaluate, neither the
+        participation of the team of interest nor the score make a trigger.
+        :return: trigger dict in the llm_answer schema, or None if the events have to go to the LLM
+        """
+        if reasons := self._event_reasons(events):
+            return {"trigger": "yes", "reason": " ".join(reasons)}
+        if self._has_ambiguous_events(events):
+            return None
+        return {"trigger": "no", "reason": None}
+
+
+def agreement_report(rule_decisions: dict, llm_decisions: dict):
+    """
+    Compares decisions of the rules with those of the LLM for the same fixtures.
+    :param rule_decisions: {fixture id: trigger dict}
+    :param llm_decisions: {fixture id: trigger dict}
+    """
+    common = rule_decisions.keys() & llm_decisions.keys()
+    disagreements = {
+        f_id: {"rules": rule_decisions[f_id], "llm": llm_decisions[f_id]}
+        for f_id in sorted(common) if rule_decisions[f_id]["trigger"] != llm_decisions[f_id]["trigger"]}
+    return {
+        "compared": len(common),
+        "agree": len(common) - len(disagreements),
+        "disagree": len(disagreements),
+        "agreement_rate": (len(common) - len(disagreements)) / len(common) if common else None,
+        "disagreements": disagreements}
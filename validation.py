@@ -0,0 +1,105 @@
+import logging
+from itertools import islice
+
+import settings
+from settings import SCHEMAS_DIR
+
+log = logging.getLogger(__name__)
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    # Same as jsonschema: booleans are no numbers, floats without a fractional part are integers
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None}
+# Keywords _compile can turn into plain Python checks, schemas with others are left to jsonschema
+_COMPILABLE = {"type", "properties", "required", "items", "enum", "title", "description"}
+
+
+def _compile(schema):
+    """
+    Turns a schema using only the _COMPILABLE keywords into a function data -> bool, which is much faster than the
+    generic jsonschema validator as it skips the keyword dispatch and error objects.
+    :return: the function, or None if the schema uses other keywords
+    """
+    if not isinstance(schema, dict) or not schema.keys() <= _COMPILABLE:
+        return None
+
+    checks = []
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        if not set(types) <= _TYPE_CHECKS.keys():
+            return None
+        type_checks = [_TYPE_CHECKS[t] for t in types]
+        checks.append(lambda v: any(check(v) for check in type_checks))
+
+    if "enum" in schema:
+        if not all(isinstance(e, str) for e in schema["enum"]):
+            return None
+        enum = frozenset(schema["enum"])
+        checks.append(lambda v: isinstance(v, str) and v in enum)
+
+    if "required" in schema:
+        required = list(schema["required"])
+        checks.append(lambda v: not isinstance(v, dict) or all(k in v for k in required))
+
+    if "properties" in schema:
+        properties = [(k, _compile(s)) for k, s in schema["properties"].items()]
+        if any(check is None for _, check in properties):
+            return None
+        checks.append(lambda v: not isinstance(v, dict) or all(k not in v or check(v[k]) for k, check in properties))
+
+    if "items" in schema:
+        if (item_check := _compile(schema["items"])) is None:
+            return None
+        checks.append(lambda v: not isinstance(v, list) or all(item_check(i) for i in v))
+
+    return lambda v: all(check(v) for check in checks)
+
+
+class SchemaValidator:
+    def __init__(self, schema: dict, name: str = None):
+        """
+        JSON schema validator built once per schema. jsonschema.validate checks the schema itself and builds a new
+        validator on every call; here that happens only at init. Schemas of simple structure are also compiled
+        into plain Python checks for is_valid; errors are always collected by jsonschema.
+        :param schema: JSON schema
+        :param name: name of the schema used in log messages
+        """
+        import jsonschema  # Imported on first use, it is slow to import and only needed once data gets validated
+
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        self.schema = schema
+        self.name = name or schema.get("title", "schema")
+        self._validator = cls(schema)
+        self._compiled = _compile(schema)
+
+    @classmethod
+    def from_file(cls, name, schemas_dir: str = SCHEMAS_DIR):
+        """:param name: file name in schemas_dir without the .json extension"""
+        return cls(settings.schema(name, schemas_dir), name=name)
+
+    def iter_errors(self, data):
+        """Lazily yields ValidationErrors, so callers can stop after the first few"""
+        return self._validator.iter_errors(data)
+
+    def errors(self, data, limit=None):
+        return list(islice(self.iter_errors(data), limit))
+
+    def is_valid(self, data) -> bool:
+        if self._compiled is not None:
+            return self._compiled(data)
+        return next(self.iter_errors(data), None) is None
+
+    def validate(self, data, max_errors=3) -> bool:
+        """Like is_valid, but collects and logs up to max_errors errors of invalid data"""
+        if self.is_valid(data):
+            return True
+        for e in self.errors(data, limit=max_errors):
+            log.error(f"Data does not match {self.name} schema at /{'/'.join(map(str, e.absolute_path))}: "
+                      f"{e.message}")
+        return False